@@ -0,0 +1,109 @@
+"""
+database.db yedek benchmark'ı: anlık görüntü süresi, tepe bellek, sıkıştırma oranı
+ve parçalı (chunk) yedekte tekilleştirme.
+
+Geçici bir SQLite veritabanını hedef boyuta kadar sentetik kayıtlarla doldurur,
+ardından karşılaştırır:
+  eski  : open(DB_PATH, 'rb').read() + base64 (önceki davranış; canlı dosyadan okur)
+  ilk   : github_sync.snapshot_database() — online backup API + içerik tanımlı
+          parçalar, her parça ayrı sıkıştırılır (hepsi yeni)
+  sonra : --degisen kayıt güncellendikten sonra ikinci yedek; yalnızca GitHub'da
+          olmayan parçalar yüklenir
+Tepe bellek tracemalloc ile (Python tarafı tahsisler) ölçülür.
+
+Kullanım (backend/ dizininden):
+    python benchmarks/bench_db_yedek.py --mb 100 --degisen 50
+"""
+import argparse
+import base64
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import github_sync  # noqa: E402
+
+FIRMALAR = ["Acerler Beton", "Öz Nakliyat", "Yıldız Çimento", "Kuzey Madencilik", "Ege Yapı"]
+
+
+def doldur(db_path: Path, mb: int):
+    con = sqlite3.connect(db_path)
+    con.execute("""CREATE TABLE cimento_giris (id TEXT PRIMARY KEY, bosaltim_tarihi TEXT, cimento_alinan_firma TEXT,
+                   plaka TEXT, fatura_no TEXT, giris_miktari REAL, giris_tutari REAL, aciklama TEXT, created_at TEXT)""")
+    rnd = random.Random(42)
+    i = 0
+    while db_path.stat().st_size < mb * 1024 * 1024:
+        satirlar = []
+        for _ in range(20000):
+            i += 1
+            satirlar.append((
+                f"{i:016d}", f"2026-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}", rnd.choice(FIRMALAR),
+                f"{rnd.randint(1, 81):02d} ABC {rnd.randint(100, 999)}", f"FTR{rnd.randint(10000, 99999)}",
+                round(rnd.uniform(10, 40), 2), round(rnd.uniform(20000, 90000), 2),
+                f"Sevkiyat {rnd.randint(1, 500)} - {rnd.choice(FIRMALAR)} teslim", f"2026-01-01T00:00:{i % 60:02d}+00:00",
+            ))
+        con.executemany("INSERT INTO cimento_giris VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", satirlar)
+        con.commit()
+    con.close()
+
+
+def olc(fn):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    sonuc = fn()
+    sure = time.perf_counter() - t0
+    _, tepe = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sonuc, sure, tepe
+
+
+def main(mb: int, formatlar: list, degisen: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        github_sync.DB_PATH = Path(tmp) / "database.db"
+        doldur(github_sync.DB_PATH, mb)
+        boyut = github_sync.DB_PATH.stat().st_size
+        print(f"veritabanı: {boyut / 1e6:.1f} MB, ortalama parça {github_sync.DB_CHUNK_AVG_BYTES // 1024} KB")
+
+        def eski():
+            with open(github_sync.DB_PATH, "rb") as f:
+                return base64.b64encode(f.read())
+
+        yuk, sure, tepe = olc(eski)
+        print(f"{'eski':14} süre={sure:6.2f} s  tepe bellek={tepe / 1e6:7.1f} MB  yüklenen={len(yuk) / 1e6:8.2f} MB")
+        del yuk
+
+        for fmt in formatlar:
+            github_sync.DB_BACKUP_COMPRESSION = fmt
+            github_sync._known_shas().clear()
+            for adim in ("ilk", "sonra"):
+                if adim == "sonra":
+                    con = sqlite3.connect(github_sync.DB_PATH)
+                    con.execute("UPDATE cimento_giris SET aciklama = 'düzeltildi' WHERE rowid IN "
+                                "(SELECT rowid FROM cimento_giris ORDER BY random() LIMIT ?)", (degisen,))
+                    con.commit()
+                    con.close()
+                dosyalar, sure, tepe = olc(github_sync.snapshot_database)
+                rapor = github_sync.get_stats()["last_db_backup"]
+                yuklenen = sum(len(base64.b64encode(icerik)) for _, icerik in dosyalar)
+                oran = f"  oran={rapor['size'] / rapor['uploaded_bytes']:.2f}" if adim == "ilk" else ""
+                print(f"{adim + ' (' + rapor['format'] + ')':14} süre={sure:6.2f} s  tepe bellek={tepe / 1e6:7.1f} MB"
+                      f"  yüklenen={yuklenen / 1e6:8.2f} MB  parça={rapor['new_chunks']}/{rapor['chunks']}{oran}")
+                # Başarılı push'tan sonra olduğu gibi yüklenen parçaları "GitHub'da" say
+                github_sync._known_shas().update({yol: "" for yol, _ in dosyalar})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=int, default=100, help="hedef veritabanı boyutu")
+    parser.add_argument("--degisen", type=int, default=50, help="ikinci yedekten önce güncellenen kayıt sayısı")
+    parser.add_argument("--format", action="append", choices=["gzip", "zstd", "none"],
+                        help="denenecek sıkıştırma (tekrarlanabilir; varsayılan gzip + kuruluysa zstd)")
+    args = parser.parse_args()
+    main(args.mb, args.format or (["gzip", "zstd"] if github_sync.ZSTD_AVAILABLE else ["gzip"]), args.degisen)
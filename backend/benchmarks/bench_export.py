@@ -0,0 +1,113 @@
+"""
+Tablo dışa aktarma (github_sync snapshot) benchmark'ı: süre, tepe bellek, çıktı boyutu.
+
+Geçici bir veritabanında production_records tablosunu (gerçek şema, init_db ile)
+sentetik kayıtlarla doldurur ve karşılaştırır:
+  eski : fetchall() + dict listesi + json.dumps(indent=2) (önceki davranış)
+  yeni : github_sync.export_table_as_json() — fetchmany ile parti parti, kompakt
+         JSON, spooled temp dosyaya akış
+Her sürüm ayrı bir alt süreçte çalışır; tepe bellek ru_maxrss artışıdır.
+
+Kullanım (backend/ dizininden):
+    python benchmarks/bench_export.py --satir 500000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import aiosqlite  # noqa: E402
+import github_sync  # noqa: E402
+import server  # noqa: E402
+
+TABLO = "production_records"
+
+
+async def eski_export(table_name: str) -> bytes:
+    async with aiosqlite.connect(github_sync.DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute(f"SELECT * FROM {table_name}")
+        rows = await cursor.fetchall()
+        data = [dict(r) for r in rows]
+    payload = {
+        "table": table_name,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "row_count": len(data),
+        "rows": data,
+    }
+    return json.dumps(payload, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+def doldur(db_path: Path, satir: int):
+    server.DB_PATH = db_path
+    asyncio.run(server.init_db())
+    rnd = random.Random(7)
+    con = sqlite3.connect(db_path)
+    for bas in range(0, satir, 50000):
+        con.executemany(
+            """INSERT INTO production_records (id, product_id, product_name, quantity, department_name, operator_name,
+                   shift, notes, module, user_id, user_name, created_at, updated_at, production_date, worked_hours,
+                   pallet_count, waste, mix_count, machine_cement, cikan_paket_1)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'bims', 'u1', 'Operatör', ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [(f"{i:016d}", f"p{i % 40}", f"Bims Blok {i % 40}", rnd.randint(100, 5000), f"Tesis {i % 3}",
+              f"Operatör {i % 25}", "Gündüz", "", "2026-01-01T08:00:00+00:00", "2026-01-01T08:00:00+00:00",
+              f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}", 8.0, rnd.randint(1, 60), rnd.randint(0, 30),
+              rnd.randint(10, 90), rnd.uniform(1000, 9000), '{"urun_id":"x","adet":12}')
+             for i in range(bas, min(bas + 50000, satir))],
+        )
+        con.commit()
+    con.execute(f"DELETE FROM degisiklik_gunlugu WHERE tablo = '{TABLO}'")
+    con.commit()
+    con.close()
+
+
+def _calistir(ad: str, db_path: str, kuyruk):
+    github_sync.DB_PATH = Path(db_path)
+    fn = eski_export if ad == "eski" else github_sync.export_table_as_json
+
+    async def olc():
+        # Ölçüm döngü içinde: sunucuda olay döngüsü açık kalır, asyncio.run kapanışı dahil edilmez
+        once = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0 = time.perf_counter()
+        cikti = await fn(TABLO)
+        return cikti, time.perf_counter() - t0, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - once
+
+    cikti, sure, tepe = asyncio.run(olc())
+    # Satır sayısı çıktının sonundan okunur (tamamını json.loads etmek ölçümü şişirir)
+    adet = int(re.search(rb'"row_count": ?(\d+)', cikti[-200:] if ad == "yeni" else cikti[:500]).group(1))
+    kuyruk.put((sure, tepe * 1024, len(cikti), adet))
+
+
+def main(satir: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        doldur(db_path, satir)
+        print(f"{TABLO}: {satir} satır, veritabanı {db_path.stat().st_size / 1e6:.1f} MB")
+        ctx = multiprocessing.get_context("fork")
+        for ad in ("eski", "yeni"):
+            kuyruk = ctx.Queue()
+            p = ctx.Process(target=_calistir, args=(ad, str(db_path), kuyruk))
+            p.start()
+            sure, tepe, boyut, adet = kuyruk.get()
+            p.join()
+            print(f"{ad:5} süre={sure:6.2f} s  tepe bellek(+RSS)={tepe / 1e6:8.1f} MB  çıktı={boyut / 1e6:7.1f} MB  satır={adet}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--satir", type=int, default=500000, help="production_records kayıt sayısı")
+    args = parser.parse_args()
+    main(args.satir)
@@ -0,0 +1,128 @@
+"""
+GitHub sync HTTP benchmark'ı: push gecikmesi ve bağlantı (handshake) sayısı.
+
+Yerelde GitHub Contents API'sini taklit eden küçük bir HTTP/1.1 sunucusu açar
+(GET → sha, PUT → 201, eksik/eski sha → 422/409) ve push'ları oraya yönlendirir. Her yeni TCP bağlantısı
+gerçek GitHub'da bir TLS handshake demektir; sunucu bunları sayar ve
+`--handshake-ms` kadar bekleyerek handshake gecikmesini taklit eder.
+
+Karşılaştırılanlar:
+  eski : her push için yeni httpx.AsyncClient (önceki davranış)
+  yeni : github_sync.get_client() ile paylaşılan keep-alive istemci
+
+Kullanım (backend/ dizininden):
+    python benchmarks/bench_github_sync.py --push 50 --handshake-ms 40
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import github_sync  # noqa: E402
+
+
+class SahteGitHub:
+    """Minimal keep-alive HTTP/1.1 server standing in for the Contents API."""
+
+    def __init__(self, handshake_ms: float):
+        self.handshake_ms = handshake_ms
+        self.baglanti = 0
+        self.istek = 0
+        self.shalar = {}
+
+    async def _isle(self, reader, writer):
+        self.baglanti += 1
+        await asyncio.sleep(self.handshake_ms / 1000)
+        try:
+            while True:
+                basliklar = await reader.readuntil(b"\r\n\r\n")
+                satirlar = basliklar.decode("latin-1").split("\r\n")
+                metot, yol, _ = satirlar[0].split(" ", 2)
+                uzunluk = 0
+                for satir in satirlar[1:]:
+                    if satir.lower().startswith("content-length:"):
+                        uzunluk = int(satir.split(":", 1)[1])
+                govde = json.loads(await reader.readexactly(uzunluk)) if uzunluk else {}
+                self.istek += 1
+                yol = yol.split("?", 1)[0]
+                if metot == "GET" and yol in self.shalar:
+                    durum, govde = "200 OK", {"sha": self.shalar[yol]}
+                elif metot == "GET":
+                    durum, govde = "404 Not Found", {"message": "Not Found"}
+                elif yol in self.shalar and "sha" not in govde:
+                    durum, govde = "422 Unprocessable Entity", {"message": '"sha" wasn\'t supplied.'}
+                elif govde.get("sha", self.shalar.get(yol)) != self.shalar.get(yol):
+                    durum, govde = "409 Conflict", {"message": "sha mismatch"}
+                else:
+                    self.shalar[yol] = github_sync._blob_sha(base64.b64decode(govde["content"]))
+                    durum, govde = "201 Created", {"content": {"sha": self.shalar[yol]}}
+                veri = json.dumps(govde).encode()
+                writer.write(
+                    f"HTTP/1.1 {durum}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(veri)}\r\nConnection: keep-alive\r\n\r\n".encode() + veri
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def eski_push(icerik: bytes) -> bool:
+    async with httpx.AsyncClient() as client:
+        return await github_sync._put_file(client, "backups/database.db", icerik, "bench")
+
+
+async def yeni_push(icerik: bytes) -> bool:
+    return await github_sync._put_file(github_sync.get_client(), "backups/database.db", icerik, "bench")
+
+
+async def olc(ad, fn, sahte, icerik, push):
+    sahte.baglanti = sahte.istek = 0
+    sureler = []
+    for i in range(push):
+        t0 = time.perf_counter()
+        assert await fn(icerik + str(i).encode())
+        sureler.append((time.perf_counter() - t0) * 1000)
+    print(f"{ad:5} medyan={statistics.median(sureler):7.2f} ms  p95={sorted(sureler)[int(len(sureler) * 0.95) - 1]:7.2f} ms"
+          f"  bağlantı/handshake={sahte.baglanti}  istek/push={sahte.istek / push:.1f}")
+
+
+async def main(push: int, handshake_ms: float, boyut_kb: int):
+    sahte = SahteGitHub(handshake_ms)
+    sunucu = await asyncio.start_server(sahte._isle, "127.0.0.1", 0)
+    port = sunucu.sockets[0].getsockname()[1]
+    github_sync.API_BASE = f"http://127.0.0.1:{port}"
+    github_sync.GITHUB_REPO = "bench/repo"
+    github_sync.GITHUB_TOKEN = "bench"
+    icerik = os.urandom(boyut_kb * 1024)
+
+    print(f"{push} push, {boyut_kb} KB, taklit handshake {handshake_ms:g} ms, http2={github_sync.HTTP2_AVAILABLE}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # sha haritası gerçek data/ dizinine yazılmasın
+        github_sync.DB_PATH = Path(tmp) / "database.db"
+        async with sunucu:
+            await olc("eski", eski_push, sahte, icerik, push)
+            await github_sync.open_client()
+            await olc("yeni", yeni_push, sahte, icerik, push)
+            await github_sync.close_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--push", type=int, default=50, help="ölçüm başına push sayısı")
+    parser.add_argument("--handshake-ms", type=float, default=40, help="yeni bağlantı başına taklit TLS gecikmesi")
+    parser.add_argument("--boyut-kb", type=int, default=64, help="push edilen dosya boyutu")
+    args = parser.parse_args()
+    asyncio.run(main(args.push, args.handshake_ms, args.boyut_kb))
@@ -0,0 +1,229 @@
+"""
+Özet (summary) endpoint benchmark'ı: sorgu sayısı ve gecikme.
+
+Geçici bir SQLite veritabanını sentetik kayıtlarla doldurur, ardından her özet
+endpoint'ini önceki Python tarafı toplama sürümüyle (aşağıdaki `eski_*`
+fonksiyonları) karşılaştırır. Sorgular, bağlantıya takılan trace callback ile sayılır.
+
+Kullanım (backend/ dizininden):
+    python benchmarks/bench_ozet.py --satir 20000 --tekrar 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import server  # noqa: E402
+from server import rows_to_list, row_to_dict  # noqa: E402
+
+_sorgu_sayaci = {"n": 0}
+_asil_get_db = server.get_db
+
+
+async def _sayan_get_db():
+    db = await _asil_get_db()
+    await db.set_trace_callback(lambda sql: _sorgu_sayaci.__setitem__("n", _sorgu_sayaci["n"] + 1))
+    return db
+
+
+# ----- Önceki sürümler (satırları Python'a çekip toplayan) -----
+
+async def eski_cimento_giris_ozet():
+    db = await server.get_db()
+    async with db.execute("SELECT * FROM cimento_giris") as cursor:
+        records = rows_to_list(await cursor.fetchall())
+    await db.close()
+    alanlar = ['giris_miktari', 'kantar_kg_miktari', 'aradaki_fark', 'giris_tutari', 'giris_kdv_tutari',
+               'giris_kdv_dahil_toplam', 'nakliye_matrahi', 'nakliye_kdv_tutari', 'nakliye_genel_toplam',
+               'urun_nakliye_matrah', 'urun_nakliye_kdv_toplam', 'urun_nakliye_tevkifat_toplam', 'urun_nakliye_genel_toplam']
+    return {"kayit_sayisi": len(records), **{a: sum(r.get(a, 0) or 0 for r in records) for a in alanlar}}
+
+
+async def eski_personel_ozet():
+    db = await server.get_db()
+    today = datetime.now().strftime("%Y-%m-%d")
+    async with db.execute("SELECT * FROM personeller WHERE aktif = 1") as cursor:
+        personeller = rows_to_list(await cursor.fetchall())
+    async with db.execute("SELECT * FROM puantaj WHERE tarih = ?", (today,)) as cursor:
+        puantaj = await cursor.fetchall()
+    async with db.execute("SELECT * FROM izinler WHERE durum = 'Beklemede'") as cursor:
+        izinler = await cursor.fetchall()
+    await db.close()
+    return {"toplam_personel": len(personeller), "bugun_giris_yapan": len(puantaj),
+            "bekleyen_izin_talepleri": len(izinler), "toplam_maas_gideri": sum(p.get('maas', 0) or 0 for p in personeller)}
+
+
+async def eski_motorin_ozet():
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    month_start = datetime.now(timezone.utc).replace(day=1).strftime("%Y-%m-%d")
+    db = await server.get_db()
+    async with db.execute("SELECT * FROM motorin_stok LIMIT 1") as cursor:
+        stok = row_to_dict(await cursor.fetchone()) or {}
+    async with db.execute("SELECT * FROM motorin_alimlar WHERE tarih >= ?", (month_start,)) as cursor:
+        alimlar = rows_to_list(await cursor.fetchall())
+    async with db.execute("SELECT * FROM motorin_verme WHERE tarih >= ?", (month_start,)) as cursor:
+        vermeler = rows_to_list(await cursor.fetchall())
+    async with db.execute("SELECT COUNT(*) FROM motorin_alimlar WHERE tarih = ?", (today,)) as cursor:
+        bugunki_alim = (await cursor.fetchone())[0]
+    async with db.execute("SELECT COUNT(*) FROM motorin_verme WHERE tarih = ?", (today,)) as cursor:
+        bugunki_verme = (await cursor.fetchone())[0]
+    async with db.execute("SELECT COUNT(*) FROM motorin_tedarikciler") as cursor:
+        tedarikci = (await cursor.fetchone())[0]
+    await db.close()
+    return {"mevcut_stok": stok.get("mevcut_stok", 0), "ayki_alim": sum(a['miktar_litre'] for a in alimlar),
+            "ayki_maliyet": sum(a['toplam_tutar'] for a in alimlar), "ayki_verme": sum(v['miktar_litre'] for v in vermeler),
+            "bugunki_alim_sayisi": bugunki_alim, "bugunki_verme_sayisi": bugunki_verme, "tedarikci_sayisi": tedarikci}
+
+
+async def eski_teklif_ozet():
+    month_start = datetime.now().strftime("%Y-%m-01")
+    db = await server.get_db()
+    async with db.execute("SELECT COUNT(*) FROM teklifler") as cursor:
+        toplam = (await cursor.fetchone())[0]
+    durumlar = {}
+    for d in ['taslak', 'gonderildi', 'beklemede', 'kabul_edildi', 'reddedildi']:
+        async with db.execute("SELECT COUNT(*) FROM teklifler WHERE durum = ?", (d,)) as cursor:
+            durumlar[d] = (await cursor.fetchone())[0]
+    async with db.execute("SELECT * FROM teklifler WHERE teklif_tarihi >= ?", (month_start,)) as cursor:
+        ayki = rows_to_list(await cursor.fetchall())
+    async with db.execute("SELECT * FROM teklifler WHERE durum = 'kabul_edildi'") as cursor:
+        kabul = rows_to_list(await cursor.fetchall())
+    async with db.execute("SELECT COUNT(*) FROM teklif_musteriler") as cursor:
+        musteri = (await cursor.fetchone())[0]
+    async with db.execute("SELECT * FROM teklifler ORDER BY created_at DESC LIMIT 5") as cursor:
+        son = rows_to_list(await cursor.fetchall())
+    await db.close()
+    return {"toplam_teklif": toplam, **durumlar, "ayki_teklif_sayisi": len(ayki),
+            "ayki_toplam_tutar": sum(t.get('genel_toplam', 0) or 0 for t in ayki),
+            "kabul_toplam_tutar": sum(t.get('genel_toplam', 0) or 0 for t in kabul),
+            "musteri_sayisi": musteri, "son_teklifler": son}
+
+
+async def eski_irsaliye_ozet():
+    db = await server.get_db()
+    try:
+        sonuc = {}
+        for ad, sql in (("toplam", "SELECT COUNT(*) FROM irsaliyeler"),
+                        ("gelen", "SELECT COUNT(*) FROM irsaliyeler WHERE tur = 'gelen'"),
+                        ("giden", "SELECT COUNT(*) FROM irsaliyeler WHERE tur = 'giden'"),
+                        ("toplam_gelen_tutar", "SELECT COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tur = 'gelen'"),
+                        ("toplam_giden_tutar", "SELECT COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tur = 'giden'")):
+            async with db.execute(sql) as cur:
+                sonuc[ad] = (await cur.fetchone())[0] or 0
+        ay_baslangic = datetime.now(timezone.utc).replace(day=1).strftime("%Y-%m-%d")
+        async with db.execute("SELECT COUNT(*), COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tarih >= ?", (ay_baslangic,)) as cur:
+            sonuc["ayki_adet"], sonuc["ayki_tutar"] = await cur.fetchone()
+        async with db.execute("SELECT * FROM irsaliyeler ORDER BY created_at DESC LIMIT 5") as cur:
+            sonuc["son_irsaliyeler"] = rows_to_list(await cur.fetchall())
+        return sonuc
+    finally:
+        await db.close()
+
+
+KULLANICI = {"id": "bench", "name": "bench", "email": "bench@local", "role": "admin"}
+
+KARSILASTIRMALAR = [
+    ("cimento-giris-ozet", eski_cimento_giris_ozet, lambda: server.get_cimento_giris_ozet(current_user=KULLANICI)),
+    ("personel-ozet", eski_personel_ozet, lambda: server.get_personel_ozet(current_user=KULLANICI)),
+    ("motorin-ozet", eski_motorin_ozet, lambda: server.get_motorin_ozet(current_user=KULLANICI)),
+    ("teklif-ozet", eski_teklif_ozet, lambda: server.get_teklif_ozet(teklif_turu=None, current_user=KULLANICI)),
+    ("irsaliye-ozet", eski_irsaliye_ozet, lambda: server.irsaliye_ozet(current_user=KULLANICI)),
+]
+
+
+async def doldur(satir: int):
+    """Seed every table the summaries read with `satir` synthetic rows (dates spread over ~90 days)."""
+    rnd = random.Random(42)
+    bugun = datetime.now(timezone.utc)
+    tarih = lambda: (bugun - timedelta(days=rnd.randint(0, 90))).strftime("%Y-%m-%d")
+    now = bugun.isoformat()
+    db = await _asil_get_db()
+    try:
+        await db.executemany(
+            """INSERT INTO cimento_giris (id, giris_miktari, kantar_kg_miktari, aradaki_fark, giris_tutari,
+               nakliye_genel_toplam, created_at, updated_at, user_id, user_name) VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', '')""",
+            [(f"cg{i}", rnd.uniform(20, 30), rnd.uniform(20, 30), rnd.uniform(-1, 1), rnd.uniform(1e3, 1e4),
+              rnd.uniform(100, 900), now, now) for i in range(satir)],
+        )
+        await db.executemany(
+            "INSERT INTO personeller (id, ad_soyad, aktif, maas, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(f"p{i}", f"Personel {i}", rnd.random() < 0.9, rnd.uniform(2e4, 6e4), now) for i in range(satir // 20)],
+        )
+        await db.executemany(
+            "INSERT INTO puantaj (id, personel_id, personel_adi, tarih, created_at) VALUES (?, ?, '', ?, ?)",
+            [(f"pu{i}", f"p{i % max(satir // 20, 1)}", tarih(), now) for i in range(satir)],
+        )
+        await db.executemany(
+            "INSERT INTO izinler (id, personel_id, personel_adi, izin_turu, baslangic_tarihi, bitis_tarihi, durum, created_at) "
+            "VALUES (?, '', '', 'Yıllık', ?, ?, ?, ?)",
+            [(f"iz{i}", tarih(), tarih(), rnd.choice(["Beklemede", "Onaylandı"]), now) for i in range(satir // 10)],
+        )
+        await db.executemany(
+            """INSERT INTO motorin_alimlar (id, tarih, miktar_litre, birim_fiyat, toplam_tutar, created_at, created_by, created_by_name)
+               VALUES (?, ?, ?, 40, ?, ?, '', '')""",
+            [(f"ma{i}", tarih(), m, m * 40, now) for i, m in ((i, rnd.uniform(1e3, 5e3)) for i in range(satir // 10))],
+        )
+        await db.executemany(
+            """INSERT INTO motorin_verme (id, tarih, arac_id, miktar_litre, created_at, created_by, created_by_name)
+               VALUES (?, ?, 'a', ?, ?, '', '')""",
+            [(f"mv{i}", tarih(), rnd.uniform(20, 300), now) for i in range(satir)],
+        )
+        await db.executemany(
+            """INSERT INTO teklifler (id, teklif_no, teklif_tarihi, genel_toplam, durum, created_at, created_by, created_by_name)
+               VALUES (?, ?, ?, ?, ?, ?, '', '')""",
+            [(f"t{i}", f"T{i}", tarih(), rnd.uniform(1e3, 1e5),
+              rnd.choice(['taslak', 'gonderildi', 'beklemede', 'kabul_edildi', 'reddedildi']), now) for i in range(satir)],
+        )
+        await db.executemany(
+            "INSERT INTO irsaliyeler (id, irsaliye_no, tarih, tur, tutar, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [(f"i{i}", f"I{i}", tarih(), rnd.choice(['gelen', 'giden']), rnd.uniform(100, 1e4), now) for i in range(satir)],
+        )
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def olc(fn, tekrar: int):
+    """Return (queries per call, median ms) for an async callable."""
+    _sorgu_sayaci["n"] = 0
+    await fn()
+    sorgu = _sorgu_sayaci["n"]
+    sureler = []
+    for _ in range(tekrar):
+        t0 = time.perf_counter()
+        await fn()
+        sureler.append((time.perf_counter() - t0) * 1000)
+    return sorgu, statistics.median(sureler)
+
+
+async def main(satir: int, tekrar: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        server.DB_PATH = Path(tmp) / "bench.db"
+        await server.init_db()
+        await doldur(satir)
+        server.get_db = _sayan_get_db
+
+        print(f"{satir} satır, {tekrar} tekrar (medyan)\n")
+        print(f"{'endpoint':<22}{'sorgu (önce→sonra)':>20}{'ms önce':>12}{'ms sonra':>12}{'hızlanma':>11}")
+        for ad, eski, yeni in KARSILASTIRMALAR:
+            eski_sorgu, eski_ms = await olc(eski, tekrar)
+            yeni_sorgu, yeni_ms = await olc(yeni, tekrar)
+            print(f"{ad:<22}{f'{eski_sorgu} → {yeni_sorgu}':>20}{eski_ms:>12.2f}{yeni_ms:>12.2f}{eski_ms / yeni_ms:>10.1f}x")
+        server.get_db = _asil_get_db
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--satir", type=int, default=20000, help="tablo başına sentetik kayıt sayısı")
+    parser.add_argument("--tekrar", type=int, default=20, help="ölçüm başına tekrar")
+    args = parser.parse_args()
+    asyncio.run(main(args.satir, args.tekrar))
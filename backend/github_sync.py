@@ -4,32 +4,83 @@ GitHub Auto-Sync Module
 Automatically pushes data changes to a GitHub repository whenever
 records are created, updated, or deleted in the BIMS system.
 
-Each modification triggers (with debouncing to batch rapid changes):
-  1. Push of the affected table as JSON  -> data/<table>.json
-  2. Push of the full SQLite database     -> backups/database.db
+All modifications within a sync window are written as a single commit
+through the Git Data API. The window adapts: GITHUB_SYNC_WINDOW_SECONDS when
+writes are quiet, longer (up to GITHUB_SYNC_WINDOW_MAX_SECONDS) under a busy
+write rate, and cycles are spaced so GitHub's remaining rate-limit quota
+(X-RateLimit-Remaining / X-RateLimit-Reset) lasts until it resets:
+  1. Each changed table's changed rows -> data/<table>/changes-<seq>.ndjson
+     (a full snapshot data/<table>.json is re-pushed periodically as compaction)
+  2. The SQLite database, as content-defined chunks -> backups/chunks/<sha256>
+     plus a manifest backups/database.manifest.json; only chunks not already
+     on GitHub are uploaded (at most once per GITHUB_DB_BACKUP_MIN_INTERVAL seconds).
+     The manifest records the backup's changelog seq; restore replays the
+     snapshots/deltas pushed after it, so the backup interval loses no data
+
+Pending pushes live in the sync_outbox table: a trigger on the changelog
+enqueues the dirty table (and the database backup) in the same transaction
+as the write, and sync_worker() drains it with exponential backoff on
+failure. Entries survive restarts, so nothing queued is lost to a crash.
+
+Only one process pushes at a time: the worker holding the sync lease (a row
+in sync_lease, renewed while it runs). With several uvicorn workers, run the
+pusher separately with GITHUB_SYNC_WORKER=external and
+
+    python -m github_sync worker
+
+so API processes only enqueue and never talk to GitHub.
+
+Changed rows come from the degisiklik_gunlugu changelog, which SQLite
+triggers fill with (seq, table, id, operation). Reader contract: a consumer
+rebuilds a table by loading data/<table>.json and applying, in seq order,
+every line of data/<table>/changes-*.ndjson whose "seq" is greater than the
+snapshot's "seq" ("upsert" replaces the row with "row", "delete" removes
+"id"). The commit that writes a compacted snapshot deletes the delta files
+it supersedes, so data/<table>/ only holds changes made after the snapshot.
 
 Environment variables required:
   GITHUB_TOKEN          : Personal Access Token with 'repo' scope
   GITHUB_REPO           : 'owner/repo' (e.g., 'alperenacer-eng/alperen')
   GITHUB_BRANCH         : Target branch (default: 'main')
   GITHUB_SYNC_ENABLED   : 'true' to enable (default: 'true')
+  GITHUB_SYNC_WORKER    : 'embedded' (worker inside the API, default) or 'external'
 """
 from __future__ import annotations
 
 import os
+import gzip
+import random
+import signal
+import socket
+import argparse
 import json
 import base64
+import shutil
+import sqlite3
+import hashlib
 import asyncio
+import tempfile
+import re
+import zlib
+import math
+import importlib.util
 import logging
+import time
 from pathlib import Path
 from datetime import datetime, timezone
-from typing import Optional, Dict
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, List
 
 import httpx
 import aiosqlite
 
 logger = logging.getLogger("github_sync")
 
+if __name__ == "__main__":
+    # Standalone worker: pick up backend/.env before the configuration is read, like server.py
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).parent / ".env")
+
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
@@ -43,10 +94,64 @@ API_BASE = "https://api.github.com"
 # Tables that must NEVER be pushed to GitHub (security / privacy)
 SKIP_TABLES = {"users"}  # contains password hashes
 
-# Debounce window (seconds) — multiple rapid changes get coalesced
+# Sync window (seconds) — every table changed within it goes out as one commit
 # Kısaltıldı: Container aniden kapanırsa daha az veri kaybı olur.
-TABLE_DEBOUNCE_SECONDS = 1
-DB_DEBOUNCE_SECONDS = 2
+SYNC_WINDOW_SECONDS = float(os.environ.get("GITHUB_SYNC_WINDOW_SECONDS", "1"))
+
+# Shared HTTP client: keep-alive connections are reused across pushes so each
+# push does not pay a new TCP + TLS handshake. HTTP/2 is used when the optional
+# `h2` package is installed (pip install "httpx[http2]").
+HTTP_LIMITS = httpx.Limits(
+    max_connections=int(os.environ.get("GITHUB_HTTP_MAX_CONNECTIONS", "10")),
+    max_keepalive_connections=int(os.environ.get("GITHUB_HTTP_MAX_KEEPALIVE", "5")),
+    keepalive_expiry=float(os.environ.get("GITHUB_HTTP_KEEPALIVE_SECONDS", "60")),
+)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Full database backups are throttled; table deltas carry the per-write changes.
+DB_BACKUP_MIN_INTERVAL_SECONDS = int(os.environ.get("GITHUB_DB_BACKUP_MIN_INTERVAL", "900"))
+
+# database.db is backed up from a consistent copy (SQLite online backup API),
+# split into content-defined chunks that are compressed one by one. "auto"
+# picks zstd when the optional `zstandard` package is installed, otherwise gzip.
+DB_BACKUP_COMPRESSION = os.environ.get("GITHUB_DB_BACKUP_COMPRESSION", "auto").strip().lower()
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+DB_MANIFEST_PATH = "backups/database.manifest.json"
+DB_CHUNK_DIR = "backups/chunks"
+DB_CHUNK_AVG_BYTES = int(os.environ.get("GITHUB_DB_CHUNK_AVG_KB", "512")) * 1024
+# Older backup layouts, still understood by restore
+DB_BACKUP_PATH = "backups/database.db"
+DB_BACKUP_META_PATH = "backups/database.meta.json"
+_BACKUP_SUFFIXES = {"zstd": ".zst", "gzip": ".gz", "none": ""}
+_COPY_CHUNK = 1 << 20
+
+# Failed outbox entries are retried with exponential backoff (+ jitter)
+SYNC_RETRY_BASE_SECONDS = float(os.environ.get("GITHUB_SYNC_RETRY_BASE_SECONDS", "5"))
+SYNC_RETRY_MAX_SECONDS = float(os.environ.get("GITHUB_SYNC_RETRY_MAX_SECONDS", "900"))
+# Under load the window stretches by one base window per SYNC_WINDOW_WRITES_STEP
+# writes/minute, up to SYNC_WINDOW_MAX_SECONDS (the longest a dirty table waits).
+SYNC_WINDOW_MAX_SECONDS = float(os.environ.get("GITHUB_SYNC_WINDOW_MAX_SECONDS", "120"))
+SYNC_WINDOW_WRITES_STEP = 6
+# Requests kept back from the hourly quota for restore / push-all
+RATE_LIMIT_RESERVE = int(os.environ.get("GITHUB_RATE_LIMIT_RESERVE", "200"))
+# Database backups (many blob uploads) wait for the reset below this share of the quota
+DB_BACKUP_MIN_QUOTA_SHARE = float(os.environ.get("GITHUB_DB_BACKUP_MIN_QUOTA_SHARE", "0.25"))
+
+# An idle worker re-reads the outbox this often (an external worker gets no wake-ups)
+SYNC_IDLE_POLL_SECONDS = float(os.environ.get("GITHUB_SYNC_POLL_SECONDS", "2"))
+
+# "embedded": every API process runs sync_worker (only the lease holder pushes);
+# "external": API processes only enqueue, `python -m github_sync worker` pushes.
+SYNC_WORKER_MODE = os.environ.get("GITHUB_SYNC_WORKER", "embedded").strip().lower()
+# The lease must outlive the longest single push; a crashed holder is replaced after it expires
+SYNC_LEASE_SECONDS = float(os.environ.get("GITHUB_SYNC_LEASE_SECONDS", "300"))
+
+# Table snapshots are encoded in batches of rows into a spooled temp file
+EXPORT_BATCH_ROWS = 1000
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+# After this many delta files a table gets a fresh compacted snapshot.
+SNAPSHOT_EVERY_DELTAS = int(os.environ.get("GITHUB_SNAPSHOT_EVERY_DELTAS", "100"))
 
 # URL prefixes that should not trigger any sync
 SKIP_URL_PREFIXES = ("auth/", "upload-file")
@@ -63,6 +168,7 @@ URL_TO_TABLE: Dict[str, str] = {
     "operators": "operators",
     "molds": "molds",
     "production": "production_records",
+    "donem-kapanis": "donem_kapanislari",
 
     # BIMS Stock
     "bims-stok-urunler": "bims_stok_urunler",
@@ -131,20 +237,43 @@ URL_TO_TABLE: Dict[str, str] = {
 # Sorted by length descending, so longer prefixes win during matching.
 _SORTED_URL_KEYS = sorted(URL_TO_TABLE.keys(), key=len, reverse=True)
 
+_SYNCED_TABLES = frozenset(URL_TO_TABLE.values()) - SKIP_TABLES
+
 # Path to the SQLite database (must match server.py)
 DB_PATH = Path(__file__).parent / "data" / "database.db"
 
 # ---------------------------------------------------------------------------
 # Internal state
 # ---------------------------------------------------------------------------
-_debounce_tasks: Dict[str, asyncio.Task] = {}
+_background_tasks: set = set()  # fire-and-forget enqueue tasks (kept referenced)
+_client: Optional[httpx.AsyncClient] = None
 _state_lock = asyncio.Lock()
+_wake = asyncio.Event()  # set by schedule_sync to wake the outbox worker
+_last_db_push_at = 0.0  # time.monotonic() of the last full-database push
+_lease_until = 0.0  # time.time() until which this process holds the sync lease
+_standalone = False  # True inside `python -m github_sync worker`
+_head: Optional[tuple] = None  # (commit sha, tree sha) of the branch head after our last commit
+
+# Adaptive scheduler state
+_rate_limit = {"limit": None, "remaining": None, "reset_at": None, "paused_until": 0.0}
+_write_rate = 0.0  # changelog rows per second (exponentially weighted, ~1 min)
+_seq_sample: Optional[tuple] = None  # (time.time(), changelog seq) of the last sample
+_requests_per_cycle = 4.0  # API requests a sync cycle costs (exponentially weighted)
+_cycle_requests = 0  # API responses seen since the current cycle started
+_last_cycle_at = 0.0  # time.time() when the last sync cycle ended
+_schedule: dict = {}  # last decisions of _plan_schedule (for the status endpoint)
 
 # Status counters (for monitoring)
 _stats = {
     "total_attempts": 0,
     "total_success": 0,
     "total_failed": 0,
+    "delta_pushes": 0,
+    "snapshot_pushes": 0,
+    "bytes_pushed": 0,
+    "sha_lookups": 0,
+    "skipped_unchanged": 0,
+    "last_db_backup": None,
     "last_success_at": None,
     "last_error": None,
     "last_error_at": None,
@@ -153,13 +282,29 @@ _stats = {
 
 def get_stats() -> dict:
     """Return current sync statistics (for debugging endpoint)."""
-    return dict(_stats)
+    _plan_schedule(time.time())
+    return {**_stats, "scheduler": dict(_schedule)}
 
 
 def is_configured() -> bool:
     return bool(GITHUB_TOKEN and GITHUB_REPO and GITHUB_SYNC_ENABLED)
 
 
+def embedded_worker() -> bool:
+    """True when API processes run sync_worker themselves (GITHUB_SYNC_WORKER=embedded)."""
+    return SYNC_WORKER_MODE != "external"
+
+
+def _may_push() -> bool:
+    # With an external worker, API processes only enqueue
+    return embedded_worker() or _standalone
+
+
+def synced_tables() -> List[str]:
+    """Every table that can be pushed (server.py adds changelog triggers for these)."""
+    return sorted(_SYNCED_TABLES)
+
+
 # ---------------------------------------------------------------------------
 # URL path -> table resolution
 # ---------------------------------------------------------------------------
@@ -201,6 +346,83 @@ def resolve_table_from_path(path: str) -> Optional[str]:
     return None
 
 
+# ---------------------------------------------------------------------------
+# Shared HTTP client
+# ---------------------------------------------------------------------------
+def get_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=HTTP_LIMITS,
+            timeout=httpx.Timeout(60.0, connect=15.0),
+            event_hooks={"response": [note_rate_limit]},
+        )
+    return _client
+
+
+def _header_number(headers: httpx.Headers, name: str) -> Optional[float]:
+    try:
+        return float(headers[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def _retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either a number of seconds or an HTTP-date; None if unparseable."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+async def note_rate_limit(response: httpx.Response) -> None:
+    """
+    Response hook: track GitHub's rate-limit headers; pause syncing when limited.
+
+    Headers are parsed defensively - an exception here would fail the request
+    as a network error and start backoff instead of the pause.
+    """
+    global _cycle_requests
+    _cycle_requests += 1
+    headers = response.headers
+    remaining = _header_number(headers, "x-ratelimit-remaining")
+    if remaining is not None:
+        _rate_limit["remaining"] = int(remaining)
+        _rate_limit["limit"] = int(_header_number(headers, "x-ratelimit-limit") or 0) or _rate_limit["limit"]
+        _rate_limit["reset_at"] = _header_number(headers, "x-ratelimit-reset") or None
+    retry_after = headers.get("retry-after")
+    if response.status_code in (403, 429) and (retry_after or remaining == 0):
+        # Secondary limit: GitHub says how long; primary limit (or an unreadable
+        # Retry-After): wait for the reset, or a minute when that is unknown too
+        now = time.time()
+        wait = _retry_after_seconds(retry_after)
+        reset_at = _rate_limit["reset_at"]
+        until = now + wait if wait is not None else (reset_at if reset_at and reset_at > now else now + 60)
+        _rate_limit["paused_until"] = max(_rate_limit["paused_until"], until)
+        logger.warning("GitHub rate limit hit, syncing paused for %.0f s", until - now)
+
+
+async def open_client() -> None:
+    """Startup hook: create the shared client before the first push/restore."""
+    get_client()
+
+
+async def close_client() -> None:
+    """Shutdown hook: close pooled connections (call after flush_pending_pushes)."""
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
+
+
 # ---------------------------------------------------------------------------
 # GitHub API helpers
 # ---------------------------------------------------------------------------
@@ -218,6 +440,7 @@ async def _get_existing_sha(client: httpx.AsyncClient, path: str) -> Optional[st
         r = await client.get(
             url, params={"ref": GITHUB_BRANCH}, headers=_headers(), timeout=15.0
         )
+        _stats["sha_lookups"] += 1
         if r.status_code == 200:
             return r.json().get("sha")
     except Exception:
@@ -225,61 +448,428 @@ async def _get_existing_sha(client: httpx.AsyncClient, path: str) -> Optional[st
     return None
 
 
+# ---------------------------------------------------------------------------
+# Known blob SHAs (path -> sha of the version on GitHub)
+# ---------------------------------------------------------------------------
+# Kept next to the database rather than inside it, so recording the sha of
+# backups/database.db does not itself change database.db. The file is tagged
+# with the repo and branch it describes; any other target starts empty, so a
+# switched repo gets every chunk and snapshot uploaded instead of skipped.
+_sha_map: Optional[Dict[str, str]] = None
+_sha_map_scope: Optional[tuple] = None  # (repo, branch) _sha_map belongs to
+
+
+def _sync_scope() -> tuple:
+    return (GITHUB_REPO, GITHUB_BRANCH)
+
+
+def _sha_map_path() -> Path:
+    return DB_PATH.parent / "github_sync_sha.json"
+
+
+def _blob_sha(content_bytes: bytes) -> str:
+    """Git blob SHA-1 of the content (what the Contents API reports as `sha`)."""
+    return hashlib.sha1(b"blob %d\0" % len(content_bytes) + content_bytes).hexdigest()
+
+
+def _known_shas() -> Dict[str, str]:
+    global _sha_map, _sha_map_scope, _head
+    scope = _sync_scope()
+    if _sha_map is None or _sha_map_scope != scope:
+        if _sha_map_scope is not None and _sha_map_scope != scope:
+            _head = None  # cached head belongs to the old target too
+        _sha_map, _sha_map_scope = {}, scope
+        try:
+            with open(_sha_map_path(), "r", encoding="utf-8") as f:
+                stored = json.load(f)
+            if [stored.get("repo"), stored.get("branch")] == list(scope):
+                _sha_map = stored["shas"]
+            else:
+                logger.info("sha map is for %s@%s, starting empty", stored.get("repo"), stored.get("branch"))
+        except FileNotFoundError:
+            pass
+        except Exception:
+            logger.exception("could not read %s, starting empty", _sha_map_path())
+    return _sha_map
+
+
+def _remember_sha(path: str, sha: Optional[str]) -> None:
+    """Record the sha now on GitHub for path; None means the file was deleted."""
+    shas = _known_shas()
+    if shas.get(path) == sha:
+        return
+    if sha is None:
+        del shas[path]
+    else:
+        shas[path] = sha
+    try:
+        target = _sha_map_path()
+        tmp = target.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"repo": GITHUB_REPO, "branch": GITHUB_BRANCH, "shas": shas}, f, indent=0, sort_keys=True)
+        os.replace(tmp, target)
+    except Exception:
+        logger.exception("could not persist %s", _sha_map_path())
+
+
+def _record_failure(path: str, r: Optional[httpx.Response], error: Optional[str] = None) -> bool:
+    _stats["total_failed"] += 1
+    _stats["last_error"] = error or f"{r.status_code}: {r.text[:200]}"
+    _stats["last_error_at"] = datetime.now(timezone.utc).isoformat()
+    if r is not None:
+        logger.error("github push failed %s status=%s body=%s", path, r.status_code, r.text[:300])
+    return False
+
+
 async def _put_file(
     client: httpx.AsyncClient, path: str, content_bytes: bytes, message: str
 ) -> bool:
-    """Create or update a file in the repo. Returns True on success."""
+    """
+    Create or update a file in the repo. Returns True on success.
+
+    The current sha comes from the local map (updated from every PUT
+    response), so a normal push is a single PUT. If the content's blob sha
+    equals the known one the upload is skipped. Only on a conflict (stale or
+    missing sha) is the sha fetched with a GET and the PUT retried once.
+    """
     url = f"{API_BASE}/repos/{GITHUB_REPO}/contents/{path}"
-    sha = await _get_existing_sha(client, path)
+    blob_sha = _blob_sha(content_bytes)
+    known_sha = _known_shas().get(path)
+    if known_sha == blob_sha:
+        _stats["skipped_unchanged"] += 1
+        return True
+
     payload = {
         "message": message,
         "branch": GITHUB_BRANCH,
         "content": base64.b64encode(content_bytes).decode("ascii"),
     }
-    if sha:
-        payload["sha"] = sha
+    if known_sha:
+        payload["sha"] = known_sha
 
     try:
         r = await client.put(url, json=payload, headers=_headers(), timeout=60.0)
+        # 409: our sha is stale; 422: the file exists but we sent no sha.
+        # Look up the real sha once and retry.
+        if r.status_code in (409, 422):
+            current_sha = await _get_existing_sha(client, path)
+            if current_sha == blob_sha:
+                r = None
+            else:
+                payload.pop("sha", None)
+                if current_sha:
+                    payload["sha"] = current_sha
+                r = await client.put(url, json=payload, headers=_headers(), timeout=60.0)
     except Exception as e:
-        _stats["total_failed"] += 1
-        _stats["last_error"] = f"network: {e}"
-        _stats["last_error_at"] = datetime.now(timezone.utc).isoformat()
         logger.exception("github push network error for %s", path)
-        return False
+        return _record_failure(path, None, f"network: {e}")
 
-    if r.status_code in (200, 201):
-        _stats["total_success"] += 1
-        _stats["last_success_at"] = datetime.now(timezone.utc).isoformat()
-        return True
+    if r is not None and r.status_code not in (200, 201):
+        return _record_failure(path, r)
 
-    # If we got a 409 (sha conflict because someone else just pushed),
-    # try once more without sha so the API rejects-or-creates fresh.
-    if r.status_code == 409:
+    global _head
+    sha = blob_sha
+    if r is not None:
         try:
-            payload.pop("sha", None)
-            sha2 = await _get_existing_sha(client, path)
-            if sha2:
-                payload["sha"] = sha2
-            r2 = await client.put(url, json=payload, headers=_headers(), timeout=60.0)
-            if r2.status_code in (200, 201):
-                _stats["total_success"] += 1
-                _stats["last_success_at"] = datetime.now(timezone.utc).isoformat()
-                return True
-            r = r2
+            body = r.json()
+            sha = body["content"]["sha"]
+            _head = (body["commit"]["sha"], body["commit"]["tree"]["sha"])
         except Exception:
             pass
+    _remember_sha(path, sha)
+    _stats["total_success"] += 1
+    _stats["last_success_at"] = datetime.now(timezone.utc).isoformat()
+    return True
 
-    _stats["total_failed"] += 1
-    _stats["last_error"] = f"{r.status_code}: {r.text[:200]}"
-    _stats["last_error_at"] = datetime.now(timezone.utc).isoformat()
-    logger.error("github push failed %s status=%s body=%s", path, r.status_code, r.text[:300])
+
+# ---------------------------------------------------------------------------
+# Git Data API: several files in one commit
+# ---------------------------------------------------------------------------
+async def _get_head(client: httpx.AsyncClient) -> Optional[tuple]:
+    """(commit sha, tree sha) of the branch head, or None for an empty repo / missing branch."""
+    git = f"{API_BASE}/repos/{GITHUB_REPO}/git"
+    r = await client.get(f"{git}/ref/heads/{GITHUB_BRANCH}", headers=_headers(), timeout=15.0)
+    if r.status_code in (404, 409):
+        return None
+    r.raise_for_status()
+    commit_sha = r.json()["object"]["sha"]
+    r = await client.get(f"{git}/commits/{commit_sha}", headers=_headers(), timeout=15.0)
+    r.raise_for_status()
+    return commit_sha, r.json()["tree"]["sha"]
+
+
+async def _commit_files(client: httpx.AsyncClient, files: List[tuple], message: str) -> bool:
+    """
+    Write all (path, bytes) files as a single commit: blobs -> one tree ->
+    one commit -> one ref update. Text files go inline in the tree request;
+    only binary files (database chunks) need a separate blob upload.
+
+    The head from our previous commit is reused, so the steady state is three
+    requests. If someone else moved the branch the ref update is rejected as
+    a non-fast-forward; the head is then re-read and the commit rebuilt once.
+    """
+    global _head
+    git = f"{API_BASE}/repos/{GITHUB_REPO}/git"
+    try:
+        entries, binary = [], []
+        for path, content in files:
+            entry = {"path": path, "mode": "100644", "type": "blob"}
+            if content is None:
+                entry["sha"] = None  # delete the path
+                entries.append(entry)
+                continue
+            try:
+                entry["content"] = content.decode("utf-8")
+            except UnicodeDecodeError:
+                binary.append((entry, content))
+            entries.append(entry)
+        # Binary blobs (database chunks) upload concurrently, bounded by HTTP_LIMITS
+        responses = await asyncio.gather(*(
+            client.post(
+                f"{git}/blobs",
+                json={"content": base64.b64encode(content).decode("ascii"), "encoding": "base64"},
+                headers=_headers(),
+                timeout=120.0,
+            )
+            for _, content in binary
+        ))
+        for (entry, _), r in zip(binary, responses):
+            if r.status_code != 201:
+                return _record_failure(entry["path"], r)
+            entry["sha"] = r.json()["sha"]
+
+        for attempt in range(2):
+            head = _head if attempt == 0 and _head else await _get_head(client)
+            if head is None:
+                # Empty repository: the Git Data API needs a first commit (nothing to delete yet)
+                results = [
+                    await _put_file(client, path, content, message) for path, content in files if content is not None
+                ]
+                return all(results)
+
+            r = await client.post(
+                f"{git}/trees", json={"base_tree": head[1], "tree": entries}, headers=_headers(), timeout=120.0
+            )
+            if r.status_code != 201:
+                return _record_failure("git/trees", r)
+            tree_sha = r.json()["sha"]
+            r = await client.post(
+                f"{git}/commits",
+                json={"message": message, "tree": tree_sha, "parents": [head[0]]},
+                headers=_headers(),
+                timeout=30.0,
+            )
+            if r.status_code != 201:
+                return _record_failure("git/commits", r)
+            commit_sha = r.json()["sha"]
+            r = await client.patch(
+                f"{git}/refs/heads/{GITHUB_BRANCH}",
+                json={"sha": commit_sha, "force": False},
+                headers=_headers(),
+                timeout=30.0,
+            )
+            if r.status_code == 200:
+                _head = (commit_sha, tree_sha)
+                for path, content in files:
+                    _remember_sha(path, None if content is None else _blob_sha(content))
+                _stats["total_success"] += 1
+                _stats["last_success_at"] = datetime.now(timezone.utc).isoformat()
+                return True
+            if r.status_code != 422 or attempt:
+                return _record_failure(f"refs/heads/{GITHUB_BRANCH}", r)
+            _head = None
+    except Exception as e:
+        logger.exception("github commit network error")
+        return _record_failure("git", None, f"network: {e}")
     return False
 
 
+async def _push_files(files: List[tuple], message: str) -> bool:
+    """
+    Upload changed files: one Contents API PUT for a single file, one Git Data
+    commit for several. A file with content None is deleted (commit only).
+    """
+    changed = [
+        (path, content) for path, content in files
+        if _known_shas().get(path) != (None if content is None else _blob_sha(content))
+    ]
+    _stats["skipped_unchanged"] += len(files) - len(changed)
+    if not changed:
+        return True
+    _stats["total_attempts"] += 1
+    if len(changed) == 1 and changed[0][1] is not None:
+        return await _put_file(get_client(), changed[0][0], changed[0][1], message)
+    return await _commit_files(get_client(), changed, message)
+
+
 # ---------------------------------------------------------------------------
 # Data extraction
 # ---------------------------------------------------------------------------
+async def _connect() -> aiosqlite.Connection:
+    db = await aiosqlite.connect(DB_PATH, timeout=30.0)
+    db.row_factory = aiosqlite.Row
+    return db
+
+
+_SNAPSHOT_PATH = re.compile(r"data/([a-z0-9_]+)\.json")
+_DELTA_PATH = re.compile(r"data/([a-z0-9_]+)/changes-(\d+)\.ndjson")
+
+DB_TARGET = "__db__"  # sync_outbox target for the database backup
+FULL_SYNC_TARGET = "__all__"  # sync_outbox target for a queued push-all
+_NOW_SQL = "((julianday('now') - 2440587.5) * 86400.0)"  # unix time, ms precision
+
+_SYNC_TABLES_SQL = [
+    # Per-table watermark: last changelog seq already on GitHub + compaction bookkeeping
+    """CREATE TABLE IF NOT EXISTS github_sync_state (
+           table_name TEXT PRIMARY KEY,
+           pushed_seq INTEGER NOT NULL DEFAULT 0,
+           snapshot_seq INTEGER NOT NULL DEFAULT 0,
+           deltas_since_snapshot INTEGER NOT NULL DEFAULT 0,
+           updated_at TEXT
+       )""",
+    # Durable queue of pending pushes: one row per dirty table (+ __db__), coalesced by PK
+    """CREATE TABLE IF NOT EXISTS sync_outbox (
+           target TEXT PRIMARY KEY,
+           enqueued_at REAL NOT NULL,
+           updated_at REAL NOT NULL,
+           attempts INTEGER NOT NULL DEFAULT 0,
+           next_attempt_at REAL NOT NULL DEFAULT 0,
+           last_error TEXT
+       )""",
+    # Single-row lease: only its holder pushes to GitHub
+    """CREATE TABLE IF NOT EXISTS sync_lease (
+           name TEXT PRIMARY KEY,
+           holder TEXT NOT NULL,
+           expires_at REAL NOT NULL
+       )""",
+]
+
+
+def sync_schema() -> List[str]:
+    """
+    DDL for the sync bookkeeping tables plus the trigger that fills the outbox.
+
+    The trigger sits on degisiklik_gunlugu, so a write and its outbox entry
+    commit in the same transaction: nothing is lost to a crash between the
+    response and the push.
+    """
+    tables = ", ".join(f"'{t}'" for t in synced_tables())
+    upsert = f"ON CONFLICT (target) DO UPDATE SET updated_at = {_NOW_SQL}"
+    return _SYNC_TABLES_SQL + [
+        "DROP TRIGGER IF EXISTS trg_degisiklik_gunlugu_sync_outbox",
+        f"""CREATE TRIGGER trg_degisiklik_gunlugu_sync_outbox AFTER INSERT ON degisiklik_gunlugu BEGIN
+                INSERT INTO sync_outbox (target, enqueued_at, updated_at)
+                SELECT NEW.tablo, {_NOW_SQL}, {_NOW_SQL} WHERE NEW.tablo IN ({tables}) {upsert};
+                INSERT INTO sync_outbox (target, enqueued_at, updated_at)
+                VALUES ('{DB_TARGET}', {_NOW_SQL}, {_NOW_SQL}) {upsert};
+            END""",
+    ]
+
+
+async def init_sync_schema(db: aiosqlite.Connection) -> None:
+    """Create the sync tables and outbox trigger (called from init_db; caller commits)."""
+    for sql in sync_schema():
+        await db.execute(sql)
+
+
+async def _ensure_state_table(db: aiosqlite.Connection) -> None:
+    for sql in _SYNC_TABLES_SQL:
+        await db.execute(sql)
+    await db.commit()
+
+
+def _lease_holder() -> str:
+    # Evaluated on every call: forked workers must not share their parent's id
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+async def acquire_lease() -> bool:
+    """
+    Take or renew the sync lease. Only the holder may push to GitHub.
+
+    When the lease is (re)taken rather than renewed, another worker may have
+    pushed in between: the sha map and cached head are reloaded, not trusted.
+    """
+    global _lease_until, _sha_map, _head
+    now = time.time()
+    if now < _lease_until - SYNC_LEASE_SECONDS / 2:
+        return True  # still fresh, spare the write
+    renewing = now < _lease_until
+    holder = _lease_holder()
+    db = await _connect()
+    try:
+        await _ensure_state_table(db)
+        await db.execute(
+            """INSERT INTO sync_lease (name, holder, expires_at) VALUES ('push', ?, ?)
+               ON CONFLICT (name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+               WHERE sync_lease.holder = excluded.holder OR sync_lease.expires_at < ?""",
+            (holder, now + SYNC_LEASE_SECONDS, now),
+        )
+        await db.commit()
+        cursor = await db.execute("SELECT holder FROM sync_lease WHERE name = 'push'")
+        held = (await cursor.fetchone())["holder"] == holder
+    finally:
+        await db.close()
+    _lease_until = now + SYNC_LEASE_SECONDS if held else 0.0
+    if held and not renewing:
+        _sha_map, _head = None, None
+    return held
+
+
+async def release_lease() -> None:
+    global _lease_until
+    _lease_until = 0.0
+    if not DB_PATH.exists():
+        return
+    db = await _connect()
+    try:
+        await _ensure_state_table(db)
+        await db.execute("DELETE FROM sync_lease WHERE name = 'push' AND holder = ?", (_lease_holder(),))
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def _table_exists(db: aiosqlite.Connection, name: str) -> bool:
+    cursor = await db.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,))
+    return await cursor.fetchone() is not None
+
+
+async def _write_snapshot(db: aiosqlite.Connection, table_name: str, seq: Optional[int], out) -> int:
+    """
+    Stream `SELECT *` as compact JSON into a binary file object; returns the row count.
+
+    Rows are read with fetchmany and encoded batch by batch, so only one
+    batch is ever held as Python objects. No indent and no export timestamp:
+    an unchanged table must produce identical bytes so _put_file can skip it.
+    """
+    out.write(b'{"table":%s,"seq":%s,"rows":[' % (json.dumps(table_name).encode(), json.dumps(seq).encode()))
+    count = 0
+    cursor = await db.execute(f"SELECT * FROM {table_name}")
+    while True:
+        rows = await cursor.fetchmany(EXPORT_BATCH_ROWS)
+        if not rows:
+            break
+        if count:
+            out.write(b",")
+        out.write(",".join(
+            json.dumps(dict(r), ensure_ascii=False, separators=(",", ":"), default=str) for r in rows
+        ).encode("utf-8"))
+        count += len(rows)
+    await cursor.close()
+    out.write(b'],"row_count":%d}' % count)
+    return count
+
+
+async def _snapshot_bytes(db: aiosqlite.Connection, table_name: str, seq: Optional[int]) -> bytes:
+    # Spooled: small tables stay in memory, large ones are built on disk
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as out:
+        await _write_snapshot(db, table_name, seq, out)
+        size = out.tell()
+        out.seek(0)
+        return out.read(size)
+
+
 async def export_table_as_json(table_name: str) -> Optional[bytes]:
     if not DB_PATH.exists():
         return None
@@ -287,131 +877,863 @@ async def export_table_as_json(table_name: str) -> Optional[bytes]:
         async with aiosqlite.connect(DB_PATH) as db:
             db.row_factory = aiosqlite.Row
             # Make sure the table actually exists
-            cursor = await db.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
-                (table_name,),
-            )
-            row = await cursor.fetchone()
-            if not row:
+            if not await _table_exists(db, table_name):
                 return None
-            cursor = await db.execute(f"SELECT * FROM {table_name}")
-            rows = await cursor.fetchall()
-            data = [dict(r) for r in rows]
+            return await _snapshot_bytes(db, table_name, None)
     except Exception:
         logger.exception("export_table_as_json failed for %s", table_name)
         return None
 
-    payload = {
-        "table": table_name,
-        "exported_at": datetime.now(timezone.utc).isoformat(),
-        "row_count": len(data),
-        "rows": data,
+
+async def _plan_table_push(table_name: str, force_snapshot: bool = False) -> Optional[dict]:
+    """
+    Decide what to upload for a table and build the file.
+
+    Returns {"kind": "snapshot"|"delta"|"none", "path", "content", "seq", "state"}
+    (a snapshot also lists the superseded delta files under "delete") or None
+    when the table cannot be exported. Changelog rows and table rows
+    are read in one transaction, so the file is consistent with its seq.
+    """
+    if not DB_PATH.exists():
+        return None
+    db = await _connect()
+    try:
+        if not await _table_exists(db, table_name):
+            return None
+        await _ensure_state_table(db)
+        cursor = await db.execute(
+            "SELECT pushed_seq, snapshot_seq, deltas_since_snapshot FROM github_sync_state WHERE table_name = ?",
+            (table_name,),
+        )
+        state = await cursor.fetchone()
+        state = dict(state) if state else None
+        has_changelog = await _table_exists(db, "degisiklik_gunlugu")
+
+        await db.execute("BEGIN")
+        try:
+            head_seq, pruned_seq = None, 0
+            if has_changelog:
+                cursor = await db.execute(
+                    "SELECT (SELECT COALESCE(MAX(seq), 0) FROM degisiklik_gunlugu), "
+                    "(SELECT COALESCE(MAX(budanan_seq), 0) FROM degisiklik_gunlugu_durum)"
+                )
+                head_seq, pruned_seq = await cursor.fetchone()
+
+            # Full snapshot: first push, no changelog, changelog pruned past our
+            # watermark (deltas would have gaps), or time to compact.
+            if (force_snapshot or state is None or head_seq is None
+                    or state["pushed_seq"] < pruned_seq
+                    or state["deltas_since_snapshot"] >= SNAPSHOT_EVERY_DELTAS):
+                # Embedded seq is the table's own last change, so it only moves
+                # when this table changes.
+                table_seq = None
+                if has_changelog:
+                    cursor = await db.execute(
+                        "SELECT COALESCE(MAX(seq), 0) FROM degisiklik_gunlugu WHERE tablo = ?", (table_name,)
+                    )
+                    table_seq = (await cursor.fetchone())[0]
+                superseded = [
+                    path for path in _known_shas()
+                    if (m := _DELTA_PATH.fullmatch(path)) and m.group(1) == table_name
+                ]
+                return {
+                    "kind": "snapshot", "path": f"data/{table_name}.json", "seq": head_seq, "state": state,
+                    "content": await _snapshot_bytes(db, table_name, table_seq), "delete": sorted(superseded),
+                }
+
+            # Delta: latest changelog entry per changed id since the watermark
+            cursor = await db.execute(
+                """SELECT kayit_id, MAX(seq) AS seq FROM degisiklik_gunlugu
+                   WHERE tablo = ? AND seq > ? AND seq <= ? GROUP BY kayit_id ORDER BY seq""",
+                (table_name, state["pushed_seq"], head_seq),
+            )
+            changes = [(r["kayit_id"], r["seq"]) for r in await cursor.fetchall()]
+            if not changes:
+                return {"kind": "none", "path": None, "content": b"", "seq": head_seq, "state": state}
+
+            current = {}
+            ids = [c[0] for c in changes]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                cursor = await db.execute(
+                    f"SELECT * FROM {table_name} WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                )
+                for r in await cursor.fetchall():
+                    current[r["id"]] = dict(r)
+        finally:
+            await db.commit()
+    finally:
+        await db.close()
+
+    lines = []
+    for row_id, seq in changes:
+        if row_id in current:
+            entry = {"seq": seq, "op": "upsert", "id": row_id, "row": current[row_id]}
+        else:
+            entry = {"seq": seq, "op": "delete", "id": row_id}
+        lines.append(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str))
+    return {
+        "kind": "delta", "path": f"data/{table_name}/changes-{head_seq:012d}.ndjson", "seq": head_seq,
+        "state": state, "content": ("\n".join(lines) + "\n").encode("utf-8"),
     }
-    return json.dumps(payload, ensure_ascii=False, indent=2, default=str).encode("utf-8")
+
+
+async def _save_table_state(table_name: str, plan: dict) -> None:
+    if plan["seq"] is None:
+        return
+    snapshot = plan["kind"] == "snapshot"
+    prev = plan["state"] or {"snapshot_seq": 0, "deltas_since_snapshot": 0}
+    db = await _connect()
+    try:
+        await db.execute(
+            """INSERT INTO github_sync_state (table_name, pushed_seq, snapshot_seq, deltas_since_snapshot, updated_at)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT (table_name) DO UPDATE SET pushed_seq = excluded.pushed_seq,
+                   snapshot_seq = excluded.snapshot_seq, deltas_since_snapshot = excluded.deltas_since_snapshot,
+                   updated_at = excluded.updated_at""",
+            (
+                table_name,
+                plan["seq"],
+                plan["seq"] if snapshot else prev["snapshot_seq"],
+                0 if snapshot else prev["deltas_since_snapshot"] + 1,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+        await db.commit()
+    finally:
+        await db.close()
 
 
 # ---------------------------------------------------------------------------
 # Push operations
 # ---------------------------------------------------------------------------
-async def push_table_to_github(table_name: str) -> bool:
-    if not is_configured() or table_name in SKIP_TABLES:
-        return False
-    json_bytes = await export_table_as_json(table_name)
-    if json_bytes is None:
-        return False
-    _stats["total_attempts"] += 1
-    async with httpx.AsyncClient() as client:
-        return await _put_file(
-            client,
-            f"data/{table_name}.json",
-            json_bytes,
-            f"auto-sync: {table_name} ({datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')})",
-        )
+def _backup_format() -> str:
+    fmt = DB_BACKUP_COMPRESSION
+    if fmt == "auto" or (fmt == "zstd" and not ZSTD_AVAILABLE):
+        return "zstd" if ZSTD_AVAILABLE else "gzip"
+    return fmt if fmt in _BACKUP_SUFFIXES else "gzip"
+
+
+def _compress_bytes(data: bytes, fmt: str) -> bytes:
+    if fmt == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if fmt == "gzip":
+        # mtime=0: same chunk -> same bytes
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def _decompress_bytes(data: bytes, fmt: str) -> bytes:
+    if fmt == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if fmt == "gzip":
+        return gzip.decompress(data)
+    return data
+
+
+def _decompress_file(src: Path, dst: Path, fmt: str) -> str:
+    """Stream-decompress a single-file backup (pre-chunking layout); returns sha256 of the output."""
+    digest = hashlib.sha256()
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        if fmt == "zstd":
+            import zstandard
+            reader = zstandard.ZstdDecompressor().stream_reader(fin)
+        elif fmt == "gzip":
+            reader = gzip.GzipFile(fileobj=fin, mode="rb")
+        else:
+            reader = fin
+        while True:
+            chunk = reader.read(_COPY_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fout.write(chunk)
+    return digest.hexdigest()
+
+
+def _page_size(path: Path) -> int:
+    with open(path, "rb") as f:
+        header = f.read(100)
+    value = int.from_bytes(header[16:18], "big") if len(header) >= 18 else 0
+    return 65536 if value == 1 else (value or 4096)
+
+
+def _iter_chunks(path: Path, page_size: int):
+    """
+    Yield content-defined chunks of a SQLite file.
+
+    SQLite rewrites whole pages in place, so boundaries are only placed
+    between pages: a chunk ends after a page whose crc32 hits the cut
+    condition (or at the max size). A changed page can only move the
+    boundaries next to it, so the other chunks keep their hashes.
+    """
+    min_pages = max(1, DB_CHUNK_AVG_BYTES // page_size // 4)
+    max_pages = max(min_pages, DB_CHUNK_AVG_BYTES // page_size * 4)
+    spread = max(1, DB_CHUNK_AVG_BYTES // page_size - min_pages)
+    chunk, pages = [], 0
+    with open(path, "rb") as f:
+        while True:
+            page = f.read(page_size)
+            if not page:
+                break
+            chunk.append(page)
+            pages += 1
+            if pages >= max_pages or (pages >= min_pages and zlib.crc32(page) % spread == 0):
+                yield b"".join(chunk)
+                chunk, pages = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def snapshot_database(snapshots: Optional[Dict[str, str]] = None) -> Optional[List[tuple]]:
+    """
+    Build the database backup files: the chunks not yet on GitHub plus the manifest.
+
+    The copy is made with the SQLite online backup API in a single step, i.e.
+    inside one read transaction, so it can never be a torn mid-write file.
+    Chunks are addressed by the sha256 of their raw bytes; one already in the
+    known-sha map is on GitHub and is neither compressed nor uploaded again.
+
+    The manifest also records the copy's changelog seq and the blob shas of
+    the table snapshots it matches (`snapshots` adds the ones going out in
+    the same commit), so restore can replay whatever was pushed after it.
+    Blocking - call through asyncio.to_thread.
+    """
+    if not DB_PATH.exists():
+        return None
+    started = time.perf_counter()
+    fmt = _backup_format()
+    suffix = _BACKUP_SUFFIXES[fmt]
+    known = _known_shas()
+    files, chunks, seen = [], [], set()
+    whole = hashlib.sha256()
+    with tempfile.TemporaryDirectory(dir=DB_PATH.parent) as tmp:
+        raw = Path(tmp) / "snapshot.db"
+        src = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=30.0)
+        dst = sqlite3.connect(raw)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        page_size = _page_size(raw)
+        size = raw.stat().st_size
+        con = sqlite3.connect(raw)
+        try:
+            row = con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'degisiklik_gunlugu'").fetchone()
+        except sqlite3.Error:
+            row = None  # no AUTOINCREMENT table yet
+        finally:
+            con.close()
+        for chunk in _iter_chunks(raw, page_size):
+            whole.update(chunk)
+            digest = hashlib.sha256(chunk).hexdigest()
+            chunks.append({"hash": digest, "size": len(chunk)})
+            path = f"{DB_CHUNK_DIR}/{digest}{suffix}"
+            if path in known or path in seen:
+                continue
+            seen.add(path)
+            files.append((path, _compress_bytes(chunk, fmt)))
+    manifest = {
+        "format": fmt,
+        "page_size": page_size,
+        "size": size,
+        "sha256": whole.hexdigest(),
+        "changelog_seq": row[0] if row else 0,
+        "snapshots": {
+            **{p: sha for p, sha in known.items() if _SNAPSHOT_PATH.fullmatch(p)},
+            **(snapshots or {}),
+        },
+        "chunks": chunks,
+    }
+    uploaded = sum(len(content) for _, content in files)
+    _stats["last_db_backup"] = {
+        "format": fmt,
+        "size": size,
+        "chunks": len(chunks),
+        "new_chunks": len(files),
+        "uploaded_bytes": uploaded,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    files.append((DB_MANIFEST_PATH, json.dumps(manifest, separators=(",", ":")).encode("utf-8")))
+    return files
+
+
+async def _push_batch(tables: List[str], force_snapshot: bool = False, include_db: bool = False) -> dict:
+    """
+    Push the given tables' changes (and optionally database.db) as one commit.
+
+    Returns {"tables": {table: bool}, "database": bool, "retry": [tables]}
+    where "retry" lists tables that had something to push but failed.
+    """
+    global _last_db_push_at
+    result = {"tables": {}, "database": False, "retry": []}
+    if not is_configured():
+        return result
+    async with _state_lock:
+        plans = {}
+        for table in tables:
+            if table in SKIP_TABLES:
+                result["tables"][table] = False
+                continue
+            try:
+                plans[table] = await _plan_table_push(table, force_snapshot)
+            except Exception:
+                logger.exception("could not prepare push for %s", table)
+                plans[table] = None
+        files = [(p["path"], p["content"]) for p in plans.values() if p and p["kind"] != "none"]
+        # Compaction: drop the deltas a new snapshot supersedes (content None = delete)
+        files.extend((path, None) for p in plans.values() if p for path in p.get("delete", []))
+
+        db_files = None
+        if include_db:
+            snapshots = {
+                p["path"]: _blob_sha(p["content"]) for p in plans.values() if p and p["kind"] == "snapshot"
+            }
+            try:
+                db_files = await asyncio.to_thread(snapshot_database, snapshots)
+            except Exception:
+                logger.exception("could not snapshot database")
+        if db_files is not None:
+            _last_db_push_at = time.monotonic()
+            files.extend(db_files)
+
+        names = [t for t, p in plans.items() if p and p["kind"] != "none"]
+        if db_files is not None:
+            names.append("database.db")
+        stamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+        ok = await _push_files(files, f"auto-sync: {', '.join(names) or 'no changes'} ({stamp})")
+
+        for table, plan in plans.items():
+            result["tables"][table] = plan is not None and ok
+            if plan is None or plan["kind"] == "none":
+                continue
+            if not ok:
+                result["retry"].append(table)
+                continue
+            _stats["delta_pushes" if plan["kind"] == "delta" else "snapshot_pushes"] += 1
+            _stats["bytes_pushed"] += len(plan["content"])
+            await _save_table_state(table, plan)
+        if db_files is not None:
+            result["database"] = ok
+            if ok:
+                _stats["bytes_pushed"] += sum(len(content) for _, content in db_files)
+    return result
+
+
+async def push_table_to_github(table_name: str, force_snapshot: bool = False) -> bool:
+    """Push the table's changes since the last push (or a compacted snapshot)."""
+    result = await _push_batch([table_name], force_snapshot=force_snapshot)
+    return result["tables"].get(table_name, False)
 
 
 async def push_database_to_github() -> bool:
-    if not is_configured() or not DB_PATH.exists():
-        return False
-    try:
-        with open(DB_PATH, "rb") as f:
-            content = f.read()
-    except Exception:
-        logger.exception("could not read database file")
-        return False
-    _stats["total_attempts"] += 1
-    async with httpx.AsyncClient() as client:
-        return await _put_file(
-            client,
-            "backups/database.db",
-            content,
-            f"auto-backup: database.db ({datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')})",
-        )
+    return (await _push_batch([], include_db=True))["database"]
 
 
 # ---------------------------------------------------------------------------
-# Debounced trigger (called from middleware)
+# Sync outbox + worker
 # ---------------------------------------------------------------------------
-async def _delayed_push_table(table: str):
+def _db_backup_wait() -> float:
+    return DB_BACKUP_MIN_INTERVAL_SECONDS - (time.monotonic() - _last_db_push_at)
+
+
+# ---------------------------------------------------------------------------
+# Adaptive scheduling
+# ---------------------------------------------------------------------------
+def _quota_reset_in(now: float) -> Optional[float]:
+    # Seconds until the quota resets; None when unknown or already reset (remaining is stale)
+    reset_at = _rate_limit["reset_at"]
+    if _rate_limit["remaining"] is None or not reset_at or reset_at <= now:
+        return None
+    return reset_at - now
+
+
+def _plan_schedule(now: float) -> dict:
+    """
+    Decide how long writes are coalesced and how far apart cycles must be:
+    the window grows with the write rate, and the spacing makes the remaining
+    quota (minus RATE_LIMIT_RESERVE) last until GitHub resets it.
+    """
+    window = min(SYNC_WINDOW_MAX_SECONDS,
+                 SYNC_WINDOW_SECONDS * (1 + _write_rate * 60 / SYNC_WINDOW_WRITES_STEP))
+    reset_in = _quota_reset_in(now)
+    budget_gap = 0.0
+    db_deferred = False
+    if reset_in is not None:
+        usable = _rate_limit["remaining"] - RATE_LIMIT_RESERVE
+        budget_gap = reset_in if usable <= 0 else reset_in * _requests_per_cycle / usable
+        db_deferred = bool(_rate_limit["limit"]) and \
+            _rate_limit["remaining"] < _rate_limit["limit"] * DB_BACKUP_MIN_QUOTA_SHARE
+    next_cycle_at = max(_last_cycle_at + max(window, budget_gap), _rate_limit["paused_until"])
+    db_wait = max(_db_backup_wait(), reset_in if db_deferred else 0.0)
+
+    _schedule.update({
+        "write_rate_per_min": round(_write_rate * 60, 1),
+        "window_seconds": round(window, 1),
+        "budget_gap_seconds": round(budget_gap, 1),
+        "next_cycle_in": round(max(0.0, next_cycle_at - now), 1),
+        "db_backup_in": round(max(0.0, db_wait), 1),
+        "db_deferred_for_quota": db_deferred,
+        "requests_per_cycle": round(_requests_per_cycle, 1),
+        "rate_limit": {
+            "limit": _rate_limit["limit"],
+            "remaining": _rate_limit["remaining"],
+            "reset_in": None if reset_in is None else round(reset_in),
+            "paused_for": round(max(0.0, _rate_limit["paused_until"] - now)),
+        },
+    })
+    return {"window": window, "next_cycle_at": next_cycle_at, "db_ready_at": now + db_wait}
+
+
+async def _sample_write_rate() -> None:
+    """Update the write-rate estimate from the changelog's sequence (shared by all processes)."""
+    global _write_rate, _seq_sample
+    db = await _connect()
     try:
-        await asyncio.sleep(TABLE_DEBOUNCE_SECONDS)
-        await push_table_to_github(table)
-    except asyncio.CancelledError:
-        pass
-    except Exception:
-        logger.exception("delayed table push failed for %s", table)
+        cursor = await db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'degisiklik_gunlugu'")
+        row = await cursor.fetchone()
+    finally:
+        await db.close()
+    now, seq = time.time(), row["seq"] if row else 0
+    if _seq_sample is not None and now > _seq_sample[0]:
+        elapsed = now - _seq_sample[0]
+        weight = 1 - math.exp(-elapsed / 60)
+        _write_rate += weight * (max(0, seq - _seq_sample[1]) / elapsed - _write_rate)
+    _seq_sample = (now, seq)
+
+
+async def enqueue(targets: List[str]) -> None:
+    """Add targets (table names or DB_TARGET) to the outbox, coalescing with pending entries."""
+    db = await _connect()
+    try:
+        await _ensure_state_table(db)
+        await db.executemany(
+            f"""INSERT INTO sync_outbox (target, enqueued_at, updated_at) VALUES (?, {_NOW_SQL}, {_NOW_SQL})
+                ON CONFLICT (target) DO UPDATE SET updated_at = excluded.updated_at""",
+            [(t,) for t in targets],
+        )
+        await db.commit()
+    finally:
+        await db.close()
+    _wake.set()
 
 
-async def _delayed_push_db():
+async def _outbox_rows(ignore_backoff: bool = False) -> List[dict]:
+    if not DB_PATH.exists():
+        return []
+    db = await _connect()
     try:
-        await asyncio.sleep(DB_DEBOUNCE_SECONDS)
-        await push_database_to_github()
-    except asyncio.CancelledError:
-        pass
-    except Exception:
-        logger.exception("delayed db push failed")
+        await _ensure_state_table(db)
+        cursor = await db.execute(
+            "SELECT * FROM sync_outbox WHERE ? OR next_attempt_at <= ? ORDER BY enqueued_at",
+            (1 if ignore_backoff else 0, time.time()),
+        )
+        return [dict(r) for r in await cursor.fetchall()]
+    finally:
+        await db.close()
+
+
+async def _settle_outbox(done: List[dict], failed: List[dict]) -> None:
+    """Drop pushed entries (unless re-dirtied meanwhile) and back off the failed ones."""
+    if not done and not failed:
+        return
+    now = time.time()
+    db = await _connect()
+    try:
+        await db.executemany(
+            "DELETE FROM sync_outbox WHERE target = ? AND updated_at <= ?",
+            [(row["target"], row["updated_at"]) for row in done],
+        )
+        await db.executemany(
+            "UPDATE sync_outbox SET attempts = attempts + 1, next_attempt_at = ?, last_error = ? WHERE target = ?",
+            [
+                (
+                    now + min(SYNC_RETRY_MAX_SECONDS, SYNC_RETRY_BASE_SECONDS * 2 ** row["attempts"])
+                    * random.uniform(0.5, 1.0),
+                    _stats["last_error"],
+                    row["target"],
+                )
+                for row in failed
+            ],
+        )
+        await db.commit()
+    finally:
+        await db.close()
+
+
+async def sync_now(tables: Optional[List[str]] = None, force_snapshot: bool = False,
+                   force_db: bool = False, ignore_backoff: bool = False) -> dict:
+    """
+    Run one sync cycle: every table due in the outbox (plus the given ones)
+    and, when due, database.db go out as a single commit. Pushed entries
+    leave the outbox; failed ones stay with an exponential backoff.
+    The caller must hold the sync lease.
+    """
+    global _cycle_requests, _requests_per_cycle, _last_cycle_at
+    rows = await _outbox_rows(ignore_backoff)
+    table_rows = {r["target"]: r for r in rows if r["target"] not in (DB_TARGET, FULL_SYNC_TARGET)}
+    db_row = next((r for r in rows if r["target"] == DB_TARGET), None)
+    full_row = next((r for r in rows if r["target"] == FULL_SYNC_TARGET), None)
+    if full_row is not None:
+        tables, force_snapshot, force_db = synced_tables(), True, True
+    include_db = force_db or (db_row is not None and _plan_schedule(time.time())["db_ready_at"] <= time.time())
+
+    batch = sorted(set(table_rows) | set(tables or []))
+    _cycle_requests = 0
+    result = await _push_batch(batch, force_snapshot=force_snapshot, include_db=include_db)
+    retry = set(result.pop("retry"))
+    if _cycle_requests:
+        _requests_per_cycle += 0.2 * (_cycle_requests - _requests_per_cycle)
+    _last_cycle_at = time.time()
+
+    done = [r for t, r in table_rows.items() if t not in retry]
+    failed = [r for t, r in table_rows.items() if t in retry]
+    if db_row is not None and include_db:
+        (done if result["database"] else failed).append(db_row)
+    if full_row is not None:
+        (done if result["database"] and not retry else failed).append(full_row)
+    await _settle_outbox(done, failed)
+    return result
+
+
+async def _next_outbox_delay() -> Optional[float]:
+    """Seconds until the earliest outbox entry is due (<= 0: now), None when empty."""
+    try:
+        await _sample_write_rate()
+    except sqlite3.Error:
+        pass  # no changelog yet
+    now = time.time()
+    plan = _plan_schedule(now)
+    due = None
+    for row in await _outbox_rows(ignore_backoff=True):
+        # Push once writes pause for SYNC_WINDOW_SECONDS, or at the latest after the
+        # adaptive window; never before the quota allows the next cycle or during backoff
+        settled = min(row["updated_at"] + SYNC_WINDOW_SECONDS, row["enqueued_at"] + plan["window"])
+        ready = max(row["next_attempt_at"], settled, plan["next_cycle_at"])
+        if row["target"] == DB_TARGET:
+            ready = max(ready, plan["db_ready_at"])
+        due = ready if due is None else min(due, ready)
+    return None if due is None else due - now
+
+
+async def sync_worker() -> None:
+    """
+    Background loop draining sync_outbox. Entries survive restarts and
+    crashes, so whatever was pending is picked up when the worker starts.
+    Workers without the sync lease stand by until the holder's lease expires.
+    """
+    while True:
+        _wake.clear()
+        try:
+            if not DB_PATH.exists():
+                # The API creates (or restores) the database; don't create an empty one here
+                await asyncio.sleep(SYNC_IDLE_POLL_SECONDS)
+                continue
+            if not await acquire_lease():
+                await asyncio.sleep(min(SYNC_LEASE_SECONDS / 2, max(SYNC_IDLE_POLL_SECONDS, 30)))
+                continue
+            delay = await _next_outbox_delay()
+        except Exception:
+            logger.exception("could not read sync outbox")
+            delay = SYNC_RETRY_BASE_SECONDS
+        if delay is None or delay > 0:
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout=SYNC_IDLE_POLL_SECONDS if delay is None else delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        try:
+            await sync_now()
+        except Exception:
+            logger.exception("sync cycle failed")
+            await asyncio.sleep(SYNC_RETRY_BASE_SECONDS)
+
+
+async def outbox_status() -> dict:
+    """Outbox depth and the age of the oldest pending entry (for the status endpoint)."""
+    status = {"depth": 0, "oldest_age_seconds": None, "retrying": 0, "entries": [],
+              "worker": SYNC_WORKER_MODE, "lease": None}
+    if not DB_PATH.exists():
+        return status
+    rows = await _outbox_rows(ignore_backoff=True)
+    now = time.time()
+    db = await _connect()
+    try:
+        cursor = await db.execute("SELECT holder, expires_at FROM sync_lease WHERE name = 'push'")
+        lease = await cursor.fetchone()
+    finally:
+        await db.close()
+    if lease and lease["expires_at"] > now:
+        status["lease"] = {
+            "holder": lease["holder"],
+            "mine": lease["holder"] == _lease_holder(),
+            "expires_in": round(lease["expires_at"] - now, 1),
+        }
+    status["depth"] = len(rows)
+    status["retrying"] = sum(1 for r in rows if r["attempts"])
+    if rows:
+        status["oldest_age_seconds"] = round(now - min(r["enqueued_at"] for r in rows), 1)
+    status["entries"] = [
+        {
+            "target": r["target"],
+            "age_seconds": round(now - r["enqueued_at"], 1),
+            "attempts": r["attempts"],
+            "next_attempt_in": round(max(0.0, r["next_attempt_at"] - now), 1),
+            "last_error": r["last_error"],
+        }
+        for r in rows
+    ]
+    return status
 
 
 def schedule_sync(table_name: Optional[str]) -> None:
     """
-    Schedule a debounced sync. Multiple calls within the debounce window
-    are coalesced into a single push.
+    Called after a successful write: wake the outbox worker.
 
-    - table_name push : data/<table>.json    (3 sec debounce)
-    - full DB push    : backups/database.db (10 sec debounce)
+    Writes to synced tables are already in sync_outbox (the changelog trigger
+    adds them in the write's own transaction). Any other write only makes the
+    database backup stale, so DB_TARGET is enqueued here.
     """
     if not is_configured():
         return
-    if not table_name or table_name in SKIP_TABLES:
-        # Still keep the DB backup running for any change.
-        pass
 
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
         return  # no event loop, give up silently
 
-    # Cancel any pending task for this specific table
-    if table_name and table_name not in SKIP_TABLES:
-        existing = _debounce_tasks.get(table_name)
-        if existing and not existing.done():
-            existing.cancel()
-        _debounce_tasks[table_name] = loop.create_task(_delayed_push_table(table_name))
-
-    # Cancel and reschedule the full-DB push
-    db_task = _debounce_tasks.get("__db__")
-    if db_task and not db_task.done():
-        db_task.cancel()
-    _debounce_tasks["__db__"] = loop.create_task(_delayed_push_db())
+    if table_name and table_name in _SYNCED_TABLES:
+        _wake.set()
+        return
+    task = loop.create_task(enqueue([DB_TARGET]))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 # ---------------------------------------------------------------------------
 # Restore from GitHub (called at startup)
 # ---------------------------------------------------------------------------
+async def _get_contents_meta(client: httpx.AsyncClient, path: str) -> Optional[dict]:
+    """Contents API metadata for a file (None on 404; raises on other errors)."""
+    r = await client.get(
+        f"{API_BASE}/repos/{GITHUB_REPO}/contents/{path}",
+        params={"ref": GITHUB_BRANCH},
+        headers=_headers(),
+        timeout=30.0,
+    )
+    if r.status_code == 404:
+        return None
+    if r.status_code != 200:
+        raise RuntimeError(f"github meta status {r.status_code} for {path}: {r.text[:200]}")
+    return r.json()
+
+
+async def _download_to(client: httpx.AsyncClient, meta: dict, target: Path) -> None:
+    """Stream a Contents API file to disk (download_url, or inline base64 for small files)."""
+    download_url = meta.get("download_url")
+    if not download_url:
+        b64 = meta.get("content", "").replace("\n", "")
+        if not b64:
+            raise RuntimeError("no download_url and no content")
+        target.write_bytes(base64.b64decode(b64))
+        return
+    async with client.stream("GET", download_url, timeout=120.0) as r:
+        if r.status_code != 200:
+            raise RuntimeError(f"download status {r.status_code}")
+        with open(target, "wb") as f:
+            async for chunk in r.aiter_bytes(_COPY_CHUNK):
+                f.write(chunk)
+
+
+async def _fetch_raw(client: httpx.AsyncClient, path: str) -> Optional[bytes]:
+    """Raw bytes of a repo file in one request (None on 404; raises on other errors)."""
+    r = await client.get(
+        f"{API_BASE}/repos/{GITHUB_REPO}/contents/{path}",
+        params={"ref": GITHUB_BRANCH},
+        headers={**_headers(), "Accept": "application/vnd.github.raw+json"},
+        timeout=120.0,
+    )
+    if r.status_code == 404:
+        return None
+    if r.status_code != 200:
+        raise RuntimeError(f"github raw status {r.status_code} for {path}: {r.text[:200]}")
+    return r.content
+
+
+async def _assemble_chunks(client: httpx.AsyncClient, manifest: dict, target: Path) -> str:
+    """Rebuild the database from the manifest's chunks; returns sha256 of the result."""
+    suffix = _BACKUP_SUFFIXES[manifest["format"]]
+    repeats = {}
+    for chunk in manifest["chunks"]:
+        repeats[chunk["hash"]] = repeats.get(chunk["hash"], 0) + 1
+    cache = {}
+    whole = hashlib.sha256()
+    with open(target, "wb") as f:
+        for chunk in manifest["chunks"]:
+            data = cache.get(chunk["hash"])
+            if data is None:
+                packed = await _fetch_raw(client, f"{DB_CHUNK_DIR}/{chunk['hash']}{suffix}")
+                if packed is None:
+                    raise RuntimeError(f"missing chunk {chunk['hash']}")
+                data = _decompress_bytes(packed, manifest["format"])
+                if hashlib.sha256(data).hexdigest() != chunk["hash"]:
+                    raise RuntimeError(f"corrupt chunk {chunk['hash']}")
+                # Keep only chunks that appear again (e.g. runs of empty pages)
+                if repeats[chunk["hash"]] > 1:
+                    cache[chunk["hash"]] = data
+            whole.update(data)
+            f.write(data)
+    return whole.hexdigest()
+
+
+async def _list_tree(client: httpx.AsyncClient) -> Dict[str, str]:
+    """path -> blob sha of every file on the branch (one recursive tree request)."""
+    r = await client.get(
+        f"{API_BASE}/repos/{GITHUB_REPO}/git/trees/{GITHUB_BRANCH}",
+        params={"recursive": "1"},
+        headers=_headers(),
+        timeout=60.0,
+    )
+    if r.status_code != 200:
+        raise RuntimeError(f"github tree status {r.status_code}: {r.text[:200]}")
+    body = r.json()
+    if body.get("truncated"):
+        logger.warning("github tree listing truncated, replay may miss changes")
+    return {e["path"]: e["sha"] for e in body.get("tree", []) if e.get("type") == "blob"}
+
+
+async def _fetch_changes(client: httpx.AsyncClient, manifest: dict) -> Optional[dict]:
+    """
+    Collect the table changes pushed after the backup was taken.
+
+    For every table: a snapshot newer than the backup (its blob differs from
+    the one the manifest recorded) replaces the table, then every delta line
+    with seq above the snapshot's seq (or the backup's changelog seq) applies.
+    """
+    if manifest.get("changelog_seq") is None:
+        return None  # manifest older than replay support
+    base = manifest["changelog_seq"]
+    tree = await _list_tree(client)
+    deltas: Dict[str, List[tuple]] = {}
+    highest = base
+    for path in tree:
+        m = _DELTA_PATH.fullmatch(path)
+        if m:
+            deltas.setdefault(m.group(1), []).append((int(m.group(2)), path))
+            highest = max(highest, int(m.group(2)))
+
+    tables = {}
+    for table in synced_tables():
+        snapshot_path = f"data/{table}.json"
+        snapshot = None
+        if snapshot_path in tree and tree[snapshot_path] != manifest["snapshots"].get(snapshot_path):
+            snapshot = json.loads(await _fetch_raw(client, snapshot_path))
+        floor = (snapshot["seq"] or 0) if snapshot else base
+        # The snapshot's seq is on GitHub too: new writes must get a larger one,
+        # or the reader contract would skip their deltas
+        highest = max(highest, floor)
+        ops = []
+        for seq, path in sorted(deltas.get(table, [])):
+            if seq <= floor:
+                continue
+            for line in (await _fetch_raw(client, path)).decode("utf-8").splitlines():
+                entry = json.loads(line)
+                if entry["seq"] > floor:
+                    ops.append(entry)
+        if snapshot is None and not ops and table not in deltas:
+            continue
+        tables[table] = {
+            "rows": snapshot["rows"] if snapshot else None,
+            "ops": sorted(ops, key=lambda e: e["seq"]),
+            "pushed_seq": max([seq for seq, _ in deltas.get(table, [])] + [floor if snapshot else 0]),
+            "deltas": len(deltas.get(table, [])),
+        }
+    return {"base": base, "highest": highest, "tables": tables}
+
+
+def _apply_changes(path: Path, changes: dict) -> int:
+    """
+    Apply fetched changes to a restored database file; returns the number of rows written.
+
+    Changelog rows the replay itself triggers are dropped, and the changelog
+    sequence plus github_sync_state move past everything already on GitHub,
+    so new writes never reuse a pushed seq (or overwrite a pushed delta file).
+    Blocking - call through asyncio.to_thread.
+    """
+    con = sqlite3.connect(path)
+    written = 0
+    try:
+        existing = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table, change in changes["tables"].items():
+            columns = [r[1] for r in con.execute(f"PRAGMA table_info({table})")]
+            if not columns:
+                continue
+
+            def upsert(row: dict) -> None:
+                cols = [c for c in columns if c in row]
+                con.execute(
+                    f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)}) "
+                    f"ON CONFLICT (id) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in cols)}",
+                    [row[c] for c in cols],
+                )
+
+            if change["rows"] is not None:
+                con.execute(f"DELETE FROM {table}")
+                for row in change["rows"]:
+                    upsert(row)
+                written += len(change["rows"])
+            for entry in change["ops"]:
+                if entry["op"] == "delete":
+                    con.execute(f"DELETE FROM {table} WHERE id = ?", (entry["id"],))
+                else:
+                    upsert(entry["row"])
+                written += 1
+            if "github_sync_state" in existing and change["pushed_seq"]:
+                con.execute(
+                    """INSERT INTO github_sync_state (table_name, pushed_seq, deltas_since_snapshot, updated_at)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT (table_name) DO UPDATE SET
+                           pushed_seq = MAX(pushed_seq, excluded.pushed_seq),
+                           deltas_since_snapshot = excluded.deltas_since_snapshot""",
+                    (table, change["pushed_seq"], change["deltas"], datetime.now(timezone.utc).isoformat()),
+                )
+        if "degisiklik_gunlugu" in existing:
+            con.execute("DELETE FROM degisiklik_gunlugu WHERE seq > ?", (changes["base"],))
+        cursor = con.execute(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'degisiklik_gunlugu'", (changes["highest"],)
+        )
+        if cursor.rowcount == 0:
+            con.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('degisiklik_gunlugu', ?)",
+                        (changes["highest"],))
+        con.commit()
+    finally:
+        con.close()
+    return written
+
+
+def _checkpoint(path: Path) -> None:
+    """Fold a WAL database's -wal file into the main file, so its size and bytes are complete."""
+    con = sqlite3.connect(path, timeout=30.0)
+    try:
+        con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        con.close()
+
+
 async def restore_database_from_github(force: bool = False) -> dict:
     """
     Startup helper: If local database.db is missing OR older than the version
     on GitHub, download the GitHub copy and place it at DB_PATH.
 
+    The chunked backup described by backups/database.manifest.json is
+    preferred; repos that only have an older single-file backup
+    (backups/database.meta.json, or the plain backups/database.db) still
+    restore from it. Table snapshots and deltas pushed after the backup
+    are replayed on top, so the restore is as fresh as data/ on GitHub.
+
     Returns a summary dict with keys:
       restored: bool - True if we replaced the local file
       reason:   str  - human-readable explanation
@@ -421,67 +1743,71 @@ async def restore_database_from_github(force: bool = False) -> dict:
 
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-    url = f"{API_BASE}/repos/{GITHUB_REPO}/contents/backups/database.db"
     try:
-        async with httpx.AsyncClient() as client:
+        client = get_client()
+        meta = backup = None
+        raw_manifest = await _fetch_raw(client, DB_MANIFEST_PATH)
+        manifest = json.loads(raw_manifest) if raw_manifest else None
+        if manifest is None:
+            raw_backup = await _fetch_raw(client, DB_BACKUP_META_PATH)
+            backup = json.loads(raw_backup) if raw_backup else None
             # Get file metadata (contains size + sha + last commit indirectly)
-            r = await client.get(
-                url,
-                params={"ref": GITHUB_BRANCH},
-                headers=_headers(),
-                timeout=30.0,
-            )
-            if r.status_code == 404:
+            meta = await _get_contents_meta(client, backup["path"] if backup else DB_BACKUP_PATH)
+            if meta is None:
                 return {"restored": False, "reason": "no backup on github yet"}
-            if r.status_code != 200:
-                return {
-                    "restored": False,
-                    "reason": f"github meta status {r.status_code}: {r.text[:200]}",
-                }
-
-            meta = r.json()
-            remote_size = int(meta.get("size", 0))
-            download_url = meta.get("download_url")
-
-            local_exists = DB_PATH.exists()
-            local_size = DB_PATH.stat().st_size if local_exists else 0
-
-            # Decision policy:
-            #   - If local missing or empty -> restore
-            #   - If local is smaller than remote by 5% -> restore (likely reset)
-            #   - Otherwise trust local (it has our newest changes not yet pushed)
-            should_restore = force or (not local_exists) or (local_size == 0)
-            if not should_restore and remote_size > 0:
-                # Restore if local is meaningfully smaller than remote
-                if local_size < remote_size * 0.95:
-                    should_restore = True
 
-            if not should_restore:
-                return {
-                    "restored": False,
-                    "reason": (
-                        f"local db is up to date "
-                        f"(local={local_size}b, remote={remote_size}b)"
-                    ),
-                    "local_size": local_size,
-                    "remote_size": remote_size,
-                }
+        source = manifest or backup
+        fmt = source["format"] if source else "none"
+        # Compare uncompressed sizes
+        remote_size = int(source["size"] if source else meta.get("size", 0))
+
+        local_exists = DB_PATH.exists()
+        if local_exists:
+            # WAL mode: recent writes may still sit in database.db-wal
+            try:
+                await asyncio.to_thread(_checkpoint, DB_PATH)
+            except sqlite3.Error:
+                logger.exception("could not checkpoint local database")
+        local_size = DB_PATH.stat().st_size if local_exists else 0
+
+        # Decision policy:
+        #   - If local missing or empty -> restore
+        #   - If local is smaller than remote by 5% -> restore (likely reset)
+        #   - Otherwise trust local (it has our newest changes not yet pushed)
+        should_restore = force or (not local_exists) or (local_size == 0)
+        if not should_restore and remote_size > 0:
+            # Restore if local is meaningfully smaller than remote
+            if local_size < remote_size * 0.95:
+                should_restore = True
+
+        if not should_restore:
+            return {
+                "restored": False,
+                "reason": (
+                    f"local db is up to date "
+                    f"(local={local_size}b, remote={remote_size}b)"
+                ),
+                "local_size": local_size,
+                "remote_size": remote_size,
+            }
 
-            # Download the actual file bytes
-            if not download_url:
-                # Fallback: use base64 content from metadata (works for files < 1MB)
-                b64 = meta.get("content", "").replace("\n", "")
-                if not b64:
-                    return {"restored": False, "reason": "no download_url and no content"}
-                content_bytes = base64.b64decode(b64)
+        # Download + decompress next to the database, then swap it in atomically
+        with tempfile.TemporaryDirectory(dir=DB_PATH.parent) as tmp:
+            restored = Path(tmp) / "database.db"
+            if manifest:
+                sha256 = await _assemble_chunks(client, manifest, restored)
             else:
-                r2 = await client.get(download_url, timeout=120.0)
-                if r2.status_code != 200:
-                    return {
-                        "restored": False,
-                        "reason": f"download status {r2.status_code}",
-                    }
-                content_bytes = r2.content
+                packed = Path(tmp) / "download"
+                await _download_to(client, meta, packed)
+                sha256 = await asyncio.to_thread(_decompress_file, packed, restored, fmt)
+            if source and source.get("sha256") and source["sha256"] != sha256:
+                return {"restored": False, "reason": "checksum mismatch in downloaded backup"}
+            replayed = 0
+            if manifest:
+                changes = await _fetch_changes(client, manifest)
+                if changes:
+                    replayed = await asyncio.to_thread(_apply_changes, restored, changes)
+            restored_size = restored.stat().st_size
 
             # Safety backup of the current local file before overwriting
             if local_exists and local_size > 0:
@@ -489,26 +1815,29 @@ async def restore_database_from_github(force: bool = False) -> dict:
                     f".before_restore_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}.db"
                 )
                 try:
-                    with open(bkp, "wb") as f:
-                        with open(DB_PATH, "rb") as src:
-                            f.write(src.read())
+                    shutil.copyfile(DB_PATH, bkp)
                 except Exception:
                     logger.exception("could not create pre-restore backup")
 
-            with open(DB_PATH, "wb") as f:
-                f.write(content_bytes)
+            # A leftover -wal/-shm of the old file must not be applied to the new one
+            for suffix in ("-wal", "-shm"):
+                Path(f"{DB_PATH}{suffix}").unlink(missing_ok=True)
+            os.replace(restored, DB_PATH)
 
-            logger.info(
-                "restored database.db from github (%d bytes -> %s)",
-                len(content_bytes),
-                DB_PATH,
-            )
-            return {
-                "restored": True,
-                "reason": "restored from github",
-                "bytes": len(content_bytes),
-                "prev_local_size": local_size,
-            }
+        logger.info(
+            "restored database.db from github (%s, %d bytes -> %s)",
+            fmt,
+            restored_size,
+            DB_PATH,
+        )
+        return {
+            "restored": True,
+            "reason": "restored from github",
+            "format": fmt,
+            "bytes": restored_size,
+            "replayed_rows": replayed,
+            "prev_local_size": local_size,
+        }
     except Exception as e:
         logger.exception("restore_database_from_github failed")
         return {"restored": False, "reason": f"exception: {e}"}
@@ -516,36 +1845,23 @@ async def restore_database_from_github(force: bool = False) -> dict:
 
 async def flush_pending_pushes() -> dict:
     """
-    Called on shutdown: run any pending debounced pushes NOW (synchronously),
-    so we don't lose the last few seconds of writes.
+    Called on shutdown: drain the outbox NOW (ignoring backoff), so we don't
+    lose the last few seconds of writes. Whatever still fails stays in the
+    outbox for the next start.
     """
     if not is_configured():
         return {"flushed": False, "reason": "not configured"}
+    if not _may_push():
+        return {"flushed": False, "reason": "external worker"}
+    if not await acquire_lease():
+        return {"flushed": False, "reason": "sync lease held by another worker"}
 
-    # Cancel debounce tasks (we'll do them immediately)
-    tables_to_push = set()
-    for key, task in list(_debounce_tasks.items()):
-        if task and not task.done():
-            task.cancel()
-        if key != "__db__":
-            tables_to_push.add(key)
-
-    _debounce_tasks.clear()
-
-    result = {"tables": {}, "database": False, "flushed": True}
-    for table in tables_to_push:
-        try:
-            result["tables"][table] = await push_table_to_github(table)
-        except Exception:
-            logger.exception("flush push failed for %s", table)
-            result["tables"][table] = False
-
-    # Always push the DB itself at shutdown
     try:
-        result["database"] = await push_database_to_github()
-    except Exception:
-        logger.exception("flush db push failed")
-
+        # Always push the DB itself at shutdown
+        result = await sync_now(force_db=True, ignore_backoff=True)
+    finally:
+        await release_lease()
+    result["flushed"] = True
     return result
 
 
@@ -553,19 +1869,63 @@ async def flush_pending_pushes() -> dict:
 # Manual full-sync (for initial backup or admin button)
 # ---------------------------------------------------------------------------
 async def push_all_tables() -> dict:
-    """Push every known table + full DB. Returns a result summary."""
+    """
+    Push every known table + full DB as one commit. Returns a result summary.
+    Without the sync lease (or in an external-worker API) the push-all is
+    queued for the worker instead.
+    """
     if not is_configured():
         return {"ok": False, "error": "GitHub sync not configured"}
+    if not _may_push() or not await acquire_lease():
+        await enqueue([FULL_SYNC_TARGET])
+        return {"configured": True, "queued": True, "outbox": await outbox_status()}
 
-    results = {"tables": {}, "database": False, "configured": True}
-    seen = set()
-    for table in URL_TO_TABLE.values():
-        if table in seen or table in SKIP_TABLES:
-            continue
-        seen.add(table)
-        ok = await push_table_to_github(table)
-        results["tables"][table] = ok
-
-    results["database"] = await push_database_to_github()
+    results = await sync_now(synced_tables(), force_snapshot=True, force_db=True, ignore_backoff=True)
+    results["configured"] = True
     results["stats"] = get_stats()
     return results
+
+
+# ---------------------------------------------------------------------------
+# Standalone worker: python -m github_sync worker
+# ---------------------------------------------------------------------------
+async def _run_worker() -> int:
+    global _standalone
+    _standalone = True
+    if not is_configured():
+        logger.error("GitHub sync not configured (GITHUB_TOKEN / GITHUB_REPO / GITHUB_SYNC_ENABLED)")
+        return 1
+    await open_client()
+    worker = asyncio.create_task(sync_worker())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.cancel)
+    logger.info("sync worker started as %s (db=%s)", _lease_holder(), DB_PATH)
+    try:
+        await worker
+    except asyncio.CancelledError:
+        pass
+    finally:
+        try:
+            logger.info("shutdown flush: %s", await flush_pending_pushes())
+        finally:
+            await close_client()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m github_sync", description="GitHub sync worker")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("worker", help="drain sync_outbox and push to GitHub (while holding the sync lease)")
+    commands.add_parser("status", help="print outbox depth, lease holder and stats")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    if args.command == "status":
+        print(json.dumps({"configured": is_configured(), "outbox": asyncio.run(outbox_status())}, indent=2))
+        return 0
+    return asyncio.run(_run_worker())
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
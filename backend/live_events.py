@@ -0,0 +1,240 @@
+"""
+Live Events (SSE) Module
+========================
+Pushes compact change events to connected dashboards over Server-Sent
+Events, so screens no longer have to poll report endpoints on a timer.
+
+Events are published from the same post-commit middleware hook that
+schedules the GitHub sync. Each subscriber may filter by module
+(bims, cimento, personel, ...) and owns a bounded buffer: when a slow
+client falls behind, the oldest events are dropped instead of letting
+server memory grow. Clients that need every change should reconcile
+through /api/changes after reconnecting.
+
+Events only reach subscribers of the same process; with several uvicorn
+workers each worker serves its own connected clients.
+
+Environment variables:
+  LIVE_EVENTS_BUFFER    : per-client buffer size (default: 100)
+  LIVE_EVENTS_KEEPALIVE : seconds between keep-alive comments (default: 15)
+"""
+from __future__ import annotations
+
+import os
+import json
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, Set, Iterable, Callable, Awaitable
+
+logger = logging.getLogger("live_events")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+EVENT_BUFFER_SIZE = int(os.environ.get("LIVE_EVENTS_BUFFER", "100"))
+KEEPALIVE_SECONDS = float(os.environ.get("LIVE_EVENTS_KEEPALIVE", "15"))
+
+# SQL table -> module name used by subscription filters
+TABLE_TO_MODULE: Dict[str, str] = {
+    "products": "bims",
+    "departments": "bims",
+    "operators": "bims",
+    "molds": "bims",
+    "production_records": "bims",
+    "donem_kapanislari": "bims",
+    "bims_stok_urunler": "bims",
+    "bims_stok_hareketler": "bims",
+
+    "cimento_firmalar": "cimento",
+    "cimento_isletmeler": "cimento",
+    "cimento_cinsleri": "cimento",
+    "cimento_giris": "cimento",
+    "nakliyeci_firmalar": "cimento",
+    "plakalar": "cimento",
+    "soforler": "cimento",
+    "sehirler": "cimento",
+
+    "personeller": "personel",
+    "personel_departmanlar": "personel",
+    "personel_maas_donemleri": "personel",
+    "puantaj": "personel",
+    "tesisler": "personel",
+    "izinler": "personel",
+    "maas_bordrolari": "personel",
+    "pozisyonlar": "personel",
+    "custom_durumlar": "personel",
+
+    "araclar": "arac",
+    "arac_cinsleri": "arac",
+    "markalar": "arac",
+    "modeller": "arac",
+    "sirketler": "arac",
+    "ana_sigorta_firmalari": "arac",
+    "sigorta_acentalari": "arac",
+
+    "motorin_tedarikciler": "motorin",
+    "bosaltim_tesisleri": "motorin",
+    "akaryakit_markalari": "motorin",
+    "motorin_alimlar": "motorin",
+    "motorin_acilis": "motorin",
+    "motorin_verme": "motorin",
+    "motorin_verme_uploads": "motorin",
+
+    "teklif_musteriler": "teklif",
+    "teklifler": "teklif",
+
+    "parke_urunler": "parke",
+    "parke_hammaddeler": "parke",
+    "parke_uretim_kayitlari": "parke",
+    "parke_renkler": "parke",
+    "parke_operatorler": "parke",
+
+    "irsaliyeler": "irsaliye",
+}
+
+# Tables whose writes change a stock position
+STOCK_TABLES = {
+    "production_records", "bims_stok_urunler", "bims_stok_hareketler",
+    "cimento_giris", "cimento_isletmeler",
+    "motorin_alimlar", "motorin_acilis", "motorin_verme", "motorin_verme_uploads",
+}
+
+# Request body keys copied into the event when present (kept compact on purpose)
+HINT_KEYS = ("urun_id", "product_id", "bosaltim_tesisi", "bosaltim_isletmesi", "department_name")
+
+_METHOD_TO_OP = {"POST": "created", "PUT": "updated", "PATCH": "updated", "DELETE": "deleted"}
+
+
+# ---------------------------------------------------------------------------
+# Subscribers
+# ---------------------------------------------------------------------------
+class Subscriber:
+    """One connected client: module filter + bounded drop-oldest buffer."""
+
+    def __init__(self, modules: Optional[Iterable[str]] = None):
+        self.modules: Optional[Set[str]] = set(modules) if modules else None
+        self.buffer: deque = deque(maxlen=EVENT_BUFFER_SIZE)
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+
+    def wants(self, module: Optional[str]) -> bool:
+        return self.modules is None or module in self.modules
+
+    def offer(self, event: dict) -> None:
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(event)
+        self._wakeup.set()
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+
+_subscribers: Set[Subscriber] = set()
+_seq = 0
+
+_stats = {
+    "published": 0,
+    "delivered": 0,
+    "dropped": 0,
+}
+
+
+def get_stats() -> dict:
+    return {**_stats, "subscribers": len(_subscribers)}
+
+
+def subscribe(modules: Optional[Iterable[str]] = None) -> Subscriber:
+    sub = Subscriber(modules)
+    _subscribers.add(sub)
+    return sub
+
+
+def unsubscribe(sub: Subscriber) -> None:
+    _subscribers.discard(sub)
+    _stats["dropped"] += sub.dropped
+
+
+# ---------------------------------------------------------------------------
+# Publishing (called from middleware)
+# ---------------------------------------------------------------------------
+def _event_type(table: str, op: str) -> str:
+    if table == "production_records" and op == "created":
+        return "uretim_eklendi"
+    if table in STOCK_TABLES:
+        return "stok_degisti"
+    return f"{table}_{op}"
+
+
+def publish(table: Optional[str], method: str, path: str, hints: Optional[dict] = None) -> None:
+    """Build a compact event for a successful write and fan it out."""
+    global _seq
+    if not table or not _subscribers:
+        return
+    op = _METHOD_TO_OP.get(method, "updated")
+    module = TABLE_TO_MODULE.get(table)
+    _seq += 1
+    event = {
+        "seq": _seq,
+        "type": _event_type(table, op),
+        "module": module,
+        "table": table,
+        "op": op,
+        "path": path,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+    if hints:
+        for key in HINT_KEYS:
+            if hints.get(key):
+                event[key] = hints[key]
+    _stats["published"] += 1
+    for sub in list(_subscribers):
+        if sub.wants(module):
+            sub.offer(event)
+
+
+def extract_hints(body: bytes) -> Optional[dict]:
+    """Pick HINT_KEYS out of a small JSON request body; never raises."""
+    try:
+        data = json.loads(body)
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    return {k: data[k] for k in HINT_KEYS if isinstance(data.get(k), str)}
+
+
+# ---------------------------------------------------------------------------
+# SSE stream
+# ---------------------------------------------------------------------------
+def _format(event: dict) -> str:
+    # No "event:" field: browsers deliver every change to onmessage, type is in data
+    return f"id: {event['seq']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def event_stream(sub: Subscriber, is_disconnected: Callable[[], Awaitable[bool]]):
+    """Async generator feeding a StreamingResponse until the client goes away."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            if await is_disconnected():
+                break
+            while sub.buffer:
+                event = sub.buffer.popleft()
+                _stats["delivered"] += 1
+                yield _format(event)
+            if sub.dropped:
+                yield f"event: events_dropped\ndata: {json.dumps({'dropped': sub.dropped})}\n\n"
+                _stats["dropped"] += sub.dropped
+                sub.dropped = 0
+            await sub.wait(KEEPALIVE_SECONDS)
+            if not sub.buffer:
+                yield ": keep-alive\n\n"
+    finally:
+        unsubscribe(sub)
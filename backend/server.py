@@ -1,10 +1,11 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import aiosqlite
+import asyncio
 import os
 import logging
 import uuid
@@ -30,8 +31,18 @@ from github_sync import (
     flush_pending_pushes,
     get_stats as github_sync_stats,
     is_configured as github_sync_is_configured,
+    synced_tables as github_synced_tables,
+    init_sync_schema as github_sync_init_schema,
+    outbox_status as github_sync_outbox_status,
+    sync_worker as github_sync_worker,
+    embedded_worker as github_sync_embedded_worker,
+    open_client as github_sync_open_client,
+    close_client as github_sync_close_client,
 )
 
+# Canlı olaylar (SSE) — dashboard'lara yazma sonrası kompakt olay yayını
+import live_events
+
 # Data klasörü - Docker volume için
 DATA_DIR = ROOT_DIR / "data"
 DATA_DIR.mkdir(exist_ok=True)
@@ -53,11 +64,24 @@ app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 # Database helper functions
+# Eşzamanlı yazarlar BEGIN IMMEDIATE'da sırayla beklesin diye busy timeout geniş tutulur
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", "30"))
+
 async def get_db():
-    db = await aiosqlite.connect(DB_PATH)
+    db = await aiosqlite.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT)
     db.row_factory = aiosqlite.Row
     return db
 
+async def get_db_salt_okunur():
+    """Read-only connection for background jobs; it can never take the write lock."""
+    db = await aiosqlite.connect(f"file:{DB_PATH}?mode=ro", uri=True, timeout=SQLITE_BUSY_TIMEOUT)
+    db.row_factory = aiosqlite.Row
+    return db
+
+async def yazma_baslat(db):
+    """Open the write transaction up front so read-then-write stock logic cannot interleave."""
+    await db.execute("BEGIN IMMEDIATE")
+
 # Health check endpoint - Docker için
 @api_router.get("/health")
 async def health_check():
@@ -66,6 +90,9 @@ async def health_check():
 async def init_db():
     """Initialize SQLite database with all tables"""
     async with aiosqlite.connect(DB_PATH) as db:
+        # WAL: okuyucular yazarı, yazar okuyucuları beklemez (uzun GitHub snapshot okumaları
+        # API yazmalarını kilitlemesin). Mod dosyaya kaydedilir, her açılışta geçerlidir.
+        await db.execute("PRAGMA journal_mode=WAL")
         # Users table
         await db.execute('''
             CREATE TABLE IF NOT EXISTS users (
@@ -1194,8 +1221,249 @@ async def init_db():
             )
         ''')
 
+        # Değişiklik günlüğü - tetikleyiciler (trigger) ile doldurulur, /changes akışı için
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS degisiklik_gunlugu (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                tablo TEXT NOT NULL,
+                kayit_id TEXT NOT NULL,
+                islem TEXT NOT NULL,
+                zaman TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+            )
+        ''')
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_degisiklik_gunlugu_tablo ON degisiklik_gunlugu (tablo, seq)"
+        )
+        # Budanan son seq - bundan eski cursor'lar tam yeniden yükleme yapmalı
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS degisiklik_gunlugu_durum (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                budanan_seq INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        await db.execute("INSERT OR IGNORE INTO degisiklik_gunlugu_durum (id, budanan_seq) VALUES (1, 0)")
+        for tablo in DEGISIKLIK_TAKIP_TABLOLARI:
+            await degisiklik_tetikleyicileri_olustur(db, tablo)
+
+        # Çimento giriş listesi filtre/sıralama indeksleri
+        for ad, kolonlar in (("bosaltim_tarihi", "bosaltim_tarihi"),
+                             ("firma", "cimento_alinan_firma, bosaltim_tarihi"),
+                             ("isletme", "bosaltim_isletmesi, bosaltim_tarihi"),
+                             ("plaka", "plaka, bosaltim_tarihi"),
+                             ("fatura_no", "fatura_no"),
+                             ("created_at", "created_at")):
+            await db.execute(f"CREATE INDEX IF NOT EXISTS idx_cimento_giris_{ad} ON cimento_giris ({kolonlar})")
+
+        # BIMS stok ürünü bazlı yeniden sipariş eşiği + eşiğin altındakiler için kısmi indeks
+        try:
+            await db.execute("ALTER TABLE bims_stok_urunler ADD COLUMN min_stok REAL DEFAULT 10")
+        except:
+            pass
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_bims_stok_urunler_dusuk ON bims_stok_urunler (urun_adi) WHERE mevcut_stok < min_stok"
+        )
+
+        # BIMS stok defteri - hareket sonrası bakiye + ürün bazlı günlük kontrol noktaları
+        try:
+            await db.execute("ALTER TABLE bims_stok_hareketler ADD COLUMN bakiye REAL")
+        except:
+            pass
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_bims_stok_hareketler_defter ON bims_stok_hareketler (urun_id, tarih, created_at, id)"
+        )
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS bims_stok_gunluk (
+                urun_id TEXT NOT NULL,
+                tarih TEXT NOT NULL,
+                giris REAL NOT NULL DEFAULT 0,
+                cikis REAL NOT NULL DEFAULT 0,
+                bakiye REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (urun_id, tarih)
+            )
+        ''')
+
+        # Çimento stok defteri - teslimat/harcama hareketleri + işletme bazlı günlük kümülatif kontrol noktaları
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_cimento_stok_hareketler_referans ON cimento_stok_hareketler (referans_tip, referans_id)"
+        )
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS cimento_stok_gunluk (
+                isletme_id TEXT NOT NULL,
+                tarih TEXT NOT NULL,
+                acilis_kg REAL NOT NULL DEFAULT 0,
+                giris_kg REAL NOT NULL DEFAULT 0,
+                harcanan_kg REAL NOT NULL DEFAULT 0,
+                kum_acilis_kg REAL NOT NULL DEFAULT 0,
+                kum_giris_kg REAL NOT NULL DEFAULT 0,
+                kum_harcanan_kg REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (isletme_id, tarih)
+            )
+        ''')
+
+        # Motorin tank (boşaltım tesisi) bazlı stok: özet + hareket defteri + günlük kümülatif kontrol noktaları
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS motorin_tank_stok (
+                tesis TEXT PRIMARY KEY,
+                toplam_acilis REAL NOT NULL DEFAULT 0,
+                toplam_alim REAL NOT NULL DEFAULT 0,
+                toplam_verme REAL NOT NULL DEFAULT 0,
+                mevcut_stok REAL NOT NULL DEFAULT 0,
+                updated_at TEXT
+            )
+        ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS motorin_tank_hareketler (
+                id TEXT PRIMARY KEY,
+                tesis TEXT NOT NULL,
+                kaynak TEXT NOT NULL,
+                kaynak_id TEXT NOT NULL,
+                tarih TEXT NOT NULL,
+                miktar_litre REAL NOT NULL,
+                created_at TEXT
+            )
+        ''')
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_motorin_tank_hareketler_tesis ON motorin_tank_hareketler (tesis, tarih)"
+        )
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS motorin_tank_gunluk (
+                tesis TEXT NOT NULL,
+                tarih TEXT NOT NULL,
+                acilis REAL NOT NULL DEFAULT 0,
+                alim REAL NOT NULL DEFAULT 0,
+                verme REAL NOT NULL DEFAULT 0,
+                kum_acilis REAL NOT NULL DEFAULT 0,
+                kum_alim REAL NOT NULL DEFAULT 0,
+                kum_verme REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (tesis, tarih)
+            )
+        ''')
+
+        # BIMS saha çıkan sayaçları - üretim kayıtlarındaki çıkan paketlerden stok ürünü bazında
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS bims_saha_cikan (
+                stok_id TEXT PRIMARY KEY,
+                toplam REAL NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Stok önbellek mutabakatı - arka plan çalışmaları ve bulunan sapmalar (drift raporu)
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS stok_mutabakat_calismalari (
+                id TEXT PRIMARY KEY,
+                baslangic TEXT NOT NULL,
+                bitis TEXT,
+                tetikleyen TEXT DEFAULT '',
+                otomatik_duzelt INTEGER NOT NULL DEFAULT 0,
+                kontrol_edilen INTEGER NOT NULL DEFAULT 0,
+                sapma_sayisi INTEGER NOT NULL DEFAULT 0,
+                hata TEXT DEFAULT ''
+            )
+        ''')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS stok_mutabakat_sapmalari (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                calisma_id TEXT NOT NULL,
+                onbellek TEXT NOT NULL,
+                kayit_id TEXT NOT NULL,
+                kayitli REAL,
+                beklenen REAL,
+                fark REAL,
+                duzeltildi INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_stok_mutabakat_sapmalari_calisma ON stok_mutabakat_sapmalari (calisma_id)"
+        )
+
+        # Dönem kapanışları - kapatılmış ay/yıl rapor ve stok anlık görüntüleri (ay = 0 → yıllık)
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS donem_kapanislari (
+                id TEXT PRIMARY KEY,
+                yil INTEGER NOT NULL,
+                ay INTEGER NOT NULL DEFAULT 0,
+                module TEXT NOT NULL DEFAULT '',
+                baslangic TEXT NOT NULL,
+                bitis TEXT NOT NULL,
+                rapor_json TEXT NOT NULL,
+                stok_json TEXT NOT NULL DEFAULT '[]',
+                bayat INTEGER NOT NULL DEFAULT 0,
+                kapatan TEXT DEFAULT '',
+                created_at TEXT NOT NULL,
+                UNIQUE (yil, ay, module)
+            )
+        ''')
+        # Kapalı döneme düşen üretim kaydı değişirse anlık görüntü bayatlar (yeniden kapatılmalı)
+        uretim_tarihi = "COALESCE(NULLIF({r}.production_date, ''), substr({r}.created_at, 1, 10))"
+        for zamanlama, refs in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            kosul = " OR ".join(
+                f"({uretim_tarihi.format(r=r)} >= baslangic AND {uretim_tarihi.format(r=r)} < bitis"
+                f" AND module IN ('', COALESCE({r}.module, '')))"
+                for r in refs
+            )
+            await db.execute(
+                f"""CREATE TRIGGER IF NOT EXISTS trg_production_records_donem_{zamanlama.lower()}
+                    AFTER {zamanlama} ON production_records BEGIN
+                        UPDATE donem_kapanislari SET bayat = 1 WHERE bayat = 0 AND ({kosul});
+                    END"""
+            )
+        # Stok hareketi dönem sonundan önceye düşerse stok pozisyonu değişir
+        for zamanlama, refs in (("INSERT", ("NEW",)), ("UPDATE", ("OLD", "NEW")), ("DELETE", ("OLD",))):
+            kosul = " OR ".join(f"{r}.tarih < bitis" for r in refs)
+            await db.execute(
+                f"""CREATE TRIGGER IF NOT EXISTS trg_bims_stok_hareketler_donem_{zamanlama.lower()}
+                    AFTER {zamanlama} ON bims_stok_hareketler BEGIN
+                        UPDATE donem_kapanislari SET bayat = 1 WHERE bayat = 0 AND ({kosul});
+                    END"""
+            )
+
+        # GitHub senkronu yalnızca değişen satırları gönderir: senkronlanan tüm tablolar günlüğe yazar
+        cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        mevcut_tablolar = {r[0] for r in await cursor.fetchall()}
+        for tablo in github_synced_tables():
+            if tablo in mevcut_tablolar and tablo not in DEGISIKLIK_TAKIP_TABLOLARI:
+                await degisiklik_tetikleyicileri_olustur(db, tablo)
+        # Senkron kuyruğu (sync_outbox): günlüğe düşen her yazma aynı transaction'da kuyruğa girer
+        await github_sync_init_schema(db)
+
         await db.commit()
 
+
+async def degisiklik_tetikleyicileri_olustur(db, tablo: str):
+    """Create the INSERT/UPDATE/DELETE triggers that feed degisiklik_gunlugu for a table."""
+    for zamanlama, islem, ref in (("INSERT", "I", "NEW"), ("UPDATE", "U", "NEW"), ("DELETE", "D", "OLD")):
+        await db.execute(
+            f"""CREATE TRIGGER IF NOT EXISTS trg_{tablo}_degisiklik_{islem.lower()}
+                AFTER {zamanlama} ON {tablo} BEGIN
+                    INSERT INTO degisiklik_gunlugu (tablo, kayit_id, islem)
+                    VALUES ('{tablo}', {ref}.id, '{islem}');
+                END"""
+        )
+
+# /changes akışında izlenen tablolar (users şifre içerdiği için dahil değil)
+DEGISIKLIK_TAKIP_TABLOLARI = [
+    "production_records", "puantaj", "motorin_verme", "motorin_alimlar", "motorin_acilis",
+    "cimento_giris", "personeller", "izinler", "bims_stok_urunler", "bims_stok_hareketler",
+    "teklifler", "irsaliyeler", "araclar",
+]
+# Değişiklik akışında satırlara uygulanan dönüşümler (liste endpoint'leriyle aynı biçim için)
+DEGISIKLIK_PAYLOAD_DONUSUMLERI = {}
+DEGISIKLIK_GUNLUGU_SAKLAMA_GUN = int(os.environ.get("DEGISIKLIK_GUNLUGU_SAKLAMA_GUN", "30"))
+
+async def degisiklik_gunlugu_buda():
+    """Drop changelog entries older than the retention window and remember the watermark."""
+    sinir = (datetime.now(timezone.utc) - timedelta(days=DEGISIKLIK_GUNLUGU_SAKLAMA_GUN)).strftime('%Y-%m-%dT%H:%M:%S')
+    db = await get_db()
+    try:
+        async with db.execute("SELECT MAX(seq) FROM degisiklik_gunlugu WHERE zaman < ?", (sinir,)) as cursor:
+            son = (await cursor.fetchone())[0]
+        if son:
+            await db.execute("DELETE FROM degisiklik_gunlugu WHERE seq <= ?", (son,))
+            await db.execute("UPDATE degisiklik_gunlugu_durum SET budanan_seq = MAX(budanan_seq, ?) WHERE id = 1", (son,))
+            await db.commit()
+    finally:
+        await db.close()
+
 def row_to_dict(row):
     """Convert SQLite Row to dictionary"""
     if row is None:
@@ -1206,6 +1474,84 @@ def rows_to_list(rows):
     """Convert list of SQLite Rows to list of dictionaries"""
     return [dict(row) for row in rows]
 
+# Geniş tablolar için liste görünümü alan projeksiyonları (?fields=liste)
+LISTE_PROJEKSIYONLARI = {
+    "personeller": ["id", "ad_soyad", "ad", "soyad", "departman", "pozisyon", "telefon", "aktif"],
+    "cimento_giris": ["id", "bosaltim_tarihi", "irsaliye_no", "fatura_no", "plaka", "cimento_alinan_firma",
+                      "cimento_cinsi", "bosaltim_isletmesi", "giris_miktari", "kantar_kg_miktari",
+                      "urun_nakliye_genel_toplam"],
+    "araclar": ["id", "plaka", "arac_cinsi", "marka", "model", "model_yili", "kayitli_sirket", "aktif"],
+}
+
+_tablo_kolonlari_cache = {}
+
+async def tablo_kolonlari(table: str) -> List[str]:
+    """Column names of a table (PRAGMA table_info), cached per process after init_db."""
+    cols = _tablo_kolonlari_cache.get(table)
+    if cols is None:
+        db = await get_db()
+        async with db.execute(f"PRAGMA table_info({table})") as cursor:
+            cols = [r[1] for r in await cursor.fetchall()]
+        await db.close()
+        _tablo_kolonlari_cache[table] = cols
+    return cols
+
+async def secim_listesi(table: str, fields: Optional[str]) -> str:
+    """Build the SELECT list for a `?fields=a,b,c` parameter.
+
+    No value keeps the full row; 'liste' expands to the route's default list
+    projection. Names are validated against the table schema, so the result
+    is safe to interpolate into SQL. 'id' is always included.
+    """
+    if not fields:
+        return "*"
+    if fields == "liste":
+        requested = list(LISTE_PROJEKSIYONLARI.get(table, []))
+    else:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+    cols = await tablo_kolonlari(table)
+    gecersiz = [f for f in requested if f not in cols]
+    if gecersiz:
+        raise HTTPException(status_code=400, detail=f"Geçersiz alan(lar): {', '.join(gecersiz)}")
+    if "id" not in requested:
+        requested.insert(0, "id")
+    return ", ".join(dict.fromkeys(requested))
+
+# Büyük liste endpoint'lerinde satırlar bu boyutta partiler halinde okunur
+STREAM_BATCH_SIZE = 500
+
+def stream_json_rows(query: str, params=(), transform=None, batch_size: int = STREAM_BATCH_SIZE):
+    """Stream a SELECT result as a JSON array without materializing all rows.
+
+    Rows are read with fetchmany() in batches and encoded one batch at a time,
+    so peak memory stays bounded by batch_size and '[' is sent before the
+    query has been fully stepped. `transform` may post-process each row dict.
+    """
+    async def generate():
+        db = await get_db()
+        try:
+            async with db.execute(query, params) as cursor:
+                yield b"["
+                first = True
+                while True:
+                    rows = await cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    parts = []
+                    for row in rows:
+                        item = dict(row)
+                        if transform is not None:
+                            item = transform(item)
+                        parts.append(json.dumps(item, ensure_ascii=False, separators=(",", ":"), default=str))
+                    chunk = ",".join(parts)
+                    yield (chunk if first else "," + chunk).encode("utf-8")
+                    first = False
+                yield b"]"
+        finally:
+            await db.close()
+
+    return StreamingResponse(generate(), media_type="application/json")
+
 # Models
 class UserCreate(BaseModel):
     name: str
@@ -1367,6 +1713,7 @@ class BimsStokUrunCreate(BaseModel):
     aciklama: str = ""
     acilis_miktari: float = 0
     acilis_tarihi: str = ""
+    min_stok: float = 10
 
 class BimsStokUrunUpdate(BaseModel):
     urun_adi: Optional[str] = None
@@ -1374,6 +1721,7 @@ class BimsStokUrunUpdate(BaseModel):
     aciklama: Optional[str] = None
     acilis_miktari: Optional[float] = None
     acilis_tarihi: Optional[str] = None
+    min_stok: Optional[float] = None
 
 class BimsStokHareketCreate(BaseModel):
     urun_id: str
@@ -1617,9 +1965,9 @@ def create_access_token(data: dict) -> str:
 def generate_id():
     return str(datetime.now(timezone.utc).timestamp()).replace(".", "")
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def kullanici_from_token(token: str) -> dict:
+    """Decode a JWT and load its user; raises 401 on any failure."""
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if email is None:
@@ -1641,6 +1989,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await kullanici_from_token(credentials.credentials)
+
 # Auth routes
 @api_router.post("/auth/register", response_model=Token)
 async def register(user_data: UserCreate):
@@ -1944,9 +2295,10 @@ async def create_bims_stok_urun(input: BimsStokUrunCreate, current_user: dict =
     mevcut_stok = input.acilis_miktari
     
     await db.execute(
-        """INSERT INTO bims_stok_urunler (id, urun_adi, birim, aciklama, acilis_miktari, acilis_tarihi, mevcut_stok, created_at)
-           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        (stok_id, input.urun_adi, input.birim, input.aciklama, input.acilis_miktari, input.acilis_tarihi, mevcut_stok, created_at)
+        """INSERT INTO bims_stok_urunler (id, urun_adi, birim, aciklama, acilis_miktari, acilis_tarihi, mevcut_stok, min_stok, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (stok_id, input.urun_adi, input.birim, input.aciklama, input.acilis_miktari, input.acilis_tarihi, mevcut_stok,
+         input.min_stok, created_at)
     )
     
     # Açılış fişi hareketi
@@ -1958,6 +2310,10 @@ async def create_bims_stok_urun(input: BimsStokUrunCreate, current_user: dict =
                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
             (hareket_id, stok_id, input.urun_adi, 'acilis', input.acilis_miktari, hareket_tarih, 'Açılış fişi', created_at)
         )
+        await bims_defter_hareket_ekle(db, {
+            'id': hareket_id, 'urun_id': stok_id, 'hareket_tipi': 'acilis',
+            'miktar': input.acilis_miktari, 'tarih': hareket_tarih, 'created_at': created_at,
+        })
     
     await db.commit()
     await db.close()
@@ -1965,62 +2321,191 @@ async def create_bims_stok_urun(input: BimsStokUrunCreate, current_user: dict =
     return {
         "id": stok_id, "urun_adi": input.urun_adi, "birim": input.birim, "aciklama": input.aciklama,
         "acilis_miktari": input.acilis_miktari, "acilis_tarihi": input.acilis_tarihi,
-        "mevcut_stok": mevcut_stok, "created_at": created_at
+        "mevcut_stok": mevcut_stok, "min_stok": input.min_stok, "created_at": created_at
     }
 
+# ----- Stok defteri (bakiye + günlük kontrol noktaları) -----
+def bims_hareket_yonu(hareket_tipi: str) -> int:
+    return 1 if hareket_tipi in ['giris', 'acilis'] else -1
+
+async def bims_defter_hareket_ekle(db, hareket: dict):
+    """Post a just-inserted movement: set its balance and rebalance everything after it (caller commits)."""
+    anahtar = (hareket['urun_id'], hareket['tarih'], hareket['created_at'], hareket['id'])
+    delta = bims_hareket_yonu(hareket['hareket_tipi']) * hareket['miktar']
+    async with db.execute(
+        """SELECT bakiye FROM bims_stok_hareketler
+           WHERE urun_id = ? AND (tarih, created_at, id) < (?, ?, ?)
+           ORDER BY tarih DESC, created_at DESC, id DESC LIMIT 1""",
+        anahtar,
+    ) as cursor:
+        onceki = await cursor.fetchone()
+    await db.execute(
+        "UPDATE bims_stok_hareketler SET bakiye = ? WHERE id = ?",
+        (((onceki[0] or 0) if onceki else 0) + delta, hareket['id']),
+    )
+    # Geriye tarihli hareket: sonraki bakiyeler kaydırılır
+    await db.execute(
+        "UPDATE bims_stok_hareketler SET bakiye = bakiye + ? WHERE urun_id = ? AND (tarih, created_at, id) > (?, ?, ?)",
+        (delta,) + anahtar,
+    )
+    await _bims_gunluk_uygula(db, hareket['urun_id'], hareket['tarih'], hareket['hareket_tipi'], hareket['miktar'])
+
+async def bims_defter_hareket_sil(db, hareket: dict):
+    """Reverse a movement in the ledger; call before deleting the row (caller commits)."""
+    delta = bims_hareket_yonu(hareket['hareket_tipi']) * hareket['miktar']
+    await db.execute(
+        "UPDATE bims_stok_hareketler SET bakiye = bakiye - ? WHERE urun_id = ? AND (tarih, created_at, id) > (?, ?, ?)",
+        (delta, hareket['urun_id'], hareket['tarih'], hareket['created_at'], hareket['id']),
+    )
+    await _bims_gunluk_uygula(db, hareket['urun_id'], hareket['tarih'], hareket['hareket_tipi'], -hareket['miktar'], silme=True)
+
+async def _bims_gunluk_uygula(db, urun_id: str, tarih: str, hareket_tipi: str, miktar: float, silme: bool = False):
+    yon = bims_hareket_yonu(hareket_tipi)
+    giris, cikis = (miktar, 0) if yon > 0 else (0, miktar)
+    # Gün yoksa önceki günün bakiyesiyle açılır; ardından o gün ve sonrası delta kadar kaydırılır
+    await db.execute(
+        """INSERT INTO bims_stok_gunluk (urun_id, tarih, giris, cikis, bakiye)
+           VALUES (?, ?, ?, ?, COALESCE((SELECT bakiye FROM bims_stok_gunluk
+                                         WHERE urun_id = ? AND tarih < ? ORDER BY tarih DESC LIMIT 1), 0))
+           ON CONFLICT (urun_id, tarih) DO UPDATE SET giris = giris + excluded.giris, cikis = cikis + excluded.cikis""",
+        (urun_id, tarih, giris, cikis, urun_id, tarih),
+    )
+    await db.execute(
+        "UPDATE bims_stok_gunluk SET bakiye = bakiye + ? WHERE urun_id = ? AND tarih >= ?",
+        (yon * miktar, urun_id, tarih),
+    )
+    if silme:
+        # Silinen hareket o günün son hareketiyse (satır henüz silinmedi) kontrol noktası da kalkar
+        await db.execute(
+            """DELETE FROM bims_stok_gunluk WHERE urun_id = ? AND tarih = ? AND (
+                   SELECT COUNT(*) FROM bims_stok_hareketler WHERE urun_id = ? AND tarih = ?) <= 1""",
+            (urun_id, tarih, urun_id, tarih),
+        )
+
+async def bims_stok_defter_yeniden_kur(db=None):
+    """Rebuild movement balances and daily checkpoints from scratch (backfill / repair)."""
+    kendi_baglantisi = db is None
+    if kendi_baglantisi:
+        db = await get_db()
+    try:
+        await db.execute(
+            """UPDATE bims_stok_hareketler SET bakiye = d.bakiye FROM (
+                   SELECT id, SUM(CASE WHEN hareket_tipi IN ('giris', 'acilis') THEN miktar ELSE -miktar END)
+                          OVER (PARTITION BY urun_id ORDER BY tarih, created_at, id) AS bakiye
+                   FROM bims_stok_hareketler
+               ) AS d WHERE bims_stok_hareketler.id = d.id"""
+        )
+        await db.execute("DELETE FROM bims_stok_gunluk")
+        await db.execute(
+            """INSERT INTO bims_stok_gunluk (urun_id, tarih, giris, cikis, bakiye)
+               SELECT urun_id, tarih, giris, cikis,
+                      SUM(giris - cikis) OVER (PARTITION BY urun_id ORDER BY tarih)
+               FROM (
+                   SELECT urun_id, tarih,
+                          SUM(CASE WHEN hareket_tipi IN ('giris', 'acilis') THEN miktar ELSE 0 END) AS giris,
+                          SUM(CASE WHEN hareket_tipi IN ('giris', 'acilis') THEN 0 ELSE miktar END) AS cikis
+                   FROM bims_stok_hareketler GROUP BY urun_id, tarih
+               )"""
+        )
+        await db.commit()
+    finally:
+        if kendi_baglantisi:
+            await db.close()
+
+def saha_cikan_katkilari(record: dict) -> dict:
+    """Per stock-product units shipped to the field by one production record's cikan_paket_1..5."""
+    katkilar = {}
+    for i in range(1, 6):
+        paket_str = record.get(f'cikan_paket_{i}')
+        if paket_str:
+            try:
+                paket = json.loads(paket_str) if isinstance(paket_str, str) else paket_str
+                if paket and paket.get('urun_id'):
+                    urun_id = paket['urun_id']
+                    # Stok ID formatı: product_id + "_stok"
+                    stok_id = urun_id + "_stok" if not urun_id.endswith("_stok") else urun_id
+                    
+                    paket_7 = int(paket.get('paket_7_boy') or 0)
+                    paket_5 = int(paket.get('paket_5_boy') or 0)
+                    birim_7 = int(paket.get('birim_7_boy') or 0)
+                    birim_5 = int(paket.get('birim_5_boy') or 0)
+                    
+                    katkilar[stok_id] = katkilar.get(stok_id, 0) + (paket_7 * birim_7) + (paket_5 * birim_5)
+            except:
+                pass
+    return katkilar
+
+async def saha_cikan_uygula(db, eski: Optional[dict], yeni: Optional[dict]):
+    """Apply the counter delta between the old and new version of a production record (caller commits)."""
+    deltalar = {}
+    for stok_id, miktar in saha_cikan_katkilari(eski or {}).items():
+        deltalar[stok_id] = deltalar.get(stok_id, 0) - miktar
+    for stok_id, miktar in saha_cikan_katkilari(yeni or {}).items():
+        deltalar[stok_id] = deltalar.get(stok_id, 0) + miktar
+    for stok_id, delta in deltalar.items():
+        if delta:
+            await db.execute(
+                """INSERT INTO bims_saha_cikan (stok_id, toplam) VALUES (?, ?)
+                   ON CONFLICT (stok_id) DO UPDATE SET toplam = toplam + excluded.toplam""",
+                (stok_id, delta),
+            )
+
+async def saha_cikan_beklenen(db) -> dict:
+    """Full recomputation of saha çıkan per stock product in one pass over production records."""
+    beklenen = {}
+    async with db.execute("SELECT cikan_paket_1, cikan_paket_2, cikan_paket_3, cikan_paket_4, cikan_paket_5 FROM production_records") as cursor:
+        async for row in cursor:
+            for stok_id, miktar in saha_cikan_katkilari(row_to_dict(row)).items():
+                beklenen[stok_id] = beklenen.get(stok_id, 0) + miktar
+    return beklenen
+
+async def saha_cikan_mutabakat(duzelt: bool = False) -> dict:
+    """Recompute saha çıkan from all production records and diff it against the counters."""
+    db = await get_db()
+    try:
+        if duzelt:
+            await yazma_baslat(db)
+        beklenen = await saha_cikan_beklenen(db)
+        async with db.execute("SELECT stok_id, toplam FROM bims_saha_cikan") as cursor:
+            sayaclar = {r[0]: r[1] for r in await cursor.fetchall()}
+
+        farklar = []
+        for stok_id in sorted(set(beklenen) | set(sayaclar)):
+            hedef, sayac = beklenen.get(stok_id, 0), sayaclar.get(stok_id, 0)
+            if abs(hedef - sayac) > 1e-9:
+                farklar.append({"stok_id": stok_id, "sayac": sayac, "beklenen": hedef})
+
+        if duzelt and farklar:
+            await db.execute("DELETE FROM bims_saha_cikan")
+            await db.executemany(
+                "INSERT INTO bims_saha_cikan (stok_id, toplam) VALUES (?, ?)",
+                [(k, v) for k, v in beklenen.items() if v],
+            )
+        await db.commit()
+        return {"kontrol_edilen": len(set(beklenen) | set(sayaclar)), "farklar": farklar, "duzeltildi": bool(duzelt and farklar)}
+    finally:
+        await db.close()
+
+@api_router.post("/admin/bims-saha-cikan/mutabakat")
+async def bims_saha_cikan_mutabakat(duzelt: bool = False, current_user: dict = Depends(require_admin)):
+    """Saha çıkan sayaçlarını tam yeniden hesaplamayla karşılaştırır; `duzelt=true` ise sayaçları yeniden kurar."""
+    return await saha_cikan_mutabakat(duzelt)
+
 @api_router.get("/bims-stok-urunler")
 async def get_bims_stok_urunler(current_user: dict = Depends(get_current_user)):
     db = await get_db()
-    # Products tablosundaki sira_no'ya göre sırala
+    # Products tablosundaki sira_no'ya göre sırala; saha çıkan sayaç tablosundan gelir
     query = """
-        SELECT s.* FROM bims_stok_urunler s
+        SELECT s.*, COALESCE(sc.toplam, 0) AS saha_cikan FROM bims_stok_urunler s
         LEFT JOIN products p ON s.id = p.id || '_stok'
+        LEFT JOIN bims_saha_cikan sc ON sc.stok_id = s.id
         ORDER BY COALESCE(p.sira_no, 999999) ASC, s.urun_adi ASC
     """
     async with db.execute(query) as cursor:
         rows = await cursor.fetchall()
     
-    stok_urunler = rows_to_list(rows)
-    
-    # Üretim kayıtlarından saha çıkan verileri hesapla
-    async with db.execute("SELECT cikan_paket_1, cikan_paket_2, cikan_paket_3, cikan_paket_4, cikan_paket_5, toplam_7_boy, toplam_5_boy FROM production_records") as cursor:
-        production_rows = await cursor.fetchall()
-    
     await db.close()
-    
-    # Her ürün için saha çıkan toplamını hesapla
-    saha_cikan_by_product = {}
-    
-    for row in production_rows:
-        prod = row_to_dict(row)
-        for i in range(1, 6):
-            paket_str = prod.get(f'cikan_paket_{i}')
-            if paket_str:
-                try:
-                    paket = json.loads(paket_str) if isinstance(paket_str, str) else paket_str
-                    if paket and paket.get('urun_id'):
-                        urun_id = paket['urun_id']
-                        # Stok ID formatı: product_id + "_stok"
-                        stok_id = urun_id + "_stok" if not urun_id.endswith("_stok") else urun_id
-                        
-                        paket_7 = int(paket.get('paket_7_boy') or 0)
-                        paket_5 = int(paket.get('paket_5_boy') or 0)
-                        birim_7 = int(paket.get('birim_7_boy') or 0)
-                        birim_5 = int(paket.get('birim_5_boy') or 0)
-                        
-                        toplam = (paket_7 * birim_7) + (paket_5 * birim_5)
-                        
-                        if stok_id not in saha_cikan_by_product:
-                            saha_cikan_by_product[stok_id] = 0
-                        saha_cikan_by_product[stok_id] += toplam
-                except:
-                    pass
-    
-    # Stok ürünlerine saha_cikan değerini ekle
-    for urun in stok_urunler:
-        urun['saha_cikan'] = saha_cikan_by_product.get(urun['id'], 0)
-    
-    return stok_urunler
+    return rows_to_list(rows)
 
 @api_router.get("/bims-stok-urunler/{id}")
 async def get_bims_stok_urun(id: str, current_user: dict = Depends(get_current_user)):
@@ -2066,6 +2551,7 @@ async def delete_bims_stok_urun(id: str, current_user: dict = Depends(get_curren
     db = await get_db()
     cursor = await db.execute("DELETE FROM bims_stok_urunler WHERE id = ?", (id,))
     await db.execute("DELETE FROM bims_stok_hareketler WHERE urun_id = ?", (id,))
+    await db.execute("DELETE FROM bims_stok_gunluk WHERE urun_id = ?", (id,))
     await db.commit()
     await db.close()
     
@@ -2082,6 +2568,7 @@ class AcilisFisiInput(BaseModel):
 @api_router.post("/bims-stok-acilis-fisi")
 async def create_acilis_fisi(input: AcilisFisiInput, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
     async with db.execute("SELECT * FROM bims_stok_urunler WHERE id = ?", (input.urun_id,)) as cursor:
         urun_row = await cursor.fetchone()
@@ -2094,10 +2581,14 @@ async def create_acilis_fisi(input: AcilisFisiInput, current_user: dict = Depend
     created_at = datetime.now(timezone.utc).isoformat()
     
     # Önce eski açılış fişlerini sil (her ürün için tek açılış fişi)
-    await db.execute(
-        "DELETE FROM bims_stok_hareketler WHERE urun_id = ? AND hareket_tipi = 'acilis'",
+    async with db.execute(
+        "SELECT * FROM bims_stok_hareketler WHERE urun_id = ? AND hareket_tipi = 'acilis'",
         (input.urun_id,)
-    )
+    ) as cursor:
+        eski_fisler = rows_to_list(await cursor.fetchall())
+    for fis in eski_fisler:
+        await bims_defter_hareket_sil(db, fis)
+        await db.execute("DELETE FROM bims_stok_hareketler WHERE id = ?", (fis['id'],))
     
     # Yeni açılış fişi ekle
     await db.execute(
@@ -2105,36 +2596,20 @@ async def create_acilis_fisi(input: AcilisFisiInput, current_user: dict = Depend
            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
         (hareket_id, input.urun_id, urun['urun_adi'], 'acilis', input.miktar, input.tarih, 'Açılış Fişi', created_at)
     )
+    await bims_defter_hareket_ekle(db, {
+        'id': hareket_id, 'urun_id': input.urun_id, 'hareket_tipi': 'acilis',
+        'miktar': input.miktar, 'tarih': input.tarih, 'created_at': created_at,
+    })
     
-    # Açılış miktarını ürün kaydında güncelle
-    await db.execute(
-        "UPDATE bims_stok_urunler SET acilis_miktari = ?, updated_at = ? WHERE id = ?",
-        (input.miktar, created_at, input.urun_id)
-    )
-    
-    # Stoku yeniden hesapla (açılış + giriş - çıkış)
-    async with db.execute(
-        """SELECT hareket_tipi, SUM(miktar) as toplam FROM bims_stok_hareketler 
-           WHERE urun_id = ? GROUP BY hareket_tipi""",
-        (input.urun_id,)
-    ) as cursor:
-        hareketler = await cursor.fetchall()
-    
-    toplam_giris = 0
-    toplam_cikis = 0
-    for h in hareketler:
-        h_dict = row_to_dict(h)
-        if h_dict['hareket_tipi'] in ['giris', 'acilis']:
-            toplam_giris += h_dict['toplam'] or 0
-        else:
-            toplam_cikis += h_dict['toplam'] or 0
-    
-    yeni_stok = toplam_giris - toplam_cikis
-    
+    # Açılış miktarını ürün kaydında güncelle; stok eski/yeni açılış farkı kadar kayar
+    acilis_farki = input.miktar - sum(f['miktar'] for f in eski_fisler)
     await db.execute(
-        "UPDATE bims_stok_urunler SET mevcut_stok = ?, updated_at = ? WHERE id = ?",
-        (yeni_stok, created_at, input.urun_id)
+        """UPDATE bims_stok_urunler SET acilis_miktari = ?, mevcut_stok = COALESCE(mevcut_stok, 0) + ?,
+           updated_at = ? WHERE id = ?""",
+        (input.miktar, acilis_farki, created_at, input.urun_id)
     )
+    async with db.execute("SELECT mevcut_stok FROM bims_stok_urunler WHERE id = ?", (input.urun_id,)) as cursor:
+        yeni_stok = (await cursor.fetchone())[0]
     
     await db.commit()
     await db.close()
@@ -2145,6 +2620,7 @@ async def create_acilis_fisi(input: AcilisFisiInput, current_user: dict = Depend
 @api_router.post("/bims-stok-hareketler")
 async def create_bims_stok_hareket(input: BimsStokHareketCreate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
     async with db.execute("SELECT * FROM bims_stok_urunler WHERE id = ?", (input.urun_id,)) as cursor:
         urun_row = await cursor.fetchone()
@@ -2161,17 +2637,15 @@ async def create_bims_stok_hareket(input: BimsStokHareketCreate, current_user: d
            VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
         (hareket_id, input.urun_id, urun['urun_adi'], input.hareket_tipi, input.miktar, input.tarih, input.aciklama, created_at)
     )
+    await bims_defter_hareket_ekle(db, {
+        'id': hareket_id, 'urun_id': input.urun_id, 'hareket_tipi': input.hareket_tipi,
+        'miktar': input.miktar, 'tarih': input.tarih, 'created_at': created_at,
+    })
     
-    # Stok güncelle
-    mevcut_stok = urun.get('mevcut_stok', 0)
-    if input.hareket_tipi in ['giris', 'acilis']:
-        yeni_stok = mevcut_stok + input.miktar
-    else:
-        yeni_stok = mevcut_stok - input.miktar
-    
+    # Stok güncelle (tek UPDATE, Python'da oku-değiştir-yaz yok)
     await db.execute(
-        "UPDATE bims_stok_urunler SET mevcut_stok = ?, updated_at = ? WHERE id = ?",
-        (yeni_stok, created_at, input.urun_id)
+        "UPDATE bims_stok_urunler SET mevcut_stok = COALESCE(mevcut_stok, 0) + ?, updated_at = ? WHERE id = ?",
+        (bims_hareket_yonu(input.hareket_tipi) * input.miktar, created_at, input.urun_id)
     )
     
     await db.commit()
@@ -2198,6 +2672,7 @@ async def get_bims_stok_hareketler(urun_id: str = None, current_user: dict = Dep
 @api_router.delete("/bims-stok-hareketler/{id}")
 async def delete_bims_stok_hareket(id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
     async with db.execute("SELECT * FROM bims_stok_hareketler WHERE id = ?", (id,)) as cursor:
         hareket_row = await cursor.fetchone()
@@ -2208,39 +2683,69 @@ async def delete_bims_stok_hareket(id: str, current_user: dict = Depends(get_cur
     hareket = row_to_dict(hareket_row)
     
     # Stok geri al
-    async with db.execute("SELECT mevcut_stok FROM bims_stok_urunler WHERE id = ?", (hareket['urun_id'],)) as cursor:
-        urun_row = await cursor.fetchone()
-    
-    if urun_row:
-        mevcut_stok = urun_row[0] or 0
-        if hareket['hareket_tipi'] in ['giris', 'acilis']:
-            yeni_stok = mevcut_stok - hareket['miktar']
-        else:
-            yeni_stok = mevcut_stok + hareket['miktar']
-        
-        await db.execute(
-            "UPDATE bims_stok_urunler SET mevcut_stok = ?, updated_at = ? WHERE id = ?",
-            (yeni_stok, datetime.now(timezone.utc).isoformat(), hareket['urun_id'])
-        )
+    await db.execute(
+        "UPDATE bims_stok_urunler SET mevcut_stok = COALESCE(mevcut_stok, 0) - ?, updated_at = ? WHERE id = ?",
+        (bims_hareket_yonu(hareket['hareket_tipi']) * hareket['miktar'], datetime.now(timezone.utc).isoformat(), hareket['urun_id'])
+    )
     
+    await bims_defter_hareket_sil(db, hareket)
     await db.execute("DELETE FROM bims_stok_hareketler WHERE id = ?", (id,))
     await db.commit()
     await db.close()
     return {"message": "Hareket silindi"}
 
+# ----- Düşük stok (ürün bazlı min_stok eşiği) -----
+# Liste, değişiklik günlüğündeki son bims_stok_urunler seq'i ile doğrulanan süreç içi önbellekte tutulur;
+# her stok hareketi ürünün mevcut_stok'unu güncellediği için yeni seq önbelleği geçersiz kılar.
+_bims_dusuk_stok_onbellek = {"seq": None, "urunler": []}
+
+async def bims_dusuk_stok_listesi(db) -> list:
+    """Products below their reorder threshold; cached until bims_stok_urunler changes."""
+    async with db.execute(
+        "SELECT COALESCE(MAX(seq), 0) FROM degisiklik_gunlugu WHERE tablo = 'bims_stok_urunler'"
+    ) as cursor:
+        seq = (await cursor.fetchone())[0]
+    if seq != _bims_dusuk_stok_onbellek["seq"]:
+        # Sorgu kısmi indeksin koşuluyla birebir aynı olmalı (idx_bims_stok_urunler_dusuk)
+        async with db.execute(
+            """SELECT id, urun_adi, birim, mevcut_stok, min_stok, min_stok - mevcut_stok AS eksik
+               FROM bims_stok_urunler WHERE mevcut_stok < min_stok ORDER BY urun_adi"""
+        ) as cursor:
+            urunler = rows_to_list(await cursor.fetchall())
+        _bims_dusuk_stok_onbellek.update({"seq": seq, "urunler": urunler})
+    return _bims_dusuk_stok_onbellek["urunler"]
+
+@api_router.get("/bims-stok-dusuk")
+async def get_bims_stok_dusuk(current_user: dict = Depends(get_current_user)):
+    """Mevcut stoğu kendi min_stok eşiğinin altına düşmüş ürünler."""
+    db = await get_db()
+    try:
+        return await bims_dusuk_stok_listesi(db)
+    finally:
+        await db.close()
+
 # Stok Özeti
 @api_router.get("/bims-stok-ozet")
-async def get_bims_stok_ozet(current_user: dict = Depends(get_current_user)):
+async def get_bims_stok_ozet(tarih: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     db = await get_db()
-    async with db.execute("SELECT * FROM bims_stok_urunler") as cursor:
-        rows = await cursor.fetchall()
+    if tarih:
+        # Belirtilen gün sonundaki stok: ürün başına son günlük kontrol noktası
+        async with db.execute(
+            """SELECT COUNT(*), COALESCE(SUM(mevcut_stok), 0), COALESCE(SUM(mevcut_stok < min_stok), 0) FROM (
+                   SELECT u.min_stok, COALESCE((SELECT g.bakiye FROM bims_stok_gunluk g
+                                                WHERE g.urun_id = u.id AND g.tarih <= ?
+                                                ORDER BY g.tarih DESC LIMIT 1), 0) AS mevcut_stok
+                   FROM bims_stok_urunler u
+               )""",
+            (tarih,)
+        ) as cursor:
+            toplam_urun, toplam_stok, dusuk_stok = await cursor.fetchone()
+    else:
+        async with db.execute("SELECT COUNT(*), COALESCE(SUM(mevcut_stok), 0) FROM bims_stok_urunler") as cursor:
+            toplam_urun, toplam_stok = await cursor.fetchone()
+        dusuk_stok = len(await bims_dusuk_stok_listesi(db))
     await db.close()
     
-    urunler = rows_to_list(rows)
-    toplam_urun = len(urunler)
-    toplam_stok = sum([u.get('mevcut_stok', 0) for u in urunler])
-    dusuk_stok = len([u for u in urunler if u.get('mevcut_stok', 0) < 10])
-    
     return {
         "toplam_urun": toplam_urun,
         "toplam_stok": toplam_stok,
@@ -2653,19 +3158,8 @@ async def create_cimento_isletme(input: CimentoIsletmeCreate, current_user: dict
          1 if input.aktif else 0, created_at)
     )
     
-    # Açılış fişi hareketi oluştur
-    if input.acilis_stok_kg > 0:
-        hareket_id = generate_id() + "h"
-        hareket_tarih = input.acilis_tarihi or datetime.now().strftime('%Y-%m-%d')
-        await db.execute(
-            """INSERT INTO cimento_stok_hareketler (id, isletme_id, isletme_adi, hareket_tipi, 
-               miktar_kg, tarih, aciklama, referans_id, referans_tip, created_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (hareket_id, isletme_id, input.name, 'acilis', input.acilis_stok_kg, 
-             hareket_tarih, 'Açılış fişi', '', 'acilis', created_at)
-        )
-    
-    await db.commit()
+    # Açılış fişi + bu isimle geçmişte yapılmış teslimat/harcamalar deftere işlenir
+    await cimento_stok_defter_yeniden_kur(db)
     
     async with db.execute("SELECT * FROM cimento_isletmeler WHERE id = ?", (isletme_id,)) as cursor:
         row = await cursor.fetchone()
@@ -2694,6 +3188,7 @@ async def get_cimento_isletme(id: str, current_user: dict = Depends(get_current_
 @api_router.put("/cimento-isletmeler/{id}")
 async def update_cimento_isletme(id: str, input: CimentoIsletmeUpdate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
     async with db.execute("SELECT * FROM cimento_isletmeler WHERE id = ?", (id,)) as cursor:
         existing_row = await cursor.fetchone()
@@ -2702,26 +3197,15 @@ async def update_cimento_isletme(id: str, input: CimentoIsletmeUpdate, current_u
         raise HTTPException(status_code=404, detail="İşletme bulunamadı")
     
     existing = row_to_dict(existing_row)
-    old_acilis_stok = existing.get('acilis_stok_kg', 0) or 0
     
     updates = []
     params = []
-    new_acilis_stok = None
     
     for field, value in input.model_dump().items():
         if value is not None:
             if field == 'aktif':
                 updates.append(f"{field} = ?")
                 params.append(1 if value else 0)
-            elif field == 'acilis_stok_kg':
-                new_acilis_stok = value
-                updates.append(f"{field} = ?")
-                params.append(value)
-                # Mevcut stoku da güncelle (fark kadar)
-                stok_fark = value - old_acilis_stok
-                new_mevcut = (existing.get('mevcut_stok_kg', 0) or 0) + stok_fark
-                updates.append("mevcut_stok_kg = ?")
-                params.append(new_mevcut)
             else:
                 updates.append(f"{field} = ?")
                 params.append(value)
@@ -2731,7 +3215,13 @@ async def update_cimento_isletme(id: str, input: CimentoIsletmeUpdate, current_u
         params.append(datetime.now(timezone.utc).isoformat())
         params.append(id)
         await db.execute(f"UPDATE cimento_isletmeler SET {', '.join(updates)} WHERE id = ?", params)
-        await db.commit()
+        # Stok defteri: isim değiştiyse eşleşmeler değişir (tam yeniden kur), yoksa yalnız açılış fişi
+        if input.name is not None and input.name != existing.get('name'):
+            await cimento_stok_defter_yeniden_kur(db)
+        else:
+            if input.acilis_stok_kg is not None or input.acilis_tarihi is not None:
+                await cimento_defter_esitle(db, "acilis", id)
+            await db.commit()
     
     async with db.execute("SELECT * FROM cimento_isletmeler WHERE id = ?", (id,)) as cursor:
         row = await cursor.fetchone()
@@ -2743,6 +3233,7 @@ async def delete_cimento_isletme(id: str, current_user: dict = Depends(get_curre
     db = await get_db()
     # İlişkili stok hareketlerini de sil
     await db.execute("DELETE FROM cimento_stok_hareketler WHERE isletme_id = ?", (id,))
+    await db.execute("DELETE FROM cimento_stok_gunluk WHERE isletme_id = ?", (id,))
     cursor = await db.execute("DELETE FROM cimento_isletmeler WHERE id = ?", (id,))
     await db.commit()
     await db.close()
@@ -2784,20 +3275,199 @@ async def get_cimento_isletme_stok_ozet(current_user: dict = Depends(get_current
         "isletmeler": isletmeler
     }
 
+# ----- Çimento stok defteri -----
+# Açılış, teslimat (cimento_giris, TON → KG) ve makine harcaması (production_records.machine_cement, KG)
+# cimento_stok_hareketler'e referans başına tek satır olarak işlenir; işletme eşlemesi isim üzerindendir.
+CIMENTO_DEFTER_KAYNAKLARI = {
+    "acilis": ("acilis", "acilis_kg"),
+    "cimento_giris": ("giris", "giris_kg"),
+    "production": ("harcama", "harcanan_kg"),
+}
+
+async def _cimento_kaynak_hareketi(db, referans_tip: str, referans_id: str) -> Optional[dict]:
+    """Build the ledger movement a source record should currently produce (None if it produces none)."""
+    if referans_tip == "acilis":
+        query = """SELECT id AS isletme_id, name AS isletme_adi, acilis_stok_kg AS miktar_kg,
+                          COALESCE(NULLIF(acilis_tarihi, ''), substr(created_at, 1, 10)) AS tarih, created_at
+                   FROM cimento_isletmeler WHERE id = ?"""
+    elif referans_tip == "cimento_giris":
+        query = """SELECT i.id AS isletme_id, i.name AS isletme_adi, g.giris_miktari * 1000 AS miktar_kg,
+                          COALESCE(NULLIF(g.bosaltim_tarihi, ''), substr(g.created_at, 1, 10)) AS tarih, g.created_at
+                   FROM cimento_giris g
+                   JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) i ON i.name = g.bosaltim_isletmesi
+                   WHERE g.id = ?"""
+    else:
+        query = """SELECT i.id AS isletme_id, i.name AS isletme_adi, COALESCE(p.machine_cement, 0) AS miktar_kg,
+                          COALESCE(NULLIF(p.production_date, ''), substr(p.created_at, 1, 10)) AS tarih, p.created_at
+                   FROM production_records p
+                   JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) i ON i.name = p.department_name
+                   WHERE p.id = ?"""
+    async with db.execute(query, (referans_id,)) as cursor:
+        row = await cursor.fetchone()
+    if not row or not row["miktar_kg"]:
+        return None
+    hareket = row_to_dict(row)
+    hareket["hareket_tipi"] = CIMENTO_DEFTER_KAYNAKLARI[referans_tip][0]
+    return hareket
+
+async def cimento_defter_esitle(db, referans_tip: str, referans_id: str):
+    """Re-post one source record into the cement ledger after it was created/updated/deleted (caller commits)."""
+    kolon = CIMENTO_DEFTER_KAYNAKLARI[referans_tip][1]
+    async with db.execute(
+        "SELECT * FROM cimento_stok_hareketler WHERE referans_tip = ? AND referans_id = ?",
+        (referans_tip, referans_id),
+    ) as cursor:
+        eski_hareketler = rows_to_list(await cursor.fetchall())
+    for eski in eski_hareketler:
+        await _cimento_gunluk_uygula(db, eski["isletme_id"], eski["tarih"], kolon, -eski["miktar_kg"])
+    await db.execute(
+        "DELETE FROM cimento_stok_hareketler WHERE referans_tip = ? AND referans_id = ?",
+        (referans_tip, referans_id),
+    )
+
+    yeni = await _cimento_kaynak_hareketi(db, referans_tip, referans_id)
+    if yeni:
+        await db.execute(
+            """INSERT INTO cimento_stok_hareketler (id, isletme_id, isletme_adi, hareket_tipi,
+               miktar_kg, tarih, aciklama, referans_id, referans_tip, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, '', ?, ?, ?)""",
+            (f"{referans_tip}_{referans_id}", yeni["isletme_id"], yeni["isletme_adi"], yeni["hareket_tipi"],
+             yeni["miktar_kg"], yeni["tarih"], referans_id, referans_tip, yeni["created_at"]),
+        )
+        await _cimento_gunluk_uygula(db, yeni["isletme_id"], yeni["tarih"], kolon, yeni["miktar_kg"])
+
+async def _cimento_gunluk_uygula(db, isletme_id: str, tarih: str, kolon: str, miktar_kg: float):
+    # Gün satırı yoksa önceki günün kümülatifleriyle açılır; o gün ve sonrası kaydırılır
+    await db.execute(
+        """INSERT INTO cimento_stok_gunluk (isletme_id, tarih, kum_acilis_kg, kum_giris_kg, kum_harcanan_kg)
+            SELECT ?, ?, COALESCE(MAX(kum_acilis_kg), 0), COALESCE(MAX(kum_giris_kg), 0), COALESCE(MAX(kum_harcanan_kg), 0)
+            FROM (SELECT * FROM cimento_stok_gunluk WHERE isletme_id = ? AND tarih < ? ORDER BY tarih DESC LIMIT 1)
+            WHERE true
+            ON CONFLICT (isletme_id, tarih) DO NOTHING""",
+        (isletme_id, tarih, isletme_id, tarih),
+    )
+    await db.execute(
+        f"UPDATE cimento_stok_gunluk SET {kolon} = {kolon} + ? WHERE isletme_id = ? AND tarih = ?",
+        (miktar_kg, isletme_id, tarih),
+    )
+    await db.execute(
+        f"UPDATE cimento_stok_gunluk SET kum_{kolon} = kum_{kolon} + ? WHERE isletme_id = ? AND tarih >= ?",
+        (miktar_kg, isletme_id, tarih),
+    )
+    await db.execute(
+        """DELETE FROM cimento_stok_gunluk WHERE isletme_id = ? AND tarih = ?
+           AND ABS(acilis_kg) < 1e-9 AND ABS(giris_kg) < 1e-9 AND ABS(harcanan_kg) < 1e-9""",
+        (isletme_id, tarih),
+    )
+    yon = -1 if kolon == "harcanan_kg" else 1
+    await db.execute(
+        "UPDATE cimento_isletmeler SET mevcut_stok_kg = COALESCE(mevcut_stok_kg, 0) + ? WHERE id = ?",
+        (yon * miktar_kg, isletme_id),
+    )
+
+async def cimento_stok_defter_yeniden_kur(db=None):
+    """Re-post all openings, deliveries and consumption and rebuild the daily checkpoints."""
+    kendi_baglantisi = db is None
+    if kendi_baglantisi:
+        db = await get_db()
+    try:
+        await db.execute(
+            "DELETE FROM cimento_stok_hareketler WHERE referans_tip IN ('acilis', 'cimento_giris', 'production')"
+        )
+        await db.execute(
+            """INSERT INTO cimento_stok_hareketler (id, isletme_id, isletme_adi, hareket_tipi, miktar_kg, tarih,
+                                                    aciklama, referans_id, referans_tip, created_at)
+               SELECT 'acilis_' || id, id, name, 'acilis', acilis_stok_kg,
+                      COALESCE(NULLIF(acilis_tarihi, ''), substr(created_at, 1, 10)), '', id, 'acilis', created_at
+               FROM cimento_isletmeler WHERE COALESCE(acilis_stok_kg, 0) != 0"""
+        )
+        await db.execute(
+            """INSERT INTO cimento_stok_hareketler (id, isletme_id, isletme_adi, hareket_tipi, miktar_kg, tarih,
+                                                    aciklama, referans_id, referans_tip, created_at)
+               SELECT 'cimento_giris_' || g.id, i.id, i.name, 'giris', g.giris_miktari * 1000,
+                      COALESCE(NULLIF(g.bosaltim_tarihi, ''), substr(g.created_at, 1, 10)), '', g.id, 'cimento_giris', g.created_at
+               FROM cimento_giris g
+               JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) i ON i.name = g.bosaltim_isletmesi
+               WHERE COALESCE(g.giris_miktari, 0) != 0"""
+        )
+        await db.execute(
+            """INSERT INTO cimento_stok_hareketler (id, isletme_id, isletme_adi, hareket_tipi, miktar_kg, tarih,
+                                                    aciklama, referans_id, referans_tip, created_at)
+               SELECT 'production_' || p.id, i.id, i.name, 'harcama', p.machine_cement,
+                      COALESCE(NULLIF(p.production_date, ''), substr(p.created_at, 1, 10)), '', p.id, 'production', p.created_at
+               FROM production_records p
+               JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) i ON i.name = p.department_name
+               WHERE COALESCE(p.machine_cement, 0) != 0"""
+        )
+        await db.execute("DELETE FROM cimento_stok_gunluk")
+        await db.execute(
+            """INSERT INTO cimento_stok_gunluk (isletme_id, tarih, acilis_kg, giris_kg, harcanan_kg,
+                                                kum_acilis_kg, kum_giris_kg, kum_harcanan_kg)
+               SELECT isletme_id, tarih, acilis_kg, giris_kg, harcanan_kg,
+                      SUM(acilis_kg) OVER w, SUM(giris_kg) OVER w, SUM(harcanan_kg) OVER w
+               FROM (
+                   SELECT isletme_id, tarih,
+                          SUM(CASE WHEN hareket_tipi = 'acilis' THEN miktar_kg ELSE 0 END) AS acilis_kg,
+                          SUM(CASE WHEN hareket_tipi = 'giris' THEN miktar_kg ELSE 0 END) AS giris_kg,
+                          SUM(CASE WHEN hareket_tipi = 'harcama' THEN miktar_kg ELSE 0 END) AS harcanan_kg
+                   FROM cimento_stok_hareketler GROUP BY isletme_id, tarih
+               )
+               WINDOW w AS (PARTITION BY isletme_id ORDER BY tarih)"""
+        )
+        await db.execute(
+            """UPDATE cimento_isletmeler SET mevcut_stok_kg = COALESCE((
+                   SELECT SUM(CASE WHEN h.hareket_tipi = 'harcama' THEN -h.miktar_kg ELSE h.miktar_kg END)
+                   FROM cimento_stok_hareketler h WHERE h.isletme_id = cimento_isletmeler.id), 0)"""
+        )
+        await db.commit()
+    finally:
+        if kendi_baglantisi:
+            await db.close()
+
+async def cimento_kontrol_noktasi(db, isletme_id: str, tarih: Optional[str], dahil: bool = True) -> dict:
+    """Cumulative totals of an işletme at the end of `tarih` (or strictly before it when dahil=False)."""
+    query = "SELECT kum_acilis_kg, kum_giris_kg, kum_harcanan_kg FROM cimento_stok_gunluk WHERE isletme_id = ?"
+    params = [isletme_id]
+    if tarih:
+        query += " AND tarih <= ?" if dahil else " AND tarih < ?"
+        params.append(tarih)
+    query += " ORDER BY tarih DESC LIMIT 1"
+    async with db.execute(query, params) as cursor:
+        row = await cursor.fetchone()
+    if not row:
+        return {"kum_acilis_kg": 0, "kum_giris_kg": 0, "kum_harcanan_kg": 0}
+    return row_to_dict(row)
+
+@api_router.post("/admin/cimento-stok-defteri/yeniden-kur")
+async def cimento_stok_defteri_yeniden_kur(current_user: dict = Depends(require_admin)):
+    """Geçmiş açılış/teslimat/harcama verilerinden çimento stok defterini ve kontrol noktalarını yeniden kurar."""
+    await cimento_stok_defter_yeniden_kur()
+    db = await get_db()
+    async with db.execute("SELECT COUNT(*) FROM cimento_stok_hareketler") as cursor:
+        hareket = (await cursor.fetchone())[0]
+    async with db.execute("SELECT COUNT(*) FROM cimento_stok_gunluk") as cursor:
+        gunluk = (await cursor.fetchone())[0]
+    await db.close()
+    return {"hareket_sayisi": hareket, "kontrol_noktasi_sayisi": gunluk}
+
 # ============ Çimento Stok Raporu API'si ============
 @api_router.get("/cimento-stok-raporu")
 async def get_cimento_stok_raporu(
     baslangic_tarihi: str = None,
     bitis_tarihi: str = None,
+    as_of: str = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
-    İşletme bazlı çimento stok raporu:
+    İşletme bazlı çimento stok raporu (çimento stok defteri kontrol noktalarından):
     - Açılış Stoku (cimento_isletmeler.acilis_stok_kg)
-    - Gelen Tonaj (cimento_giris tablosundan bosaltim_isletmesi bazında)
-    - Harcanan Tonaj (production_records.machine_cement department_name bazında)
+    - Gelen Tonaj (cimento_giris teslimatları, bosaltim_isletmesi bazında)
+    - Harcanan Tonaj (production_records.machine_cement, department_name bazında)
     - Mevcut Stok = Açılış + Gelen - Harcanan
+    `as_of` verilirse o gün sonundaki durum döner (bitis_tarihi kısayolu).
     """
+    if as_of:
+        bitis_tarihi = as_of
     db = await get_db()
     
     # 1. Tüm işletmeleri al
@@ -2805,75 +3475,33 @@ async def get_cimento_stok_raporu(
         isletme_rows = await cursor.fetchall()
     isletmeler = rows_to_list(isletme_rows)
     
-    # 2. Çimento giriş kayıtlarını al (tarih filtreli)
-    giris_query = "SELECT bosaltim_isletmesi, SUM(giris_miktari) as toplam_giris FROM cimento_giris WHERE 1=1"
+    # 2-3. Dönem içi gelen/harcanan = bitişteki kümülatif - başlangıçtan önceki kümülatif
+    giris_data = {}
+    harcanan_data = {}
+    for isletme in isletmeler:
+        son = await cimento_kontrol_noktasi(db, isletme['id'], bitis_tarihi)
+        once = await cimento_kontrol_noktasi(db, isletme['id'], baslangic_tarihi, dahil=False) if baslangic_tarihi else None
+        giris_data[isletme['id']] = son['kum_giris_kg'] - (once['kum_giris_kg'] if once else 0)
+        harcanan_data[isletme['id']] = son['kum_harcanan_kg'] - (once['kum_harcanan_kg'] if once else 0)
+    
+    # 4-5. Günlük giriş / harcanan detayları (günlük kontrol noktalarından)
+    gunluk_query = """
+        SELECT g.tarih, i.name, g.giris_kg, g.harcanan_kg
+        FROM cimento_stok_gunluk g JOIN cimento_isletmeler i ON i.id = g.isletme_id WHERE 1=1
+    """
     params = []
     if baslangic_tarihi:
-        giris_query += " AND bosaltim_tarihi >= ?"
+        gunluk_query += " AND g.tarih >= ?"
         params.append(baslangic_tarihi)
     if bitis_tarihi:
-        giris_query += " AND bosaltim_tarihi <= ?"
+        gunluk_query += " AND g.tarih <= ?"
         params.append(bitis_tarihi)
-    giris_query += " GROUP BY bosaltim_isletmesi"
+    gunluk_query += " ORDER BY g.tarih DESC, i.name"
     
-    async with db.execute(giris_query, params) as cursor:
-        giris_rows = await cursor.fetchall()
-    giris_data = {row[0]: row[1] or 0 for row in giris_rows}
-    
-    # 3. Üretim kayıtlarından harcanan çimentoyu al (machine_cement, department_name bazında)
-    harcanan_query = """
-        SELECT department_name, SUM(COALESCE(machine_cement, 0)) as toplam_harcanan 
-        FROM production_records WHERE 1=1
-    """
-    params2 = []
-    if baslangic_tarihi:
-        harcanan_query += " AND (production_date >= ? OR created_at >= ?)"
-        params2.extend([baslangic_tarihi, baslangic_tarihi])
-    if bitis_tarihi:
-        harcanan_query += " AND (production_date <= ? OR created_at <= ?)"
-        params2.extend([bitis_tarihi, bitis_tarihi])
-    harcanan_query += " GROUP BY department_name"
-    
-    async with db.execute(harcanan_query, params2) as cursor:
-        harcanan_rows = await cursor.fetchall()
-    harcanan_data = {row[0]: row[1] or 0 for row in harcanan_rows}
-    
-    # 4. Günlük giriş detayları (tarih bazlı)
-    gunluk_giris_query = """
-        SELECT bosaltim_tarihi, bosaltim_isletmesi, SUM(giris_miktari) as toplam
-        FROM cimento_giris WHERE 1=1
-    """
-    params3 = []
-    if baslangic_tarihi:
-        gunluk_giris_query += " AND bosaltim_tarihi >= ?"
-        params3.append(baslangic_tarihi)
-    if bitis_tarihi:
-        gunluk_giris_query += " AND bosaltim_tarihi <= ?"
-        params3.append(bitis_tarihi)
-    gunluk_giris_query += " GROUP BY bosaltim_tarihi, bosaltim_isletmesi ORDER BY bosaltim_tarihi DESC"
-    
-    async with db.execute(gunluk_giris_query, params3) as cursor:
-        gunluk_giris_rows = await cursor.fetchall()
-    gunluk_giris = [{"tarih": r[0], "isletme": r[1], "miktar_ton": r[2]} for r in gunluk_giris_rows]
-    
-    # 5. Günlük harcanan detayları (tarih bazlı)
-    gunluk_harcanan_query = """
-        SELECT COALESCE(production_date, DATE(created_at)) as tarih, department_name, 
-               SUM(COALESCE(machine_cement, 0)) as toplam
-        FROM production_records WHERE 1=1
-    """
-    params4 = []
-    if baslangic_tarihi:
-        gunluk_harcanan_query += " AND (production_date >= ? OR created_at >= ?)"
-        params4.extend([baslangic_tarihi, baslangic_tarihi])
-    if bitis_tarihi:
-        gunluk_harcanan_query += " AND (production_date <= ? OR created_at <= ?)"
-        params4.extend([bitis_tarihi, bitis_tarihi])
-    gunluk_harcanan_query += " GROUP BY tarih, department_name ORDER BY tarih DESC"
-    
-    async with db.execute(gunluk_harcanan_query, params4) as cursor:
-        gunluk_harcanan_rows = await cursor.fetchall()
-    gunluk_harcanan = [{"tarih": r[0], "isletme": r[1], "miktar_kg": r[2]} for r in gunluk_harcanan_rows]
+    async with db.execute(gunluk_query, params) as cursor:
+        gunluk_rows = await cursor.fetchall()
+    gunluk_giris = [{"tarih": r[0], "isletme": r[1], "miktar_ton": r[2] / 1000} for r in gunluk_rows if r[2]]
+    gunluk_harcanan = [{"tarih": r[0], "isletme": r[1], "miktar_kg": r[3]} for r in gunluk_rows if r[3]]
     
     await db.close()
     
@@ -2888,12 +3516,9 @@ async def get_cimento_stok_raporu(
         isletme_adi = isletme.get('name', '')
         acilis_kg = isletme.get('acilis_stok_kg', 0) or 0
         
-        # Gelen tonaj (TON olarak kaydedilmiş, KG'ye çevir)
-        gelen_ton = giris_data.get(isletme_adi, 0)
-        gelen_kg = gelen_ton * 1000  # TON -> KG
-        
-        # Harcanan (zaten KG)
-        harcanan_kg = harcanan_data.get(isletme_adi, 0)
+        # Gelen ve harcanan (defterde KG olarak tutulur)
+        gelen_kg = giris_data.get(isletme['id'], 0)
+        harcanan_kg = harcanan_data.get(isletme['id'], 0)
         
         # Mevcut stok hesapla
         mevcut_kg = acilis_kg + gelen_kg - harcanan_kg
@@ -2996,25 +3621,142 @@ app.add_middleware(
 async def github_sync_middleware(request, call_next):
     """
     After any successful POST/PUT/PATCH/DELETE on /api/* routes,
-    schedule a (debounced) GitHub push of the affected table + full DB.
+    schedule a (debounced) GitHub push of the affected table + full DB
+    and publish a live event to SSE subscribers.
     Errors are swallowed so they never break the API response.
     """
+    hints = None
+    if (
+        request.method in ("POST", "PUT", "PATCH")
+        and request.headers.get("content-type", "").startswith("application/json")
+        and int(request.headers.get("content-length") or 0) <= 16384
+    ):
+        # Küçük JSON gövdelerinden urun_id vb. ipuçlarını olaya ekle
+        hints = live_events.extract_hints(await request.body())
     response = await call_next(request)
     try:
         if (
-            github_sync_is_configured()
-            and request.method in ("POST", "PUT", "PATCH", "DELETE")
+            request.method in ("POST", "PUT", "PATCH", "DELETE")
             and 200 <= response.status_code < 300
         ):
             table = resolve_table_from_path(request.url.path)
-            # Schedule sync — always also pushes full DB even if table is None
-            schedule_sync(table)
+            if github_sync_is_configured():
+                # Schedule sync — always also pushes full DB even if table is None
+                schedule_sync(table)
+            live_events.publish(table, request.method, request.url.path, hints)
     except Exception:
         # Never let sync logic affect the user response
         logging.getLogger("github_sync").exception("middleware error")
     return response
 
 
+# ============ Değişiklik Akışı (Changes Feed) ============
+@api_router.get("/changes")
+async def get_changes(since: int = 0, tables: Optional[str] = None, limit: int = 1000,
+                      current_user: dict = Depends(get_current_user)):
+    """
+    İstemci önbellekleri için artımlı değişiklik akışı.
+    `since` cursor'ından sonra eklenen/güncellenen/silinen kayıtları döner;
+    istemci dönen `cursor` ile bir sonraki isteği yapar. `reset: true` ise
+    cursor budanmış günlüğün gerisinde kalmıştır, tablolar baştan yüklenmelidir.
+    """
+    if tables:
+        tablolar = [t.strip() for t in tables.split(",") if t.strip()]
+        gecersiz = [t for t in tablolar if t not in DEGISIKLIK_TAKIP_TABLOLARI]
+        if gecersiz:
+            raise HTTPException(status_code=400, detail=f"İzlenmeyen tablo(lar): {', '.join(gecersiz)}")
+    else:
+        tablolar = list(DEGISIKLIK_TAKIP_TABLOLARI)
+    limit = max(1, min(limit, 5000))
+
+    db = await get_db()
+    try:
+        async with db.execute(
+            "SELECT budanan_seq, (SELECT COALESCE(MAX(seq), 0) FROM degisiklik_gunlugu) FROM degisiklik_gunlugu_durum WHERE id = 1"
+        ) as cursor:
+            budanan_seq, son_seq = await cursor.fetchone()
+        if since < budanan_seq:
+            return {"cursor": max(son_seq, budanan_seq), "reset": True, "has_more": False, "changes": {}}
+
+        yer = ", ".join("?" for _ in tablolar)
+        async with db.execute(
+            f"SELECT seq, tablo, kayit_id, islem FROM degisiklik_gunlugu WHERE seq > ? AND tablo IN ({yer}) ORDER BY seq LIMIT ?",
+            [since, *tablolar, limit + 1],
+        ) as cursor:
+            kayitlar = await cursor.fetchall()
+        has_more = len(kayitlar) > limit
+        kayitlar = kayitlar[:limit]
+
+        # Aynı kayda ait birden çok değişikliği birleştir: ilk işlem eklenme mi, son durum ne?
+        ilk_islem = {}
+        for k in kayitlar:
+            ilk_islem.setdefault((k["tablo"], k["kayit_id"]), k["islem"])
+
+        changes = {}
+        idler_by_tablo = {}
+        for (tablo, kayit_id) in ilk_islem:
+            idler_by_tablo.setdefault(tablo, []).append(kayit_id)
+        for tablo, idler in idler_by_tablo.items():
+            mevcut = {}
+            for i in range(0, len(idler), 500):
+                parca = idler[i:i + 500]
+                async with db.execute(
+                    f"SELECT * FROM {tablo} WHERE id IN ({', '.join('?' for _ in parca)})", parca
+                ) as cursor:
+                    for row in await cursor.fetchall():
+                        mevcut[str(row["id"])] = dict(row)
+            donusum = DEGISIKLIK_PAYLOAD_DONUSUMLERI.get(tablo)
+            grup = {"inserted": [], "updated": [], "deleted": []}
+            for kayit_id in idler:
+                satir = mevcut.get(kayit_id)
+                eklendi = ilk_islem[(tablo, kayit_id)] == "I"
+                if satir is None:
+                    if not eklendi:
+                        grup["deleted"].append(kayit_id)
+                    continue
+                if donusum is not None:
+                    satir = donusum(satir)
+                grup["inserted" if eklendi else "updated"].append(satir)
+            changes[tablo] = grup
+
+        # Limit dolmadıysa istenen tablolar için son_seq'e kadar her şey okundu
+        son_okunan = kayitlar[-1]["seq"] if kayitlar else since
+        cursor_degeri = son_okunan if has_more else max(son_okunan, son_seq, since)
+        return {"cursor": cursor_degeri, "reset": False, "has_more": has_more, "changes": changes}
+    finally:
+        await db.close()
+
+
+# ============ Canlı Olaylar (SSE) ============
+@api_router.get("/events")
+async def stream_events(request: Request, token: str, modules: Optional[str] = None):
+    """
+    Dashboard'lar için Server-Sent Events kanalı. EventSource header
+    gönderemediği için JWT `token` query parametresiyle alınır.
+    `modules=bims,cimento` ile sadece ilgili modüllerin olayları gelir.
+    """
+    await kullanici_from_token(token)
+    modul_listesi = None
+    if modules:
+        modul_listesi = [m.strip() for m in modules.split(",") if m.strip()]
+        gecerli = set(live_events.TABLE_TO_MODULE.values())
+        gecersiz = [m for m in modul_listesi if m not in gecerli]
+        if gecersiz:
+            raise HTTPException(status_code=400, detail=f"Geçersiz modül(ler): {', '.join(gecersiz)}")
+    sub = live_events.subscribe(modul_listesi)
+    return StreamingResponse(
+        live_events.event_stream(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@api_router.get("/events/status")
+async def events_status(current_user: dict = Depends(get_current_user)):
+    """Bağlı SSE istemcileri ve yayın istatistikleri."""
+    return live_events.get_stats()
+
+
 # ============ GitHub Sync Admin Endpoints ============
 @api_router.get("/github-sync/status")
 async def github_sync_status():
@@ -3025,6 +3767,7 @@ async def github_sync_status():
         "branch": os.environ.get("GITHUB_BRANCH", "main"),
         "enabled": os.environ.get("GITHUB_SYNC_ENABLED", "true"),
         "stats": github_sync_stats(),
+        "outbox": await github_sync_outbox_status(),
     }
 
 
@@ -3043,6 +3786,235 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ============ Stok Mutabakatı (Reconcile) ============
+# Denormalize stok önbellekleri yazma yolunda delta ile güncellenir. Arka plan işi her önbelleği
+# kaynak satırlardan tablo başına tek toplu sorguyla (salt okunur bağlantı) yeniden hesaplar,
+# sapmaları stok_mutabakat_sapmalari'na yazar ve istenirse yazma kilidi altında düzeltir.
+STOK_MUTABAKAT_SANIYE = int(os.environ.get("STOK_MUTABAKAT_SANIYE", os.environ.get("MOTORIN_MUTABAKAT_SANIYE", "3600")))
+STOK_MUTABAKAT_OTOMATIK_DUZELT = os.environ.get("STOK_MUTABAKAT_OTOMATIK_DUZELT", "false").lower() == "true"
+STOK_MUTABAKAT_SAKLANAN_CALISMA = 50
+_stok_mutabakat_kilidi = asyncio.Lock()
+
+# Önbellek adı → (kayit_id, kayitli, beklenen) döndüren sorgu (ya da aynı biçimde satır döndüren fonksiyon)
+STOK_MUTABAKAT_KONTROLLERI = {
+    "bims_stok": """
+        SELECT u.id, COALESCE(u.mevcut_stok, 0), COALESCE(h.toplam, 0)
+        FROM bims_stok_urunler u
+        LEFT JOIN (
+            SELECT urun_id, SUM(CASE WHEN hareket_tipi IN ('giris', 'acilis') THEN miktar ELSE -miktar END) AS toplam
+            FROM bims_stok_hareketler GROUP BY urun_id
+        ) h ON h.urun_id = u.id""",
+    "cimento_stok": """
+        SELECT i.id, COALESCE(i.mevcut_stok_kg, 0),
+               COALESCE(i.acilis_stok_kg, 0) + COALESCE(g.kg, 0) - COALESCE(p.kg, 0)
+        FROM cimento_isletmeler i
+        LEFT JOIN (
+            SELECT k.id, SUM(g.giris_miktari * 1000) AS kg FROM cimento_giris g
+            JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) k ON k.name = g.bosaltim_isletmesi
+            GROUP BY k.id
+        ) g ON g.id = i.id
+        LEFT JOIN (
+            SELECT k.id, SUM(p.machine_cement) AS kg FROM production_records p
+            JOIN (SELECT name, MIN(id) AS id FROM cimento_isletmeler GROUP BY name) k ON k.name = p.department_name
+            GROUP BY k.id
+        ) p ON p.id = i.id""",
+    "motorin_stok": """
+        WITH t AS (SELECT (SELECT COALESCE(SUM(acilis_litre), 0) FROM motorin_acilis) AS acilis,
+                          (SELECT COALESCE(SUM(miktar_litre), 0) FROM motorin_alimlar) AS alim,
+                          (SELECT COALESCE(SUM(miktar_litre), 0) FROM motorin_verme) AS verme),
+             m AS (SELECT * FROM motorin_stok ORDER BY id LIMIT 1)
+        SELECT 'toplam_alim', COALESCE((SELECT toplam_alim FROM m), 0), alim FROM t
+        UNION ALL SELECT 'toplam_verme', COALESCE((SELECT toplam_verme FROM m), 0), verme FROM t
+        UNION ALL SELECT 'mevcut_stok', COALESCE((SELECT mevcut_stok FROM m), 0), acilis + alim - verme FROM t""",
+    "motorin_tank_stok": """
+        SELECT tesis, SUM(kayitli), SUM(beklenen) FROM (
+            SELECT tesis, mevcut_stok AS kayitli, 0 AS beklenen FROM motorin_tank_stok
+            UNION ALL SELECT COALESCE(bosaltim_tesisi, ''), 0, COALESCE(acilis_litre, 0) FROM motorin_acilis
+            UNION ALL SELECT COALESCE(bosaltim_tesisi, ''), 0, COALESCE(miktar_litre, 0) FROM motorin_alimlar
+            UNION ALL SELECT COALESCE(bosaltim_tesisi, ''), 0, -COALESCE(miktar_litre, 0) FROM motorin_verme
+        ) GROUP BY tesis""",
+    "kalan_izin": """
+        SELECT p.id, COALESCE(p.kalan_izin, 0), COALESCE(NULLIF(p.yillik_izin_hakki, 0), 14) - COALESCE(i.gun, 0)
+        FROM personeller p
+        LEFT JOIN (
+            SELECT personel_id, SUM(gun_sayisi) AS gun FROM izinler
+            WHERE izin_turu = 'Yıllık' AND durum = 'Onaylandı' GROUP BY personel_id
+        ) i ON i.personel_id = p.id""",
+}
+
+async def _saha_cikan_kontrol(db) -> list:
+    beklenen = await saha_cikan_beklenen(db)
+    async with db.execute("SELECT stok_id, toplam FROM bims_saha_cikan") as cursor:
+        sayaclar = {r[0]: r[1] for r in await cursor.fetchall()}
+    return [(k, sayaclar.get(k, 0), beklenen.get(k, 0)) for k in sorted(set(beklenen) | set(sayaclar))]
+
+STOK_MUTABAKAT_KONTROLLERI["bims_saha_cikan"] = _saha_cikan_kontrol
+
+async def _bims_stok_duzelt(kayit_idler: list):
+    db = await get_db()
+    try:
+        await yazma_baslat(db)
+        await db.execute(
+            f"""UPDATE bims_stok_urunler SET mevcut_stok = COALESCE((
+                    SELECT SUM(CASE WHEN h.hareket_tipi IN ('giris', 'acilis') THEN h.miktar ELSE -h.miktar END)
+                    FROM bims_stok_hareketler h WHERE h.urun_id = bims_stok_urunler.id), 0)
+                WHERE id IN ({','.join('?' * len(kayit_idler))})""",
+            kayit_idler,
+        )
+        await db.commit()
+    finally:
+        await db.close()
+
+async def _kalan_izin_duzelt(kayit_idler: list):
+    db = await get_db()
+    try:
+        await yazma_baslat(db)
+        await db.execute(
+            f"""UPDATE personeller SET kullanilan_izin = i.gun, kalan_izin = COALESCE(NULLIF(yillik_izin_hakki, 0), 14) - i.gun
+                FROM (
+                    SELECT p.id, COALESCE(SUM(z.gun_sayisi), 0) AS gun FROM personeller p
+                    LEFT JOIN izinler z ON z.personel_id = p.id AND z.izin_turu = 'Yıllık' AND z.durum = 'Onaylandı'
+                    GROUP BY p.id
+                ) AS i
+                WHERE personeller.id = i.id AND personeller.id IN ({','.join('?' * len(kayit_idler))})""",
+            kayit_idler,
+        )
+        await db.commit()
+    finally:
+        await db.close()
+
+# Önbellek adı → sapan kayıtları kaynaktan yeniden hesaplayan düzeltici (defterli önbellekler defteri yeniden kurar)
+STOK_MUTABAKAT_DUZELTICILERI = {
+    "bims_stok": _bims_stok_duzelt,
+    "cimento_stok": lambda kayit_idler: cimento_stok_defter_yeniden_kur(),
+    "motorin_stok": lambda kayit_idler: motorin_stok_mutabakat(duzelt=True),
+    "motorin_tank_stok": lambda kayit_idler: motorin_tank_yeniden_kur(),
+    "kalan_izin": _kalan_izin_duzelt,
+    "bims_saha_cikan": lambda kayit_idler: saha_cikan_mutabakat(duzelt=True),
+}
+
+async def stok_mutabakati_calistir(duzelt: bool = False, tetikleyen: str = "zamanlayici") -> dict:
+    """Recompute every stock cache from its source rows, record the drift report and optionally fix it."""
+    async with _stok_mutabakat_kilidi:
+        calisma = {
+            "id": generate_id(), "baslangic": datetime.now(timezone.utc).isoformat(), "bitis": None,
+            "tetikleyen": tetikleyen, "otomatik_duzelt": duzelt, "kontrol_edilen": 0, "sapma_sayisi": 0, "hata": "",
+        }
+        sapmalar = []
+        db = await get_db_salt_okunur()
+        try:
+            for onbellek, kontrol in STOK_MUTABAKAT_KONTROLLERI.items():
+                if isinstance(kontrol, str):
+                    async with db.execute(kontrol) as cursor:
+                        satirlar = await cursor.fetchall()
+                else:
+                    satirlar = await kontrol(db)
+                calisma["kontrol_edilen"] += len(satirlar)
+                for kayit_id, kayitli, beklenen in satirlar:
+                    if abs((kayitli or 0) - (beklenen or 0)) > 1e-6:
+                        sapmalar.append({
+                            "onbellek": onbellek, "kayit_id": kayit_id, "kayitli": kayitli, "beklenen": beklenen,
+                            "fark": (kayitli or 0) - (beklenen or 0), "duzeltildi": False,
+                        })
+        except Exception as e:
+            logger.exception("Stok mutabakatı kontrolü başarısız: %s", e)
+            calisma["hata"] = str(e)
+        finally:
+            await db.close()
+
+        if duzelt and not calisma["hata"]:
+            for onbellek in dict.fromkeys(s["onbellek"] for s in sapmalar):
+                ilgili = [s for s in sapmalar if s["onbellek"] == onbellek]
+                try:
+                    await STOK_MUTABAKAT_DUZELTICILERI[onbellek]([s["kayit_id"] for s in ilgili])
+                    for s in ilgili:
+                        s["duzeltildi"] = True
+                except Exception as e:
+                    logger.exception("Stok önbelleği düzeltilemedi (%s): %s", onbellek, e)
+                    calisma["hata"] = f"{onbellek}: {e}"
+
+        calisma["bitis"] = datetime.now(timezone.utc).isoformat()
+        calisma["sapma_sayisi"] = len(sapmalar)
+        if sapmalar:
+            logger.warning("Stok mutabakatı %d sapma buldu (düzeltme=%s): %s", len(sapmalar), duzelt,
+                           sorted({s["onbellek"] for s in sapmalar}))
+
+        db = await get_db()
+        try:
+            await db.execute(
+                """INSERT INTO stok_mutabakat_calismalari (id, baslangic, bitis, tetikleyen, otomatik_duzelt,
+                   kontrol_edilen, sapma_sayisi, hata) VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (calisma["id"], calisma["baslangic"], calisma["bitis"], tetikleyen, 1 if duzelt else 0,
+                 calisma["kontrol_edilen"], calisma["sapma_sayisi"], calisma["hata"]),
+            )
+            await db.executemany(
+                """INSERT INTO stok_mutabakat_sapmalari (calisma_id, onbellek, kayit_id, kayitli, beklenen, fark, duzeltildi)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                [(calisma["id"], s["onbellek"], s["kayit_id"], s["kayitli"], s["beklenen"], s["fark"],
+                  1 if s["duzeltildi"] else 0) for s in sapmalar],
+            )
+            # Yalnızca son N çalışmanın raporu saklanır
+            await db.execute(
+                """DELETE FROM stok_mutabakat_calismalari WHERE id NOT IN (
+                       SELECT id FROM stok_mutabakat_calismalari ORDER BY baslangic DESC LIMIT ?)""",
+                (STOK_MUTABAKAT_SAKLANAN_CALISMA,),
+            )
+            await db.execute(
+                "DELETE FROM stok_mutabakat_sapmalari WHERE calisma_id NOT IN (SELECT id FROM stok_mutabakat_calismalari)"
+            )
+            await db.commit()
+        finally:
+            await db.close()
+        return {**calisma, "sapmalar": sapmalar}
+
+async def stok_mutabakat_durumu(onbellek: Optional[str] = None, gecmis: int = 10) -> dict:
+    """Latest reconcile run with its drift rows (optionally for one cache) plus recent run history."""
+    db = await get_db()
+    try:
+        async with db.execute(
+            "SELECT * FROM stok_mutabakat_calismalari ORDER BY baslangic DESC LIMIT ?", (max(gecmis, 1),)
+        ) as cursor:
+            calismalar = rows_to_list(await cursor.fetchall())
+        sapmalar = []
+        if calismalar:
+            query = "SELECT onbellek, kayit_id, kayitli, beklenen, fark, duzeltildi FROM stok_mutabakat_sapmalari WHERE calisma_id = ?"
+            params = [calismalar[0]["id"]]
+            if onbellek:
+                query += " AND onbellek = ?"
+                params.append(onbellek)
+            async with db.execute(query + " ORDER BY onbellek, kayit_id", params) as cursor:
+                sapmalar = rows_to_list(await cursor.fetchall())
+    finally:
+        await db.close()
+    return {
+        "aralik_saniye": STOK_MUTABAKAT_SANIYE,
+        "otomatik_duzelt": STOK_MUTABAKAT_OTOMATIK_DUZELT,
+        "calisiyor": _stok_mutabakat_kilidi.locked(),
+        "son_calisma": calismalar[0] if calismalar else None,
+        "sapmalar": sapmalar,
+        "gecmis": calismalar,
+    }
+
+async def stok_mutabakat_dongusu():
+    """Background loop: reconcile all stock caches every STOK_MUTABAKAT_SANIYE seconds."""
+    while True:
+        await asyncio.sleep(STOK_MUTABAKAT_SANIYE)
+        try:
+            await stok_mutabakati_calistir(STOK_MUTABAKAT_OTOMATIK_DUZELT)
+        except Exception as e:
+            logger.exception("Stok mutabakatı başarısız: %s", e)
+
+@api_router.get("/admin/reconcile/status")
+async def stok_mutabakat_status(onbellek: Optional[str] = None, gecmis: int = 10,
+                                current_user: dict = Depends(require_admin)):
+    """Son stok mutabakatının sapma raporu ve geçmiş çalışmalar."""
+    return await stok_mutabakat_durumu(onbellek, gecmis)
+
+@api_router.post("/admin/reconcile/run")
+async def stok_mutabakat_run(duzelt: bool = False, current_user: dict = Depends(require_admin)):
+    """Stok mutabakatını hemen çalıştırır; `duzelt=true` ise sapan önbellekleri kaynaktan düzeltir."""
+    return await stok_mutabakati_calistir(duzelt, tetikleyen=current_user.get("email", "admin"))
+
 # ============ Production Routes ============
 
 @api_router.post("/production", response_model=ProductionRecordResponse)
@@ -3069,6 +4041,8 @@ async def create_production_record(record: ProductionRecordCreate, current_user:
          record.cikan_paket_1, record.cikan_paket_2, record.cikan_paket_3, record.cikan_paket_4, record.cikan_paket_5,
          record.toplam_7_boy, record.toplam_5_boy, record.photo_url)
     )
+    await saha_cikan_uygula(db, None, record.model_dump())
+    await cimento_defter_esitle(db, "production", record_id)
     await db.commit()
     
     async with db.execute("SELECT * FROM production_records WHERE id = ?", (record_id,)) as cursor:
@@ -3118,8 +4092,9 @@ async def get_production_record(record_id: str, current_user: dict = Depends(get
 @api_router.put("/production/{record_id}", response_model=ProductionRecordResponse)
 async def update_production_record(record_id: str, update_data: ProductionRecordUpdate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
-    async with db.execute("SELECT id FROM production_records WHERE id = ?", (record_id,)) as cursor:
+    async with db.execute("SELECT * FROM production_records WHERE id = ?", (record_id,)) as cursor:
         existing = await cursor.fetchone()
     if not existing:
         await db.close()
@@ -3137,6 +4112,10 @@ async def update_production_record(record_id: str, update_data: ProductionRecord
         params.append(datetime.now(timezone.utc).isoformat())
         params.append(record_id)
         await db.execute(f"UPDATE production_records SET {', '.join(updates)} WHERE id = ?", params)
+        async with db.execute("SELECT * FROM production_records WHERE id = ?", (record_id,)) as cursor:
+            updated = await cursor.fetchone()
+        await saha_cikan_uygula(db, row_to_dict(existing), row_to_dict(updated))
+        await cimento_defter_esitle(db, "production", record_id)
         await db.commit()
     
     async with db.execute("SELECT * FROM production_records WHERE id = ?", (record_id,)) as cursor:
@@ -3148,7 +4127,13 @@ async def update_production_record(record_id: str, update_data: ProductionRecord
 @api_router.delete("/production/{record_id}")
 async def delete_production_record(record_id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
+    async with db.execute("SELECT * FROM production_records WHERE id = ?", (record_id,)) as cursor:
+        existing = await cursor.fetchone()
     cursor = await db.execute("DELETE FROM production_records WHERE id = ?", (record_id,))
+    if existing:
+        await saha_cikan_uygula(db, row_to_dict(existing), None)
+        await cimento_defter_esitle(db, "production", record_id)
     await db.commit()
     await db.close()
     
@@ -3253,13 +4238,15 @@ async def get_monthly_report(year: int, month: int, module: Optional[str] = None
     if year < 2000 or year > 2100:
         raise HTTPException(status_code=400, detail="Geçersiz yıl")
 
-    start_date = f"{year:04d}-{month:02d}-01"
-    # ay sonu
-    if month == 12:
-        next_y, next_m = year + 1, 1
-    else:
-        next_y, next_m = year, month + 1
-    end_date = f"{next_y:04d}-{next_m:02d}-01"
+    # Kapatılmış ve bayatlamamış dönem anlık görüntüden döner
+    snapshot = await donem_snapshot_getir(year, month, module)
+    if snapshot is not None:
+        return snapshot
+    return await aylik_rapor_hesapla(year, month, module)
+
+async def aylik_rapor_hesapla(year: int, month: int, module: Optional[str] = None) -> dict:
+    """Compute the monthly production report from raw production records."""
+    start_date, end_date = donem_araligi(year, month)
 
     db = await get_db()
     query = "SELECT * FROM production_records WHERE 1=1"
@@ -3413,8 +4400,14 @@ async def get_yearly_report(year: int, module: Optional[str] = None,
     if year < 2000 or year > 2100:
         raise HTTPException(status_code=400, detail="Geçersiz yıl")
 
-    start_date = f"{year:04d}-01-01"
-    end_date = f"{year + 1:04d}-01-01"
+    snapshot = await donem_snapshot_getir(year, 0, module)
+    if snapshot is not None:
+        return snapshot
+    return await yillik_rapor_hesapla(year, module)
+
+async def yillik_rapor_hesapla(year: int, module: Optional[str] = None) -> dict:
+    """Compute the yearly production report (12 monthly buckets) from raw records."""
+    start_date, end_date = donem_araligi(year, 0)
 
     db = await get_db()
     query = "SELECT * FROM production_records WHERE 1=1"
@@ -3473,23 +4466,150 @@ async def get_yearly_report(year: int, module: Optional[str] = None,
         harcanan = mix * cmix
         mk = r.get("machine_cement", 0) or 0
 
-        months[month_idx]["total_quantity"] += qty
-        months[month_idx]["total_net_pallets"] += net_pal
-        months[month_idx]["total_records"] += 1
-        months[month_idx]["total_cement_used"] += harcanan
-        months[month_idx]["total_machine_cement"] += mk
+        months[month_idx]["total_quantity"] += qty
+        months[month_idx]["total_net_pallets"] += net_pal
+        months[month_idx]["total_records"] += 1
+        months[month_idx]["total_cement_used"] += harcanan
+        months[month_idx]["total_machine_cement"] += mk
+
+        totals["total_quantity"] += qty
+        totals["total_net_pallets"] += net_pal
+        totals["total_records"] += 1
+        totals["total_cement_used"] += harcanan
+        totals["total_machine_cement"] += mk
+
+    return {
+        "year": year,
+        "months": months,
+        "totals": totals,
+    }
+
+# ============ Dönem Kapanışı (Month-end Snapshots) ============
+class DonemKapanisInput(BaseModel):
+    yil: int
+    ay: Optional[int] = None  # boş → yıllık kapanış
+    module: Optional[str] = None
+
+def donem_araligi(yil: int, ay: int) -> tuple:
+    """Return [start, end) ISO dates for a month, or for the whole year when ay == 0."""
+    if ay == 0:
+        return f"{yil:04d}-01-01", f"{yil + 1:04d}-01-01"
+    if ay == 12:
+        return f"{yil:04d}-12-01", f"{yil + 1:04d}-01-01"
+    return f"{yil:04d}-{ay:02d}-01", f"{yil:04d}-{ay + 1:02d}-01"
+
+async def donem_snapshot_getir(yil: int, ay: int, module: Optional[str]) -> Optional[dict]:
+    """Frozen report payload of a closed, non-stale period; None means compute live."""
+    db = await get_db()
+    async with db.execute(
+        "SELECT rapor_json FROM donem_kapanislari WHERE yil = ? AND ay = ? AND module = ? AND bayat = 0",
+        (yil, ay, module or ''),
+    ) as cursor:
+        row = await cursor.fetchone()
+    await db.close()
+    return json.loads(row[0]) if row else None
+
+async def donem_stok_pozisyonlari(bitis: str) -> list:
+    """Per-product BIMS stock position from movements dated before `bitis`."""
+    db = await get_db()
+    async with db.execute(
+        """SELECT u.id AS urun_id, u.urun_adi,
+                  COALESCE(SUM(CASE WHEN h.hareket_tipi IN ('giris', 'acilis') THEN h.miktar ELSE 0 END), 0) AS giris,
+                  COALESCE(SUM(CASE WHEN h.hareket_tipi IN ('giris', 'acilis') THEN 0 ELSE h.miktar END), 0) AS cikis
+           FROM bims_stok_urunler u
+           LEFT JOIN bims_stok_hareketler h ON h.urun_id = u.id AND h.tarih < ?
+           GROUP BY u.id, u.urun_adi
+           ORDER BY u.urun_adi""",
+        (bitis,),
+    ) as cursor:
+        rows = await cursor.fetchall()
+    await db.close()
+    pozisyonlar = rows_to_list(rows)
+    for p in pozisyonlar:
+        p["stok"] = p["giris"] - p["cikis"]
+    return pozisyonlar
+
+def _donem_ozet(row: dict) -> dict:
+    return {k: row[k] for k in ("id", "yil", "ay", "module", "baslangic", "bitis", "bayat", "kapatan", "created_at")}
+
+@api_router.post("/donem-kapanis")
+async def donem_kapat(input: DonemKapanisInput, current_user: dict = Depends(require_admin)):
+    """
+    Ayı (veya ay boşsa yılı) kapatır: aylık/yıllık rapor ve ürün bazlı stok
+    pozisyonları anlık görüntü olarak saklanır. Tekrar çağrılırsa (ör. bayat
+    dönem) görüntü yeniden hesaplanır.
+    """
+    ay = input.ay or 0
+    if ay < 0 or ay > 12:
+        raise HTTPException(status_code=400, detail="Geçersiz ay")
+    if input.yil < 2000 or input.yil > 2100:
+        raise HTTPException(status_code=400, detail="Geçersiz yıl")
+    baslangic, bitis = donem_araligi(input.yil, ay)
+    if bitis > datetime.now().strftime('%Y-%m-%d'):
+        raise HTTPException(status_code=400, detail="Henüz bitmemiş dönem kapatılamaz")
+
+    if ay:
+        rapor = await aylik_rapor_hesapla(input.yil, ay, input.module)
+    else:
+        rapor = await yillik_rapor_hesapla(input.yil, input.module)
+    stok = await donem_stok_pozisyonlari(bitis)
 
-        totals["total_quantity"] += qty
-        totals["total_net_pallets"] += net_pal
-        totals["total_records"] += 1
-        totals["total_cement_used"] += harcanan
-        totals["total_machine_cement"] += mk
+    db = await get_db()
+    await db.execute(
+        """INSERT INTO donem_kapanislari (id, yil, ay, module, baslangic, bitis, rapor_json, stok_json, bayat, kapatan, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+           ON CONFLICT (yil, ay, module) DO UPDATE SET
+               rapor_json = excluded.rapor_json, stok_json = excluded.stok_json, bayat = 0,
+               kapatan = excluded.kapatan, created_at = excluded.created_at""",
+        (generate_id(), input.yil, ay, input.module or '', baslangic, bitis,
+         json.dumps(rapor, ensure_ascii=False), json.dumps(stok, ensure_ascii=False),
+         current_user.get("name", ""), datetime.now(timezone.utc).isoformat()),
+    )
+    await db.commit()
+    async with db.execute(
+        "SELECT * FROM donem_kapanislari WHERE yil = ? AND ay = ? AND module = ?",
+        (input.yil, ay, input.module or ''),
+    ) as cursor:
+        row = await cursor.fetchone()
+    await db.close()
+    return _donem_ozet(row_to_dict(row))
 
-    return {
-        "year": year,
-        "months": months,
-        "totals": totals,
-    }
+@api_router.get("/donem-kapanis")
+async def get_donem_kapanislari(current_user: dict = Depends(get_current_user)):
+    """Kapatılmış dönemler; `bayat: 1` olanlar kapanıştan sonra değişmiştir ve yeniden kapatılmalıdır."""
+    db = await get_db()
+    async with db.execute(
+        """SELECT id, yil, ay, module, baslangic, bitis, bayat, kapatan, created_at
+           FROM donem_kapanislari ORDER BY yil DESC, ay DESC"""
+    ) as cursor:
+        rows = await cursor.fetchall()
+    await db.close()
+    return rows_to_list(rows)
+
+@api_router.get("/donem-kapanis/{id}")
+async def get_donem_kapanis(id: str, current_user: dict = Depends(get_current_user)):
+    db = await get_db()
+    async with db.execute("SELECT * FROM donem_kapanislari WHERE id = ?", (id,)) as cursor:
+        row = await cursor.fetchone()
+    await db.close()
+    if not row:
+        raise HTTPException(status_code=404, detail="Dönem kapanışı bulunamadı")
+    kapanis = row_to_dict(row)
+    result = _donem_ozet(kapanis)
+    result["rapor"] = json.loads(kapanis["rapor_json"])
+    result["stok"] = json.loads(kapanis["stok_json"])
+    return result
+
+@api_router.delete("/donem-kapanis/{id}")
+async def donem_ac(id: str, current_user: dict = Depends(require_admin)):
+    """Dönemi yeniden açar; raporlar tekrar ham kayıtlardan hesaplanır."""
+    db = await get_db()
+    cursor = await db.execute("DELETE FROM donem_kapanislari WHERE id = ?", (id,))
+    await db.commit()
+    await db.close()
+    if cursor.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Dönem kapanışı bulunamadı")
+    return {"message": "Dönem yeniden açıldı"}
 
 @api_router.get("/reports/product-based")
 async def get_product_based_report(module: Optional[str] = None,
@@ -3806,6 +4926,7 @@ async def create_cimento_giris(input: CimentoGirisCreate, current_user: dict = D
          data['urun_nakliye_tevkifat_toplam'], data['urun_nakliye_genel_toplam'], created_at, created_at,
          current_user['id'], current_user['name'])
     )
+    await cimento_defter_esitle(db, "cimento_giris", giris_id)
     await db.commit()
     
     async with db.execute("SELECT * FROM cimento_giris WHERE id = ?", (giris_id,)) as cursor:
@@ -3814,17 +4935,114 @@ async def create_cimento_giris(input: CimentoGirisCreate, current_user: dict = D
     
     return row_to_dict(row)
 
+# ----- Sunucu tarafı filtre / sıralama / sayfalama -----
+# Tarih filtresi boşaltım tarihine göredir (rapor ekranındaki gibi); eşitlik filtreleri indekslidir.
+CIMENTO_GIRIS_FILTRELERI = {
+    "firma": "cimento_alinan_firma", "isletme": "bosaltim_isletmesi", "plaka": "plaka", "fatura_no": "fatura_no",
+}
+CIMENTO_GIRIS_SIRALANABILIR = {
+    "created_at", "bosaltim_tarihi", "yukleme_tarihi", "vade_tarihi", "irsaliye_no", "fatura_no", "plaka",
+    "cimento_alinan_firma", "bosaltim_isletmesi", "giris_miktari", "kantar_kg_miktari", "giris_kdv_dahil_toplam",
+    "urun_nakliye_genel_toplam",
+}
+# Toplam adı → kolon (/cimento-giris-ozet ve sayfalı listenin toplamları)
+CIMENTO_GIRIS_TOPLAMLARI = {
+    "toplam_giris_miktari": "giris_miktari",
+    "toplam_kantar_kg": "kantar_kg_miktari",
+    "toplam_fark": "aradaki_fark",
+    "toplam_giris_tutari": "giris_tutari",
+    "toplam_giris_kdv": "giris_kdv_tutari",
+    "toplam_giris_kdv_dahil": "giris_kdv_dahil_toplam",
+    "toplam_nakliye_matrah": "nakliye_matrahi",
+    "toplam_nakliye_kdv": "nakliye_kdv_tutari",
+    "toplam_nakliye_genel": "nakliye_genel_toplam",
+    "toplam_urun_nakliye_matrah": "urun_nakliye_matrah",
+    "toplam_urun_nakliye_kdv": "urun_nakliye_kdv_toplam",
+    "toplam_urun_nakliye_tevkifat": "urun_nakliye_tevkifat_toplam",
+    "toplam_urun_nakliye_genel": "urun_nakliye_genel_toplam",
+}
+
+def cimento_giris_filtresi(baslangic_tarihi: Optional[str] = None, bitis_tarihi: Optional[str] = None,
+                           **esitlikler: Optional[str]) -> tuple:
+    """WHERE clause and params for the delivery list / summary filters."""
+    kosullar, params = [], []
+    if baslangic_tarihi:
+        kosullar.append("bosaltim_tarihi >= ?")
+        params.append(baslangic_tarihi)
+    if bitis_tarihi:
+        kosullar.append("bosaltim_tarihi <= ?")
+        params.append(bitis_tarihi)
+    for ad, deger in esitlikler.items():
+        if deger:
+            kosullar.append(f"{CIMENTO_GIRIS_FILTRELERI[ad]} = ?")
+            params.append(deger)
+    return (" WHERE " + " AND ".join(kosullar)) if kosullar else "", params
+
+def cimento_giris_siralama(sirala: str) -> str:
+    """ORDER BY for `?sirala=kolon` (ascending) or `?sirala=-kolon` (descending); id keeps pages stable."""
+    kolon = sirala.lstrip("-")
+    if kolon not in CIMENTO_GIRIS_SIRALANABILIR:
+        raise HTTPException(status_code=400, detail=f"Geçersiz sıralama alanı: {kolon}")
+    yon = "DESC" if sirala.startswith("-") else "ASC"
+    return f"{kolon} {yon}, id {yon}"
+
 @api_router.get("/cimento-giris")
-async def get_cimento_giris(current_user: dict = Depends(get_current_user)):
+async def get_cimento_giris(fields: Optional[str] = None, baslangic_tarihi: Optional[str] = None,
+                            bitis_tarihi: Optional[str] = None, firma: Optional[str] = None,
+                            isletme: Optional[str] = None, plaka: Optional[str] = None,
+                            fatura_no: Optional[str] = None, sirala: str = "-created_at",
+                            skip: int = 0, limit: Optional[int] = None,
+                            current_user: dict = Depends(get_current_user)):
+    """
+    Çimento girişleri. Filtreler: boşaltım tarihi aralığı, firma, işletme, plaka, fatura no.
+    `limit` verilmezse filtrelenmiş liste dizi olarak akıtılır; verilirse sayfa ile birlikte
+    filtrelenmiş kümenin kayıt sayısı ve toplamları aynı sorguda (pencere fonksiyonları) döner.
+    """
+    secim = await secim_listesi("cimento_giris", fields)
+    where, params = cimento_giris_filtresi(baslangic_tarihi, bitis_tarihi, firma=firma, isletme=isletme,
+                                           plaka=plaka, fatura_no=fatura_no)
+    siralama = cimento_giris_siralama(sirala)
+    if limit is None:
+        return stream_json_rows(f"SELECT {secim} FROM cimento_giris{where} ORDER BY {siralama}", params)
+    if limit < 1 or skip < 0:
+        raise HTTPException(status_code=400, detail="Geçersiz sayfalama parametresi")
+
+    pencereler = ", ".join(
+        f"COALESCE(SUM({kolon}) OVER (), 0) AS _{ad}" for ad, kolon in CIMENTO_GIRIS_TOPLAMLARI.items()
+    )
     db = await get_db()
-    async with db.execute("SELECT * FROM cimento_giris ORDER BY created_at DESC") as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    return rows_to_list(rows)
+    try:
+        async with db.execute(
+            f"""SELECT {secim}, COUNT(*) OVER () AS _kayit_sayisi, {pencereler}
+                FROM cimento_giris{where} ORDER BY {siralama} LIMIT ? OFFSET ?""",
+            params + [limit, skip]
+        ) as cursor:
+            rows = rows_to_list(await cursor.fetchall())
+        if rows:
+            kayit_sayisi = rows[0]["_kayit_sayisi"]
+            toplamlar = {ad: rows[0][f"_{ad}"] for ad in CIMENTO_GIRIS_TOPLAMLARI}
+        else:
+            # Sayfa kümenin dışına düştüyse toplamlar ayrıca hesaplanır
+            ozet = await cimento_giris_toplamlari(db, where, params)
+            kayit_sayisi = ozet.pop("kayit_sayisi")
+            toplamlar = ozet
+    finally:
+        await db.close()
+    kayitlar = [{k: v for k, v in r.items() if not k.startswith("_")} for r in rows]
+    return {"kayitlar": kayitlar, "kayit_sayisi": kayit_sayisi, "toplamlar": toplamlar, "skip": skip, "limit": limit}
+
+async def cimento_giris_toplamlari(db, where: str = "", params: Optional[list] = None) -> dict:
+    """Record count and column totals of the (filtered) deliveries in one aggregate query."""
+    toplamlar = ", ".join(f"COALESCE(SUM({kolon}), 0) AS {ad}" for ad, kolon in CIMENTO_GIRIS_TOPLAMLARI.items())
+    async with db.execute(
+        f"SELECT COUNT(*) AS kayit_sayisi, {toplamlar} FROM cimento_giris{where}", params or []
+    ) as cursor:
+        return row_to_dict(await cursor.fetchone())
 
 @api_router.put("/cimento-giris/{id}")
 async def update_cimento_giris(id: str, input: CimentoGirisUpdate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     
     async with db.execute("SELECT * FROM cimento_giris WHERE id = ?", (id,)) as cursor:
         existing_row = await cursor.fetchone()
@@ -3858,6 +5076,7 @@ async def update_cimento_giris(id: str, input: CimentoGirisUpdate, current_user:
          existing['nakliye_genel_toplam'], existing['urun_nakliye_matrah'], existing['urun_nakliye_kdv_toplam'],
          existing['urun_nakliye_tevkifat_toplam'], existing['urun_nakliye_genel_toplam'], existing['updated_at'], id)
     )
+    await cimento_defter_esitle(db, "cimento_giris", id)
     await db.commit()
     await db.close()
     
@@ -3867,6 +5086,7 @@ async def update_cimento_giris(id: str, input: CimentoGirisUpdate, current_user:
 async def delete_cimento_giris(id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
     cursor = await db.execute("DELETE FROM cimento_giris WHERE id = ?", (id,))
+    await cimento_defter_esitle(db, "cimento_giris", id)
     await db.commit()
     await db.close()
     if cursor.rowcount == 0:
@@ -3874,29 +5094,17 @@ async def delete_cimento_giris(id: str, current_user: dict = Depends(get_current
     return {"message": "Kayıt silindi"}
 
 @api_router.get("/cimento-giris-ozet")
-async def get_cimento_giris_ozet(current_user: dict = Depends(get_current_user)):
+async def get_cimento_giris_ozet(baslangic_tarihi: Optional[str] = None, bitis_tarihi: Optional[str] = None,
+                                 firma: Optional[str] = None, isletme: Optional[str] = None,
+                                 plaka: Optional[str] = None, fatura_no: Optional[str] = None,
+                                 current_user: dict = Depends(get_current_user)):
+    where, params = cimento_giris_filtresi(baslangic_tarihi, bitis_tarihi, firma=firma, isletme=isletme,
+                                           plaka=plaka, fatura_no=fatura_no)
     db = await get_db()
-    async with db.execute("SELECT * FROM cimento_giris") as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    
-    records = rows_to_list(rows)
-    return {
-        "kayit_sayisi": len(records),
-        "toplam_giris_miktari": sum(r.get('giris_miktari', 0) or 0 for r in records),
-        "toplam_kantar_kg": sum(r.get('kantar_kg_miktari', 0) or 0 for r in records),
-        "toplam_fark": sum(r.get('aradaki_fark', 0) or 0 for r in records),
-        "toplam_giris_tutari": sum(r.get('giris_tutari', 0) or 0 for r in records),
-        "toplam_giris_kdv": sum(r.get('giris_kdv_tutari', 0) or 0 for r in records),
-        "toplam_giris_kdv_dahil": sum(r.get('giris_kdv_dahil_toplam', 0) or 0 for r in records),
-        "toplam_nakliye_matrah": sum(r.get('nakliye_matrahi', 0) or 0 for r in records),
-        "toplam_nakliye_kdv": sum(r.get('nakliye_kdv_tutari', 0) or 0 for r in records),
-        "toplam_nakliye_genel": sum(r.get('nakliye_genel_toplam', 0) or 0 for r in records),
-        "toplam_urun_nakliye_matrah": sum(r.get('urun_nakliye_matrah', 0) or 0 for r in records),
-        "toplam_urun_nakliye_kdv": sum(r.get('urun_nakliye_kdv_toplam', 0) or 0 for r in records),
-        "toplam_urun_nakliye_tevkifat": sum(r.get('urun_nakliye_tevkifat_toplam', 0) or 0 for r in records),
-        "toplam_urun_nakliye_genel": sum(r.get('urun_nakliye_genel_toplam', 0) or 0 for r in records)
-    }
+    try:
+        return await cimento_giris_toplamlari(db, where, params)
+    finally:
+        await db.close()
 
 # ============ PERSONEL MODÜLÜ API'LERİ ============
 
@@ -4065,9 +5273,10 @@ async def create_personel(input: PersonelCreate, current_user: dict = Depends(ge
     return row_to_dict(row)
 
 @api_router.get("/personeller")
-async def get_personeller(current_user: dict = Depends(get_current_user)):
+async def get_personeller(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    secim = await secim_listesi("personeller", fields)
     db = await get_db()
-    async with db.execute("SELECT * FROM personeller ORDER BY ad_soyad") as cursor:
+    async with db.execute(f"SELECT {secim} FROM personeller ORDER BY ad_soyad") as cursor:
         rows = await cursor.fetchall()
     await db.close()
     return rows_to_list(rows)
@@ -4461,7 +5670,6 @@ async def create_puantaj(input: PuantajCreate, current_user: dict = Depends(get_
 @api_router.get("/puantaj")
 async def get_puantaj(personel_id: Optional[str] = None, tarih_baslangic: Optional[str] = None,
                       tarih_bitis: Optional[str] = None, current_user: dict = Depends(get_current_user)):
-    db = await get_db()
     query = "SELECT * FROM puantaj WHERE 1=1"
     params = []
     
@@ -4473,11 +5681,7 @@ async def get_puantaj(personel_id: Optional[str] = None, tarih_baslangic: Option
         params.extend([tarih_baslangic, tarih_bitis])
     
     query += " ORDER BY tarih DESC"
-    
-    async with db.execute(query, params) as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    return rows_to_list(rows)
+    return stream_json_rows(query, params)
 
 @api_router.delete("/puantaj/{id}")
 async def delete_puantaj(id: str, current_user: dict = Depends(get_current_user)):
@@ -5148,26 +6352,17 @@ async def get_personel_ozet(current_user: dict = Depends(get_current_user)):
     db = await get_db()
     today = datetime.now().strftime("%Y-%m-%d")
     
-    async with db.execute("SELECT * FROM personeller WHERE aktif = 1") as cursor:
-        personeller_rows = await cursor.fetchall()
-    
-    async with db.execute("SELECT * FROM puantaj WHERE tarih = ?", (today,)) as cursor:
-        puantaj_rows = await cursor.fetchall()
-    
-    async with db.execute("SELECT * FROM izinler WHERE durum = 'Beklemede'") as cursor:
-        izinler_rows = await cursor.fetchall()
-    
+    async with db.execute(
+        """SELECT COUNT(*) AS toplam_personel,
+                  (SELECT COUNT(*) FROM puantaj WHERE tarih = ?) AS bugun_giris_yapan,
+                  (SELECT COUNT(*) FROM izinler WHERE durum = 'Beklemede') AS bekleyen_izin_talepleri,
+                  COALESCE(SUM(maas), 0) AS toplam_maas_gideri
+           FROM personeller WHERE aktif = 1""",
+        (today,)
+    ) as cursor:
+        row = await cursor.fetchone()
     await db.close()
-    
-    personeller = rows_to_list(personeller_rows)
-    toplam_maas = sum(p.get('maas', 0) or 0 for p in personeller)
-    
-    return {
-        "toplam_personel": len(personeller),
-        "bugun_giris_yapan": len(rows_to_list(puantaj_rows)),
-        "bekleyen_izin_talepleri": len(rows_to_list(izinler_rows)),
-        "toplam_maas_gideri": toplam_maas
-    }
+    return row_to_dict(row)
 
 # Personel Departmanlar
 class PersonelDepartmanCreate(BaseModel):
@@ -5326,9 +6521,10 @@ async def create_arac(input: AracCreate, current_user: dict = Depends(get_curren
     return row_to_dict(row)
 
 @api_router.get("/araclar")
-async def get_araclar(current_user: dict = Depends(get_current_user)):
+async def get_araclar(fields: Optional[str] = None, current_user: dict = Depends(get_current_user)):
+    secim = await secim_listesi("araclar", fields)
     db = await get_db()
-    async with db.execute("SELECT * FROM araclar ORDER BY plaka") as cursor:
+    async with db.execute(f"SELECT {secim} FROM araclar ORDER BY plaka") as cursor:
         rows = await cursor.fetchall()
     await db.close()
     return rows_to_list(rows)
@@ -5791,43 +6987,173 @@ class MotorinAlimCreate(BaseModel):
     bosaltim_tesisi: str = ""
     notlar: str = ""
 
-async def update_motorin_stok_sqlite():
-    db = await get_db()
-    async with db.execute("SELECT SUM(miktar_litre) FROM motorin_alimlar") as cursor:
-        row = await cursor.fetchone()
-        toplam_alim = row[0] or 0
-    
-    async with db.execute("SELECT SUM(miktar_litre) FROM motorin_verme") as cursor:
-        row = await cursor.fetchone()
-        toplam_verme = row[0] or 0
-    
-    # Açılış stokları
+# motorin_stok tek satırlık özet tablodur; yazma işlemleri aynı transaction içinde işaretli
+# delta uygular, periyodik stok mutabakatı tam toplamla karşılaştırıp sapmayı raporlar.
+MOTORIN_KAYNAK_KOLONLARI = {"alim": "miktar_litre", "verme": "miktar_litre", "acilis": "acilis_litre"}
+
+async def motorin_stok_uygula(db, kaynak: str, eski: Optional[dict], yeni: Optional[dict]):
+    """Apply the stock delta between the old and new version of an alim/verme/acilis row (caller commits)."""
+    kolon = MOTORIN_KAYNAK_KOLONLARI[kaynak]
+    await motorin_tank_uygula(db, kaynak, eski, yeni)
+    delta = ((yeni or {}).get(kolon) or 0) - ((eski or {}).get(kolon) or 0)
+    if not delta:
+        return
+    alim = delta if kaynak == "alim" else 0
+    verme = delta if kaynak == "verme" else 0
+    mevcut = -delta if kaynak == "verme" else delta
+    await db.execute(
+        """UPDATE motorin_stok SET toplam_alim = toplam_alim + ?, toplam_verme = toplam_verme + ?,
+           mevcut_stok = mevcut_stok + ?, updated_at = ?
+           WHERE id = (SELECT MIN(id) FROM motorin_stok)""",
+        (alim, verme, mevcut, datetime.now(timezone.utc).isoformat())
+    )
+
+# ----- Tank (boşaltım tesisi) bazlı motorin defteri -----
+async def motorin_tank_uygula(db, kaynak: str, eski: Optional[dict], yeni: Optional[dict]):
+    """Move an alim/verme/acilis row's litres between tank ledgers when it is created/updated/deleted."""
+    kolon = MOTORIN_KAYNAK_KOLONLARI[kaynak]
+    if eski and eski.get(kolon):
+        await db.execute("DELETE FROM motorin_tank_hareketler WHERE id = ?", (f"{kaynak}_{eski['id']}",))
+        await _motorin_tank_gunluk_uygula(db, eski.get('bosaltim_tesisi') or '', eski['tarih'], kaynak, -eski[kolon])
+    if yeni and yeni.get(kolon):
+        await db.execute(
+            """INSERT INTO motorin_tank_hareketler (id, tesis, kaynak, kaynak_id, tarih, miktar_litre, created_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (f"{kaynak}_{yeni['id']}", yeni.get('bosaltim_tesisi') or '', kaynak, yeni['id'], yeni['tarih'],
+             yeni[kolon], yeni.get('created_at'))
+        )
+        await _motorin_tank_gunluk_uygula(db, yeni.get('bosaltim_tesisi') or '', yeni['tarih'], kaynak, yeni[kolon])
+
+async def _motorin_tank_gunluk_uygula(db, tesis: str, tarih: str, kaynak: str, litre: float):
+    await db.execute(
+        """INSERT INTO motorin_tank_gunluk (tesis, tarih, kum_acilis, kum_alim, kum_verme)
+           SELECT ?, ?, COALESCE(MAX(kum_acilis), 0), COALESCE(MAX(kum_alim), 0), COALESCE(MAX(kum_verme), 0)
+           FROM (SELECT * FROM motorin_tank_gunluk WHERE tesis = ? AND tarih < ? ORDER BY tarih DESC LIMIT 1)
+           WHERE true
+           ON CONFLICT (tesis, tarih) DO NOTHING""",
+        (tesis, tarih, tesis, tarih),
+    )
+    await db.execute(
+        f"UPDATE motorin_tank_gunluk SET {kaynak} = {kaynak} + ? WHERE tesis = ? AND tarih = ?",
+        (litre, tesis, tarih),
+    )
+    await db.execute(
+        f"UPDATE motorin_tank_gunluk SET kum_{kaynak} = kum_{kaynak} + ? WHERE tesis = ? AND tarih >= ?",
+        (litre, tesis, tarih),
+    )
+    await db.execute(
+        """DELETE FROM motorin_tank_gunluk WHERE tesis = ? AND tarih = ?
+           AND ABS(acilis) < 1e-9 AND ABS(alim) < 1e-9 AND ABS(verme) < 1e-9""",
+        (tesis, tarih),
+    )
+    mevcut = -litre if kaynak == "verme" else litre
+    await db.execute(
+        f"""INSERT INTO motorin_tank_stok (tesis, toplam_{kaynak}, mevcut_stok, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (tesis) DO UPDATE SET toplam_{kaynak} = toplam_{kaynak} + excluded.toplam_{kaynak},
+                mevcut_stok = mevcut_stok + excluded.mevcut_stok, updated_at = excluded.updated_at""",
+        (tesis, litre, mevcut, datetime.now(timezone.utc).isoformat()),
+    )
+    await db.execute(
+        """DELETE FROM motorin_tank_stok WHERE tesis = ?
+           AND ABS(toplam_acilis) < 1e-9 AND ABS(toplam_alim) < 1e-9 AND ABS(toplam_verme) < 1e-9""",
+        (tesis,),
+    )
+
+async def motorin_tank_yeniden_kur(db=None):
+    """Rebuild tank balances, movement ledger and daily checkpoints from the fuel tables."""
+    kendi_baglantisi = db is None
+    if kendi_baglantisi:
+        db = await get_db()
     try:
-        async with db.execute("SELECT SUM(acilis_litre) FROM motorin_acilis") as cursor:
-            row = await cursor.fetchone()
-            toplam_acilis = row[0] or 0
-    except Exception:
-        toplam_acilis = 0
-    
-    mevcut_stok = toplam_acilis + toplam_alim - toplam_verme
-    updated_at = datetime.now(timezone.utc).isoformat()
-    
-    async with db.execute("SELECT COUNT(*) FROM motorin_stok") as cursor:
-        count = (await cursor.fetchone())[0]
-    
-    if count == 0:
+        await db.execute("DELETE FROM motorin_tank_hareketler")
+        for kaynak, tablo in (("acilis", "motorin_acilis"), ("alim", "motorin_alimlar"), ("verme", "motorin_verme")):
+            kolon = MOTORIN_KAYNAK_KOLONLARI[kaynak]
+            await db.execute(
+                f"""INSERT INTO motorin_tank_hareketler (id, tesis, kaynak, kaynak_id, tarih, miktar_litre, created_at)
+                    SELECT '{kaynak}_' || id, COALESCE(bosaltim_tesisi, ''), '{kaynak}', id, tarih, {kolon}, created_at
+                    FROM {tablo} WHERE COALESCE({kolon}, 0) != 0"""
+            )
+        await db.execute("DELETE FROM motorin_tank_gunluk")
         await db.execute(
-            "INSERT INTO motorin_stok (toplam_alim, toplam_verme, mevcut_stok, updated_at) VALUES (?, ?, ?, ?)",
-            (toplam_alim, toplam_verme, mevcut_stok, updated_at)
+            """INSERT INTO motorin_tank_gunluk (tesis, tarih, acilis, alim, verme, kum_acilis, kum_alim, kum_verme)
+               SELECT tesis, tarih, acilis, alim, verme, SUM(acilis) OVER w, SUM(alim) OVER w, SUM(verme) OVER w
+               FROM (
+                   SELECT tesis, tarih,
+                          SUM(CASE WHEN kaynak = 'acilis' THEN miktar_litre ELSE 0 END) AS acilis,
+                          SUM(CASE WHEN kaynak = 'alim' THEN miktar_litre ELSE 0 END) AS alim,
+                          SUM(CASE WHEN kaynak = 'verme' THEN miktar_litre ELSE 0 END) AS verme
+                   FROM motorin_tank_hareketler GROUP BY tesis, tarih
+               )
+               WINDOW w AS (PARTITION BY tesis ORDER BY tarih)"""
         )
-    else:
+        await db.execute("DELETE FROM motorin_tank_stok")
         await db.execute(
-            "UPDATE motorin_stok SET toplam_alim=?, toplam_verme=?, mevcut_stok=?, updated_at=?",
-            (toplam_alim, toplam_verme, mevcut_stok, updated_at)
+            """INSERT INTO motorin_tank_stok (tesis, toplam_acilis, toplam_alim, toplam_verme, mevcut_stok, updated_at)
+               SELECT tesis,
+                      SUM(CASE WHEN kaynak = 'acilis' THEN miktar_litre ELSE 0 END),
+                      SUM(CASE WHEN kaynak = 'alim' THEN miktar_litre ELSE 0 END),
+                      SUM(CASE WHEN kaynak = 'verme' THEN miktar_litre ELSE 0 END),
+                      SUM(CASE WHEN kaynak = 'verme' THEN -miktar_litre ELSE miktar_litre END),
+                      ?
+               FROM motorin_tank_hareketler GROUP BY tesis""",
+            (datetime.now(timezone.utc).isoformat(),)
         )
-    
-    await db.commit()
-    await db.close()
+        await db.commit()
+    finally:
+        if kendi_baglantisi:
+            await db.close()
+
+async def motorin_stok_mutabakat(duzelt: bool = False) -> dict:
+    """Recompute fuel totals with full SUMs, report drift against motorin_stok and optionally fix it."""
+    db = await get_db()
+    try:
+        if duzelt:
+            await yazma_baslat(db)
+        async with db.execute(
+            """SELECT (SELECT COALESCE(SUM(miktar_litre), 0) FROM motorin_alimlar),
+                      (SELECT COALESCE(SUM(miktar_litre), 0) FROM motorin_verme),
+                      (SELECT COALESCE(SUM(acilis_litre), 0) FROM motorin_acilis)"""
+        ) as cursor:
+            toplam_alim, toplam_verme, toplam_acilis = await cursor.fetchone()
+        beklenen = {
+            "toplam_alim": toplam_alim,
+            "toplam_verme": toplam_verme,
+            "mevcut_stok": toplam_acilis + toplam_alim - toplam_verme,
+        }
+        async with db.execute("SELECT toplam_alim, toplam_verme, mevcut_stok FROM motorin_stok ORDER BY id LIMIT 1") as cursor:
+            row = await cursor.fetchone()
+        kayitli = row_to_dict(row) if row else {}
+        sapma = {k: (kayitli.get(k) or 0) - v for k, v in beklenen.items() if abs((kayitli.get(k) or 0) - v) > 1e-6}
+
+        if duzelt and (sapma or not row):
+            updated_at = datetime.now(timezone.utc).isoformat()
+            if not row:
+                await db.execute(
+                    "INSERT INTO motorin_stok (toplam_alim, toplam_verme, mevcut_stok, updated_at) VALUES (?, ?, ?, ?)",
+                    (beklenen["toplam_alim"], beklenen["toplam_verme"], beklenen["mevcut_stok"], updated_at)
+                )
+            else:
+                await db.execute(
+                    "UPDATE motorin_stok SET toplam_alim=?, toplam_verme=?, mevcut_stok=?, updated_at=?",
+                    (beklenen["toplam_alim"], beklenen["toplam_verme"], beklenen["mevcut_stok"], updated_at)
+                )
+        await db.commit()
+    finally:
+        await db.close()
+
+    if sapma:
+        logger.warning("Motorin stok sapması tespit edildi: %s (düzeltildi=%s)", sapma, duzelt)
+    return {"beklenen": beklenen, "sapma": sapma, "duzeltildi": bool(duzelt and sapma)}
+
+@api_router.post("/admin/motorin-stok/mutabakat")
+async def motorin_stok_mutabakat_endpoint(duzelt: bool = False, current_user: dict = Depends(require_admin)):
+    """Motorin stok özetini tam toplamla karşılaştırır; `duzelt=true` ise özeti düzeltir."""
+    return await motorin_stok_mutabakat(duzelt)
+
+@api_router.get("/admin/motorin-stok/mutabakat")
+async def motorin_stok_mutabakat_durum(current_user: dict = Depends(require_admin)):
+    """Son periyodik stok mutabakatının motorin özetine ait sonucu."""
+    return await stok_mutabakat_durumu(onbellek="motorin_stok")
 
 @api_router.post("/motorin-alimlar")
 async def create_motorin_alim(input: MotorinAlimCreate, current_user: dict = Depends(get_current_user)):
@@ -5847,13 +7173,12 @@ async def create_motorin_alim(input: MotorinAlimCreate, current_user: dict = Dep
          input.fatura_no, input.irsaliye_no, input.odeme_durumu, input.vade_tarihi, input.teslim_alan,
          input.bosaltim_tesisi, input.notlar, created_at, current_user['id'], current_user['name'])
     )
-    await db.commit()
-    
     async with db.execute("SELECT * FROM motorin_alimlar WHERE id = ?", (alim_id,)) as cursor:
         row = await cursor.fetchone()
+    await motorin_stok_uygula(db, "alim", None, row_to_dict(row))
+    await db.commit()
     await db.close()
     
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.get("/motorin-alimlar")
@@ -5890,7 +7215,10 @@ async def get_motorin_alim(id: str, current_user: dict = Depends(get_current_use
 @api_router.put("/motorin-alimlar/{id}")
 async def update_motorin_alim(id: str, input: MotorinAlimCreate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     updated_at = datetime.now(timezone.utc).isoformat()
+    async with db.execute("SELECT * FROM motorin_alimlar WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     
     await db.execute(
         """UPDATE motorin_alimlar SET tarih=?, tedarikci_id=?, tedarikci_adi=?, akaryakit_markasi=?,
@@ -5904,22 +7232,26 @@ async def update_motorin_alim(id: str, input: MotorinAlimCreate, current_user: d
          input.irsaliye_no, input.odeme_durumu, input.vade_tarihi, input.teslim_alan, input.bosaltim_tesisi,
          input.notlar, updated_at, id)
     )
-    await db.commit()
-    
     async with db.execute("SELECT * FROM motorin_alimlar WHERE id = ?", (id,)) as cursor:
         row = await cursor.fetchone()
+    if eski:
+        await motorin_stok_uygula(db, "alim", row_to_dict(eski), row_to_dict(row))
+    await db.commit()
     await db.close()
     
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.delete("/motorin-alimlar/{id}")
 async def delete_motorin_alim(id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
+    async with db.execute("SELECT * FROM motorin_alimlar WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     await db.execute("DELETE FROM motorin_alimlar WHERE id = ?", (id,))
+    if eski:
+        await motorin_stok_uygula(db, "alim", row_to_dict(eski), None)
     await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return {"message": "Alım kaydı silindi"}
 
 # ============================
@@ -5948,11 +7280,11 @@ async def create_motorin_acilis(input: MotorinAcilisCreate, current_user: dict =
          input.kdv_dahil_birim, input.kdv_orani, input.toplam_kdv_dahil, input.notlar,
          created_at, current_user['id'], current_user['name'])
     )
-    await db.commit()
     async with db.execute("SELECT * FROM motorin_acilis WHERE id = ?", (acilis_id,)) as cursor:
         row = await cursor.fetchone()
+    await motorin_stok_uygula(db, "acilis", None, row_to_dict(row))
+    await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.get("/motorin-acilis")
@@ -5972,7 +7304,10 @@ async def get_motorin_acilis_list(bosaltim_tesisi: str = None, current_user: dic
 @api_router.put("/motorin-acilis/{id}")
 async def update_motorin_acilis(id: str, input: MotorinAcilisCreate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     updated_at = datetime.now(timezone.utc).isoformat()
+    async with db.execute("SELECT * FROM motorin_acilis WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     await db.execute(
         """UPDATE motorin_acilis SET tarih=?, bosaltim_tesisi=?, acilis_litre=?, kdv_haric_birim=?,
            kdv_dahil_birim=?, kdv_orani=?, toplam_kdv_dahil=?, notlar=?, updated_at=?
@@ -5981,20 +7316,25 @@ async def update_motorin_acilis(id: str, input: MotorinAcilisCreate, current_use
          input.kdv_dahil_birim, input.kdv_orani, input.toplam_kdv_dahil, input.notlar,
          updated_at, id)
     )
-    await db.commit()
     async with db.execute("SELECT * FROM motorin_acilis WHERE id = ?", (id,)) as cursor:
         row = await cursor.fetchone()
+    if eski:
+        await motorin_stok_uygula(db, "acilis", row_to_dict(eski), row_to_dict(row))
+    await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.delete("/motorin-acilis/{id}")
 async def delete_motorin_acilis(id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
+    async with db.execute("SELECT * FROM motorin_acilis WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     await db.execute("DELETE FROM motorin_acilis WHERE id = ?", (id,))
+    if eski:
+        await motorin_stok_uygula(db, "acilis", row_to_dict(eski), None)
     await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return {"message": "Açılış kaydı silindi"}
 
 # Motorin Verme
@@ -6026,19 +7366,17 @@ async def create_motorin_verme(input: MotorinVermeCreate, current_user: dict = D
          input.miktar_litre, input.kilometre, input.sofor_id, input.sofor_adi, input.personel_id,
          input.personel_adi, input.notlar, created_at, current_user['id'], current_user['name'])
     )
-    await db.commit()
-    
     async with db.execute("SELECT * FROM motorin_verme WHERE id = ?", (verme_id,)) as cursor:
         row = await cursor.fetchone()
+    await motorin_stok_uygula(db, "verme", None, row_to_dict(row))
+    await db.commit()
     await db.close()
     
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.get("/motorin-verme")
 async def get_motorin_verme(baslangic_tarihi: str = None, bitis_tarihi: str = None,
                              arac_id: str = None, current_user: dict = Depends(get_current_user)):
-    db = await get_db()
     query = "SELECT * FROM motorin_verme WHERE 1=1"
     params = []
     
@@ -6050,11 +7388,7 @@ async def get_motorin_verme(baslangic_tarihi: str = None, bitis_tarihi: str = No
         params.append(arac_id)
     
     query += " ORDER BY tarih DESC"
-    
-    async with db.execute(query, params) as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    return rows_to_list(rows)
+    return stream_json_rows(query, params)
 
 @api_router.get("/motorin-verme/{id}")
 async def get_motorin_verme_by_id(id: str, current_user: dict = Depends(get_current_user)):
@@ -6069,7 +7403,10 @@ async def get_motorin_verme_by_id(id: str, current_user: dict = Depends(get_curr
 @api_router.put("/motorin-verme/{id}")
 async def update_motorin_verme(id: str, input: MotorinVermeCreate, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     updated_at = datetime.now(timezone.utc).isoformat()
+    async with db.execute("SELECT * FROM motorin_verme WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     
     await db.execute(
         """UPDATE motorin_verme SET tarih=?, bosaltim_tesisi=?, arac_id=?, arac_plaka=?, arac_bilgi=?,
@@ -6079,22 +7416,26 @@ async def update_motorin_verme(id: str, input: MotorinVermeCreate, current_user:
          input.miktar_litre, input.kilometre, input.sofor_id, input.sofor_adi, input.personel_id,
          input.personel_adi, input.notlar, updated_at, id)
     )
-    await db.commit()
-    
     async with db.execute("SELECT * FROM motorin_verme WHERE id = ?", (id,)) as cursor:
         row = await cursor.fetchone()
+    if eski:
+        await motorin_stok_uygula(db, "verme", row_to_dict(eski), row_to_dict(row))
+    await db.commit()
     await db.close()
     
-    await update_motorin_stok_sqlite()
     return row_to_dict(row)
 
 @api_router.delete("/motorin-verme/{id}")
 async def delete_motorin_verme(id: str, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
+    async with db.execute("SELECT * FROM motorin_verme WHERE id = ?", (id,)) as cursor:
+        eski = await cursor.fetchone()
     await db.execute("DELETE FROM motorin_verme WHERE id = ?", (id,))
+    if eski:
+        await motorin_stok_uygula(db, "verme", row_to_dict(eski), None)
     await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return {"message": "Verme kaydı silindi"}
 
 # Motorin Verme - Toplu Yükleme (Excel)
@@ -6141,6 +7482,8 @@ async def create_motorin_verme_bulk(input: MotorinVermeBulkCreate, current_user:
     created_ids = []
 
     for idx, rec in enumerate(input.records):
+        # Her satır kendi savepoint'inde: verme kaydı, stok ve tank defteri ya birlikte yazılır ya hiç
+        await db.execute("SAVEPOINT verme_satir")
         try:
             plaka_norm = (rec.arac_plaka or '').upper().replace(' ', '').strip()
             arac_info = plaka_map.get(plaka_norm)
@@ -6159,14 +7502,20 @@ async def create_motorin_verme_bulk(input: MotorinVermeBulkCreate, current_user:
                  rec.miktar_litre, rec.kilometre, '', rec.sofor_adi, '', '', rec.notlar,
                  created_at, current_user['id'], current_user['name'], upload_id)
             )
+            await motorin_stok_uygula(db, "verme", None, {
+                "id": verme_id, "tarih": rec.tarih, "bosaltim_tesisi": rec.bosaltim_tesisi or input.tesis_adi,
+                "miktar_litre": rec.miktar_litre, "created_at": created_at,
+            })
+            await db.execute("RELEASE SAVEPOINT verme_satir")
             created_ids.append(verme_id)
             created_count += 1
         except Exception as e:
+            await db.execute("ROLLBACK TO SAVEPOINT verme_satir")
+            await db.execute("RELEASE SAVEPOINT verme_satir")
             errors.append({"row": idx + 1, "plaka": rec.arac_plaka, "error": str(e)})
 
     await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
 
     return {
         "created_count": created_count,
@@ -6211,19 +7560,32 @@ async def download_motorin_verme_upload(upload_id: str, current_user: dict = Dep
 @api_router.delete("/motorin-verme-uploads/{upload_id}")
 async def delete_motorin_verme_upload(upload_id: str, delete_records: bool = True, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    await yazma_baslat(db)
     if delete_records:
+        async with db.execute("SELECT * FROM motorin_verme WHERE upload_id = ?", (upload_id,)) as cursor:
+            silinenler = rows_to_list(await cursor.fetchall())
         await db.execute("DELETE FROM motorin_verme WHERE upload_id = ?", (upload_id,))
+        for eski in silinenler:
+            await motorin_stok_uygula(db, "verme", eski, None)
     else:
         await db.execute("UPDATE motorin_verme SET upload_id = '' WHERE upload_id = ?", (upload_id,))
     await db.execute("DELETE FROM motorin_verme_uploads WHERE id = ?", (upload_id,))
     await db.commit()
     await db.close()
-    await update_motorin_stok_sqlite()
     return {"message": "Yükleme silindi"}
 
 @api_router.get("/motorin-stok")
-async def get_motorin_stok(current_user: dict = Depends(get_current_user)):
+async def get_motorin_stok(tesis: Optional[str] = None, current_user: dict = Depends(get_current_user)):
     db = await get_db()
+    if tesis is not None:
+        # Tek tank: boşaltım tesisi bazlı özet
+        async with db.execute("SELECT * FROM motorin_tank_stok WHERE tesis = ?", (tesis,)) as cursor:
+            row = await cursor.fetchone()
+        await db.close()
+        if not row:
+            return {"tesis": tesis, "toplam_acilis": 0, "toplam_alim": 0, "toplam_verme": 0, "mevcut_stok": 0}
+        return row_to_dict(row)
+    
     async with db.execute("SELECT * FROM motorin_stok LIMIT 1") as cursor:
         row = await cursor.fetchone()
     await db.close()
@@ -6232,49 +7594,65 @@ async def get_motorin_stok(current_user: dict = Depends(get_current_user)):
         return {"toplam_alim": 0, "toplam_verme": 0, "mevcut_stok": 0}
     return row_to_dict(row)
 
+@api_router.get("/motorin-tank-ozet")
+async def get_motorin_tank_ozet(current_user: dict = Depends(get_current_user)):
+    """Tüm tankların (boşaltım tesisleri) güncel bakiyeleri."""
+    db = await get_db()
+    async with db.execute("SELECT * FROM motorin_tank_stok ORDER BY tesis") as cursor:
+        tanklar = rows_to_list(await cursor.fetchall())
+    await db.close()
+    return {
+        "tanklar": tanklar,
+        "toplam_stok": sum(t['mevcut_stok'] for t in tanklar),
+    }
+
+@api_router.get("/motorin-tank-gecmis")
+async def get_motorin_tank_gecmis(tesis: str, baslangic_tarihi: str = None, bitis_tarihi: str = None,
+                                  current_user: dict = Depends(get_current_user)):
+    """Bir tankın günlük alım/verme hareketleri ve gün sonu bakiyeleri (kontrol noktalarından)."""
+    query = """SELECT tarih, acilis, alim, verme, kum_acilis + kum_alim - kum_verme AS bakiye
+               FROM motorin_tank_gunluk WHERE tesis = ?"""
+    params = [tesis]
+    if baslangic_tarihi:
+        query += " AND tarih >= ?"
+        params.append(baslangic_tarihi)
+    if bitis_tarihi:
+        query += " AND tarih <= ?"
+        params.append(bitis_tarihi)
+    query += " ORDER BY tarih DESC"
+    db = await get_db()
+    async with db.execute(query, params) as cursor:
+        gunler = rows_to_list(await cursor.fetchall())
+    await db.close()
+    return gunler
+
 @api_router.get("/motorin-ozet")
 async def get_motorin_ozet(current_user: dict = Depends(get_current_user)):
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
     month_start = datetime.now(timezone.utc).replace(day=1).strftime("%Y-%m-%d")
     
     db = await get_db()
-    
-    async with db.execute("SELECT * FROM motorin_stok LIMIT 1") as cursor:
-        stok_row = await cursor.fetchone()
-    stok = row_to_dict(stok_row) if stok_row else {"mevcut_stok": 0, "toplam_alim": 0, "toplam_verme": 0}
-    
-    async with db.execute("SELECT * FROM motorin_alimlar WHERE tarih >= ?", (month_start,)) as cursor:
-        ayki_alimlar = rows_to_list(await cursor.fetchall())
-    
-    async with db.execute("SELECT * FROM motorin_verme WHERE tarih >= ?", (month_start,)) as cursor:
-        ayki_vermeler = rows_to_list(await cursor.fetchall())
-    
-    async with db.execute("SELECT COUNT(*) FROM motorin_alimlar WHERE tarih = ?", (today,)) as cursor:
-        bugunki_alim = (await cursor.fetchone())[0]
-    
-    async with db.execute("SELECT COUNT(*) FROM motorin_verme WHERE tarih = ?", (today,)) as cursor:
-        bugunki_verme = (await cursor.fetchone())[0]
-    
-    async with db.execute("SELECT COUNT(*) FROM motorin_tedarikciler") as cursor:
-        tedarikci_sayisi = (await cursor.fetchone())[0]
-    
+    # Tek sorgu: özet satırı + bu ayki/bugünkü alım ve vermeler koşullu toplamlarla
+    async with db.execute(
+        """WITH s AS (SELECT * FROM motorin_stok LIMIT 1),
+                a AS (SELECT COALESCE(SUM(miktar_litre), 0) AS ayki_alim,
+                             COALESCE(SUM(toplam_tutar), 0) AS ayki_maliyet,
+                             COUNT(CASE WHEN tarih = ? THEN 1 END) AS bugunki_alim_sayisi
+                      FROM motorin_alimlar WHERE tarih >= ?),
+                v AS (SELECT COALESCE(SUM(miktar_litre), 0) AS ayki_verme,
+                             COUNT(CASE WHEN tarih = ? THEN 1 END) AS bugunki_verme_sayisi
+                      FROM motorin_verme WHERE tarih >= ?)
+           SELECT COALESCE((SELECT mevcut_stok FROM s), 0) AS mevcut_stok,
+                  COALESCE((SELECT toplam_alim FROM s), 0) AS toplam_alim,
+                  COALESCE((SELECT toplam_verme FROM s), 0) AS toplam_verme,
+                  a.ayki_alim, a.ayki_maliyet, v.ayki_verme, a.bugunki_alim_sayisi, v.bugunki_verme_sayisi,
+                  (SELECT COUNT(*) FROM motorin_tedarikciler) AS tedarikci_sayisi
+           FROM a, v""",
+        (today, month_start, today, month_start)
+    ) as cursor:
+        row = await cursor.fetchone()
     await db.close()
-    
-    ayki_alim = sum(a.get('miktar_litre', 0) for a in ayki_alimlar)
-    ayki_maliyet = sum(a.get('toplam_tutar', 0) for a in ayki_alimlar)
-    ayki_verme = sum(v.get('miktar_litre', 0) for v in ayki_vermeler)
-    
-    return {
-        "mevcut_stok": stok.get("mevcut_stok", 0),
-        "toplam_alim": stok.get("toplam_alim", 0),
-        "toplam_verme": stok.get("toplam_verme", 0),
-        "ayki_alim": ayki_alim,
-        "ayki_maliyet": ayki_maliyet,
-        "ayki_verme": ayki_verme,
-        "bugunki_alim_sayisi": bugunki_alim,
-        "bugunki_verme_sayisi": bugunki_verme,
-        "tedarikci_sayisi": tedarikci_sayisi
-    }
+    return row_to_dict(row)
 
 @api_router.get("/motorin-arac-tuketim")
 async def get_motorin_arac_tuketim(baslangic_tarihi: str = None, bitis_tarihi: str = None,
@@ -6515,11 +7893,16 @@ async def create_teklif(input: TeklifCreate, current_user: dict = Depends(get_cu
     result['kalemler'] = json.loads(result.get('kalemler', '[]'))
     return result
 
+def _teklif_kalemleri_coz(r: dict) -> dict:
+    r['kalemler'] = json.loads(r.get('kalemler', '[]'))
+    return r
+
+DEGISIKLIK_PAYLOAD_DONUSUMLERI["teklifler"] = _teklif_kalemleri_coz
+
 @api_router.get("/teklifler")
 async def get_teklifler(durum: str = None, teklif_turu: str = None, musteri_id: str = None,
                          baslangic_tarihi: str = None, bitis_tarihi: str = None,
                          current_user: dict = Depends(get_current_user)):
-    db = await get_db()
     query = "SELECT * FROM teklifler WHERE 1=1"
     params = []
     
@@ -6537,17 +7920,7 @@ async def get_teklifler(durum: str = None, teklif_turu: str = None, musteri_id:
         params.extend([baslangic_tarihi, bitis_tarihi])
     
     query += " ORDER BY created_at DESC"
-    
-    async with db.execute(query, params) as cursor:
-        rows = await cursor.fetchall()
-    await db.close()
-    
-    result = []
-    for row in rows:
-        r = row_to_dict(row)
-        r['kalemler'] = json.loads(r.get('kalemler', '[]'))
-        result.append(r)
-    return result
+    return stream_json_rows(query, params, transform=_teklif_kalemleri_coz)
 
 @api_router.get("/teklifler/{id}")
 async def get_teklif(id: str, current_user: dict = Depends(get_current_user)):
@@ -6642,24 +8015,21 @@ async def get_teklif_ozet(teklif_turu: str = None, current_user: dict = Depends(
         base_query += " AND teklif_turu = ?"
         params.append(teklif_turu)
     
-    async with db.execute(f"SELECT COUNT(*) FROM teklifler{base_query}", params) as cursor:
-        toplam_teklif = (await cursor.fetchone())[0]
-    
-    durumlar = {}
-    for d in ['taslak', 'gonderildi', 'beklemede', 'kabul_edildi', 'reddedildi']:
-        async with db.execute(f"SELECT COUNT(*) FROM teklifler{base_query} AND durum = ?", params + [d]) as cursor:
-            durumlar[d] = (await cursor.fetchone())[0]
-    
-    async with db.execute(f"SELECT * FROM teklifler{base_query} AND teklif_tarihi >= ?", params + [month_start]) as cursor:
-        ayki_rows = await cursor.fetchall()
-    ayki_teklifler = rows_to_list(ayki_rows)
-    
-    async with db.execute(f"SELECT * FROM teklifler{base_query} AND durum = 'kabul_edildi'", params) as cursor:
-        kabul_rows = await cursor.fetchall()
-    kabul_teklifler = rows_to_list(kabul_rows)
-    
-    async with db.execute("SELECT COUNT(*) FROM teklif_musteriler") as cursor:
-        musteri_sayisi = (await cursor.fetchone())[0]
+    async with db.execute(
+        f"""SELECT COUNT(*) AS toplam_teklif,
+                   COUNT(CASE WHEN durum = 'taslak' THEN 1 END) AS taslak,
+                   COUNT(CASE WHEN durum = 'gonderildi' THEN 1 END) AS gonderildi,
+                   COUNT(CASE WHEN durum = 'beklemede' THEN 1 END) AS beklemede,
+                   COUNT(CASE WHEN durum = 'kabul_edildi' THEN 1 END) AS kabul_edildi,
+                   COUNT(CASE WHEN durum = 'reddedildi' THEN 1 END) AS reddedildi,
+                   COUNT(CASE WHEN teklif_tarihi >= ? THEN 1 END) AS ayki_teklif_sayisi,
+                   COALESCE(SUM(CASE WHEN teklif_tarihi >= ? THEN genel_toplam END), 0) AS ayki_toplam_tutar,
+                   COALESCE(SUM(CASE WHEN durum = 'kabul_edildi' THEN genel_toplam END), 0) AS kabul_toplam_tutar,
+                   (SELECT COUNT(*) FROM teklif_musteriler) AS musteri_sayisi
+            FROM teklifler{base_query}""",
+        [month_start, month_start] + params
+    ) as cursor:
+        ozet = row_to_dict(await cursor.fetchone())
     
     async with db.execute(f"SELECT * FROM teklifler{base_query} ORDER BY created_at DESC LIMIT 5", params) as cursor:
         son_rows = await cursor.fetchall()
@@ -6672,19 +8042,8 @@ async def get_teklif_ozet(teklif_turu: str = None, current_user: dict = Depends(
         r['kalemler'] = json.loads(r.get('kalemler', '[]'))
         son_teklifler.append(r)
     
-    return {
-        "toplam_teklif": toplam_teklif,
-        "taslak": durumlar['taslak'],
-        "gonderildi": durumlar['gonderildi'],
-        "beklemede": durumlar['beklemede'],
-        "kabul_edildi": durumlar['kabul_edildi'],
-        "reddedildi": durumlar['reddedildi'],
-        "ayki_teklif_sayisi": len(ayki_teklifler),
-        "ayki_toplam_tutar": sum(t.get('genel_toplam', 0) or 0 for t in ayki_teklifler),
-        "kabul_toplam_tutar": sum(t.get('genel_toplam', 0) or 0 for t in kabul_teklifler),
-        "musteri_sayisi": musteri_sayisi,
-        "son_teklifler": son_teklifler
-    }
+    ozet["son_teklifler"] = son_teklifler
+    return ozet
 
 # ============ İrsaliye API'leri ============
 
@@ -6791,27 +8150,21 @@ async def list_irsaliyeler(
 async def irsaliye_ozet(current_user: dict = Depends(get_current_user)):
     db = await get_db()
     try:
-        async with db.execute("SELECT COUNT(*) FROM irsaliyeler") as cur:
-            toplam = (await cur.fetchone())[0] or 0
-        async with db.execute("SELECT COUNT(*) FROM irsaliyeler WHERE tur = 'gelen'") as cur:
-            gelen = (await cur.fetchone())[0] or 0
-        async with db.execute("SELECT COUNT(*) FROM irsaliyeler WHERE tur = 'giden'") as cur:
-            giden = (await cur.fetchone())[0] or 0
-        async with db.execute("SELECT COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tur = 'gelen'") as cur:
-            toplam_gelen_tutar = (await cur.fetchone())[0] or 0
-        async with db.execute("SELECT COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tur = 'giden'") as cur:
-            toplam_giden_tutar = (await cur.fetchone())[0] or 0
-
-        # Bu ayki
+        # Genel + bu ayki toplamlar tek geçişte
         now = datetime.now(timezone.utc)
         ay_baslangic = now.replace(day=1).strftime("%Y-%m-%d")
         async with db.execute(
-            "SELECT COUNT(*), COALESCE(SUM(tutar),0) FROM irsaliyeler WHERE tarih >= ?",
-            (ay_baslangic,),
+            """SELECT COUNT(*),
+                      COUNT(CASE WHEN tur = 'gelen' THEN 1 END),
+                      COUNT(CASE WHEN tur = 'giden' THEN 1 END),
+                      COALESCE(SUM(CASE WHEN tur = 'gelen' THEN tutar END), 0),
+                      COALESCE(SUM(CASE WHEN tur = 'giden' THEN tutar END), 0),
+                      COUNT(CASE WHEN tarih >= ? THEN 1 END),
+                      COALESCE(SUM(CASE WHEN tarih >= ? THEN tutar END), 0)
+               FROM irsaliyeler""",
+            (ay_baslangic, ay_baslangic),
         ) as cur:
-            r = await cur.fetchone()
-            ayki_adet = r[0] or 0
-            ayki_tutar = r[1] or 0
+            toplam, gelen, giden, toplam_gelen_tutar, toplam_giden_tutar, ayki_adet, ayki_tutar = await cur.fetchone()
 
         # Son 5 irsaliye
         async with db.execute(
@@ -8092,6 +9445,9 @@ app.include_router(api_router)
 
 @app.on_event("startup")
 async def startup_event():
+    # GitHub istekleri için paylaşılan (keep-alive) HTTP istemcisi
+    await github_sync_open_client()
+
     # 1) Container yeniden başladıysa GitHub'dan en son yedeği geri yükle
     #    (yalnızca local DB yoksa veya boşsa/eskiyse — mevcut veriye dokunulmaz)
     try:
@@ -8106,13 +9462,73 @@ async def startup_event():
     # 2) DB şemasını hazırla (yeni tablolar, kolonlar, vs.)
     await init_db()
     logger.info("SQLite database initialized")
+    try:
+        await degisiklik_gunlugu_buda()
+    except Exception as e:
+        logger.exception("Değişiklik günlüğü budanamadı: %s", e)
+    try:
+        # Sayaç tablosu yeni oluşturulduysa (veya eski yedekten dönüldüyse) geçmişten doldur
+        db = await get_db()
+        async with db.execute("SELECT COUNT(*) FROM bims_saha_cikan") as cursor:
+            sayac_yok = (await cursor.fetchone())[0] == 0
+        await db.close()
+        if sayac_yok:
+            await saha_cikan_mutabakat(duzelt=True)
+    except Exception as e:
+        logger.exception("Saha çıkan sayaçları doldurulamadı: %s", e)
+    try:
+        # Bakiyesi olmayan hareket varsa (yeni kolon / eski yedek) defteri yeniden kur
+        db = await get_db()
+        async with db.execute("SELECT 1 FROM bims_stok_hareketler WHERE bakiye IS NULL LIMIT 1") as cursor:
+            eksik = await cursor.fetchone()
+        if eksik:
+            await bims_stok_defter_yeniden_kur(db)
+        await db.close()
+    except Exception as e:
+        logger.exception("BIMS stok defteri kurulamadı: %s", e)
+    try:
+        # Çimento defteri henüz kurulmadıysa geçmiş teslimat/harcamalardan kur
+        db = await get_db()
+        async with db.execute("SELECT COUNT(*) FROM cimento_stok_gunluk") as cursor:
+            gunluk_yok = (await cursor.fetchone())[0] == 0
+        if gunluk_yok:
+            await cimento_stok_defter_yeniden_kur(db)
+        await db.close()
+    except Exception as e:
+        logger.exception("Çimento stok defteri kurulamadı: %s", e)
+    try:
+        # Tank defteri henüz kurulmadıysa geçmiş alım/verme/açılış kayıtlarından kur
+        db = await get_db()
+        async with db.execute("SELECT COUNT(*) FROM motorin_tank_stok") as cursor:
+            tank_yok = (await cursor.fetchone())[0] == 0
+        if tank_yok:
+            await motorin_tank_yeniden_kur(db)
+        await db.close()
+    except Exception as e:
+        logger.exception("Motorin tank defteri kurulamadı: %s", e)
+    try:
+        # Özet satırı yoksa oluştur / yedekten dönüldüyse toplamları düzelt
+        await motorin_stok_mutabakat(duzelt=True)
+    except Exception as e:
+        logger.exception("Motorin stok özeti hazırlanamadı: %s", e)
+    app.state.stok_mutabakat_task = asyncio.create_task(stok_mutabakat_dongusu())
+    if github_sync_is_configured() and github_sync_embedded_worker():
+        # Kalıcı kuyruğu boşaltan işçi; restart öncesinden kalan kayıtlar da buradan gider.
+        # Birden çok uvicorn worker'ında yalnızca kilidi (sync_lease) tutan push eder.
+        # GITHUB_SYNC_WORKER=external ise API yalnızca kuyruğa yazar: python -m github_sync worker
+        app.state.github_sync_task = asyncio.create_task(github_sync_worker())
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Uyku/restart öncesi bekleyen debounce push'ları hemen çalıştır
+    for ad in ("stok_mutabakat_task", "github_sync_task"):
+        task = getattr(app.state, ad, None)
+        if task:
+            task.cancel()
+    # Uyku/restart öncesi kuyrukta bekleyen push'ları hemen çalıştır (başarısızlar kuyrukta kalır)
     try:
         flush_result = await flush_pending_pushes()
         logger.info("Shutdown flush result: %s", flush_result)
     except Exception as e:
         logger.exception("Shutdown flush failed: %s", e)
+    await github_sync_close_client()
     logger.info("Application shutdown")
@@ -0,0 +1,453 @@
+"""
+GitHub sync batching against an in-process fake GitHub (httpx.MockTransport).
+Covers:
+- Several dirty tables + database.db go out as ONE commit (one tree, one ref update)
+- Stale cached head: non-fast-forward ref update is rebuilt on the new head once
+- Unchanged snapshots are not re-uploaded on a second push-all
+- A compacted snapshot deletes the delta files it supersedes
+- database.db is uploaded as compressed content-defined chunks; a small change
+  uploads only a few new chunks, and restore reassembles the file from the manifest
+- Restore replays deltas pushed after the backup and moves the changelog seq past them
+  (and past a compacted snapshot's seq, so later deltas are not skipped)
+- Switching repo re-uploads everything instead of trusting the old sha map
+- Writes land in the durable sync_outbox; failed pushes stay queued with backoff
+- Only the sync-lease holder pushes; others queue a push-all for it; a worker
+  that takes the lease (back) reloads the sha map another holder may have changed
+- The scheduler spaces cycles by the remaining rate-limit quota and defers DB backups;
+  malformed rate-limit headers still pause it instead of failing the request
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("GITHUB_SYNC_ENABLED", "false")
+
+import github_sync  # noqa: E402
+
+TABLES = ["personeller", "bims_stok_urunler", "motorin_alimlar"]
+
+
+class FakeGitHub:
+    """Just enough of the Contents + Git Data API for github_sync."""
+
+    def __init__(self, repo="o/r"):
+        self.repo = repo
+        self.objects = {}  # sha -> commit {"tree", "parents"} | tree {path: blob sha}
+        self.blobs = {}
+        self.head = self._commit({}, [])
+        self.calls = []
+        self.branch = "main"
+
+    def _sha(self, value) -> str:
+        return hashlib.sha1(json.dumps(value, sort_keys=True).encode()).hexdigest()
+
+    def _commit(self, files: dict, parents: list) -> str:
+        tree = self._sha(files)
+        self.objects[tree] = dict(files)
+        commit = self._sha({"tree": tree, "parents": parents, "n": len(self.objects)})
+        self.objects[commit] = {"tree": tree, "parents": parents}
+        return commit
+
+    def files(self) -> dict:
+        return self.objects[self.objects[self.head]["tree"]]
+
+    def commit_count(self) -> int:
+        n, sha = 0, self.head
+        while self.objects[sha]["parents"]:
+            n, sha = n + 1, self.objects[sha]["parents"][0]
+        return n
+
+    def _blob(self, content: bytes) -> str:
+        sha = github_sync._blob_sha(content)
+        self.blobs[sha] = content
+        return sha
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == "raw.github.test":
+            return httpx.Response(200, content=self.blobs[request.url.path.strip("/")])
+        path = request.url.path.split(f"/repos/{self.repo}", 1)[1]
+        body = json.loads(request.content) if request.content else {}
+        self.calls.append((request.method, path))
+        if path.startswith("/contents/"):
+            name = path[len("/contents/"):]
+            current = self.files().get(name)
+            if request.method == "GET" and not current:
+                return httpx.Response(404)
+            if request.method == "GET" and "raw" in request.headers.get("accept", ""):
+                return httpx.Response(200, content=self.blobs[current])
+            if request.method == "GET":
+                blob = self.blobs[current]
+                meta = {"sha": current, "size": len(blob)}
+                if len(blob) < 1024:
+                    meta["content"] = base64.b64encode(blob).decode()
+                else:
+                    meta["download_url"] = f"https://raw.github.test/{current}"
+                return httpx.Response(200, json=meta)
+            if current and body.get("sha") != current:
+                return httpx.Response(409 if body.get("sha") else 422)
+            files = {**self.files(), name: self._blob(base64.b64decode(body["content"]))}
+            self.head = self._commit(files, [self.head])
+            return httpx.Response(201, json={
+                "content": {"sha": files[name]},
+                "commit": {"sha": self.head, "tree": {"sha": self.objects[self.head]["tree"]}},
+            })
+        if path == "/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": self.head}})
+        if path.startswith("/git/commits/"):
+            return httpx.Response(200, json={"tree": {"sha": self.objects[path.rsplit("/", 1)[1]]["tree"]}})
+        if path == "/git/blobs":
+            return httpx.Response(201, json={"sha": self._blob(base64.b64decode(body["content"]))})
+        if path == f"/git/trees/{self.branch}" and request.method == "GET":
+            tree = [{"path": p, "type": "blob", "sha": sha} for p, sha in self.files().items()]
+            return httpx.Response(200, json={"tree": tree, "truncated": False})
+        if path == "/git/trees":
+            files = dict(self.objects[body["base_tree"]])
+            for entry in body["tree"]:
+                if "sha" in entry and entry["sha"] is None:
+                    files.pop(entry["path"])
+                else:
+                    files[entry["path"]] = entry.get("sha") or self._blob(entry["content"].encode("utf-8"))
+            tree = self._sha(files)
+            self.objects[tree] = files
+            return httpx.Response(201, json={"sha": tree})
+        if path == "/git/commits":
+            commit = self._sha({**body, "n": len(self.objects)})
+            self.objects[commit] = {"tree": body["tree"], "parents": body["parents"]}
+            return httpx.Response(201, json={"sha": commit})
+        if path == "/git/refs/heads/main":
+            if self.objects[body["sha"]]["parents"] != [self.head]:
+                return httpx.Response(422, json={"message": "Update is not a fast forward"})
+            self.head = body["sha"]
+            return httpx.Response(200, json={"object": {"sha": self.head}})
+        return httpx.Response(404)
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    db_path = tmp_path / "database.db"
+    con = sqlite3.connect(db_path)
+    con.executescript("""
+        CREATE TABLE degisiklik_gunlugu (seq INTEGER PRIMARY KEY AUTOINCREMENT, tablo TEXT, kayit_id TEXT, islem TEXT);
+        CREATE TABLE degisiklik_gunlugu_durum (id INTEGER PRIMARY KEY, budanan_seq INTEGER);
+        INSERT INTO degisiklik_gunlugu_durum VALUES (1, 0);
+    """)
+    for sql in github_sync.sync_schema():
+        con.execute(sql)
+    for table in TABLES:
+        con.execute(f"CREATE TABLE {table} (id TEXT PRIMARY KEY, ad TEXT)")
+        con.execute(f"""CREATE TRIGGER trg_{table}_i AFTER INSERT ON {table} BEGIN
+                        INSERT INTO degisiklik_gunlugu (tablo, kayit_id, islem) VALUES ('{table}', NEW.id, 'I'); END""")
+        con.execute(f"INSERT INTO {table} VALUES ('1', 'ilk')")
+    con.commit()
+    con.close()
+
+    gh = FakeGitHub()
+    monkeypatch.setattr(github_sync, "DB_PATH", db_path)
+    monkeypatch.setattr(github_sync, "GITHUB_TOKEN", "t")
+    monkeypatch.setattr(github_sync, "GITHUB_REPO", "o/r")
+    monkeypatch.setattr(github_sync, "GITHUB_BRANCH", "main")
+    monkeypatch.setattr(github_sync, "GITHUB_SYNC_ENABLED", True)
+    monkeypatch.setattr(github_sync, "API_BASE", "https://api.github.test")
+    monkeypatch.setattr(github_sync, "_sha_map", None)
+    monkeypatch.setattr(github_sync, "_sha_map_scope", None)
+    monkeypatch.setattr(github_sync, "_head", None)
+    monkeypatch.setattr(github_sync, "_lease_until", 0.0)
+    monkeypatch.setattr(github_sync, "_client", httpx.AsyncClient(transport=httpx.MockTransport(gh.handler)))
+    return gh
+
+
+def _insert(table, row_id):
+    con = sqlite3.connect(github_sync.DB_PATH)
+    con.execute(f"INSERT INTO {table} VALUES (?, 'yeni')", (row_id,))
+    con.commit()
+    con.close()
+
+
+def test_dirty_tables_and_db_in_one_commit(fake):
+    asyncio.run(github_sync.push_all_tables())
+    assert fake.commit_count() == 1
+    manifest = json.loads(fake.blobs[fake.files()["backups/database.manifest.json"]])
+    assert manifest["format"] in ("gzip", "zstd") and manifest["chunks"]
+    assert {"data/personeller.json", "data/bims_stok_urunler.json"} <= set(fake.files())
+
+    for table in TABLES:
+        _insert(table, "2")
+    fake.calls.clear()
+    result = asyncio.run(github_sync.sync_now(force_db=True))
+
+    assert all(result["tables"][t] for t in TABLES) and result["database"]
+    assert fake.commit_count() == 2
+    assert [c for c in fake.calls if c[0] == "PATCH"] == [("PATCH", "/git/refs/heads/main")]
+    deltas = [p for p in fake.files() if p.endswith(".ndjson")]
+    assert len(deltas) == len(TABLES)
+    line = json.loads(fake.blobs[fake.files()[deltas[0]]].decode().splitlines()[0])
+    assert line["op"] == "upsert" and line["id"] == "2"
+
+
+def test_stale_head_is_rebuilt_once(fake):
+    asyncio.run(github_sync.push_all_tables())
+    # Someone else commits to the branch; our cached head is now stale
+    fake.head = fake._commit({**fake.files(), "README.md": "x"}, [fake.head])
+    _insert("personeller", "2")
+    _insert("bims_stok_urunler", "2")
+    result = asyncio.run(github_sync.sync_now(["personeller", "bims_stok_urunler"]))
+
+    assert result["tables"] == {"personeller": True, "bims_stok_urunler": True}
+    assert "README.md" in fake.files()
+    assert len([c for c in fake.calls if c[0] == "PATCH"]) == 3  # push-all, rejected, rebuilt
+
+
+def test_unchanged_snapshots_are_skipped(fake):
+    asyncio.run(github_sync.push_all_tables())
+    before = dict(fake.files())
+    asyncio.run(github_sync.push_all_tables())
+    # Only the database backup changed (sync state rows); table snapshots were not re-sent
+    changed = {p for p, sha in fake.files().items() if before.get(p) != sha}
+    assert changed and all(p.startswith("backups/") for p in changed)
+
+
+def test_compaction_deletes_superseded_deltas(fake, monkeypatch):
+    monkeypatch.setattr(github_sync, "SNAPSHOT_EVERY_DELTAS", 2)
+    asyncio.run(github_sync.push_all_tables())
+    for row_id in ("2", "3", "4"):
+        _insert("personeller", row_id)
+        asyncio.run(github_sync.sync_now())
+        if row_id == "3":
+            assert len([p for p in fake.files() if p.startswith("data/personeller/")]) == 2
+
+    # Third cycle compacted: snapshot has every row, the old deltas are gone
+    assert not [p for p in fake.files() if p.startswith("data/personeller/")]
+    assert not [p for p in github_sync._known_shas() if p.startswith("data/personeller/")]
+    snapshot = json.loads(fake.blobs[fake.files()["data/personeller.json"]])
+    assert snapshot["row_count"] == 4
+
+    # Restore from the push-all backup picks the newer snapshot up instead of the deleted deltas
+    github_sync.DB_PATH.unlink()
+    assert asyncio.run(github_sync.restore_database_from_github())["restored"]
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT COUNT(*) FROM personeller").fetchone() == (4,)
+    con.close()
+
+
+def test_db_backup_uploads_only_new_chunks(fake, monkeypatch):
+    monkeypatch.setattr(github_sync, "DB_CHUNK_AVG_BYTES", 16 * 1024)
+    con = sqlite3.connect(github_sync.DB_PATH)
+    con.executemany("INSERT INTO personeller VALUES (?, ?)", [(f"p{i:05d}", f"personel {i} " * 20) for i in range(3000)])
+    con.commit()
+    con.close()
+    asyncio.run(github_sync.push_all_tables())
+    total = github_sync.get_stats()["last_db_backup"]["chunks"]
+
+    con = sqlite3.connect(github_sync.DB_PATH)
+    con.execute("UPDATE personeller SET ad = 'degisti' WHERE id = 'p01500'")
+    con.commit()
+    con.close()
+    asyncio.run(github_sync.sync_now(force_db=True))
+    backup = github_sync.get_stats()["last_db_backup"]
+
+    assert total > 20
+    assert 0 < backup["new_chunks"] <= 5
+
+
+def test_restore_replays_changes_after_backup(fake):
+    asyncio.run(github_sync.push_all_tables())
+    _insert("personeller", "2")
+    _insert("motorin_alimlar", "2")
+    # Deltas only: the database backup interval has not passed yet
+    assert not asyncio.run(github_sync.sync_now())["database"]
+    pushed = max(int(p.rsplit("-", 1)[1].split(".")[0]) for p in fake.files() if p.endswith(".ndjson"))
+
+    github_sync.DB_PATH.unlink()
+    result = asyncio.run(github_sync.restore_database_from_github())
+    assert result["restored"] and result["replayed_rows"] == 2
+
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT ad FROM personeller WHERE id = '2'").fetchone() == ("yeni",)
+    assert con.execute("SELECT pushed_seq FROM github_sync_state WHERE table_name = 'personeller'").fetchone()[0] == pushed
+    con.execute("INSERT INTO personeller VALUES ('3', 'sonra')")
+    assert con.execute("SELECT MAX(seq) FROM degisiklik_gunlugu").fetchone()[0] > pushed
+    con.close()
+
+
+def test_switched_repo_gets_a_restorable_backup(fake, monkeypatch):
+    asyncio.run(github_sync.push_all_tables())
+    other = FakeGitHub(repo="o/yeni")
+    monkeypatch.setattr(github_sync, "GITHUB_REPO", "o/yeni")
+    monkeypatch.setattr(github_sync, "_client", httpx.AsyncClient(transport=httpx.MockTransport(other.handler)))
+    asyncio.run(github_sync.push_all_tables())
+    assert {"data/personeller.json", github_sync.DB_MANIFEST_PATH} <= set(other.files())
+
+    github_sync.DB_PATH.unlink()
+    result = asyncio.run(github_sync.restore_database_from_github())
+    assert result["restored"]
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT ad FROM personeller WHERE id = '1'").fetchone() == ("ilk",)
+    con.close()
+
+
+def test_restore_chunked_backup(fake, monkeypatch):
+    monkeypatch.setattr(github_sync, "DB_CHUNK_AVG_BYTES", 16 * 1024)
+    asyncio.run(github_sync.push_all_tables())
+    github_sync.DB_PATH.unlink()
+    result = asyncio.run(github_sync.restore_database_from_github())
+
+    assert result["restored"] and result["format"] in ("gzip", "zstd")
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT ad FROM personeller WHERE id = '1'").fetchone() == ("ilk",)
+    con.close()
+
+
+def _outbox():
+    con = sqlite3.connect(github_sync.DB_PATH)
+    rows = {r[0]: r[1] for r in con.execute("SELECT target, attempts FROM sync_outbox")}
+    con.close()
+    return rows
+
+
+def test_outbox_survives_failures_and_drains(fake, monkeypatch):
+    asyncio.run(github_sync.push_all_tables())
+    assert _outbox() == {}
+    _insert("personeller", "2")
+    assert _outbox() == {"personeller": 0, github_sync.DB_TARGET: 0}
+
+    # GitHub down: the entry stays queued and is backed off
+    down = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+    monkeypatch.setattr(github_sync, "_client", down)
+    monkeypatch.setattr(github_sync, "_head", None)
+    asyncio.run(github_sync.sync_now())
+    assert _outbox()["personeller"] == 1
+    assert asyncio.run(github_sync.sync_now())["tables"] == {}  # still backing off
+    status = asyncio.run(github_sync.outbox_status())
+    assert status["depth"] == 2 and status["retrying"] == 1 and status["oldest_age_seconds"] >= 0
+
+    # "Restart" with GitHub back: the flush drains what was left
+    monkeypatch.setattr(github_sync, "_client", httpx.AsyncClient(transport=httpx.MockTransport(fake.handler)))
+    result = asyncio.run(github_sync.flush_pending_pushes())
+    assert result["tables"] == {"personeller": True} and result["database"]
+    assert _outbox() == {}
+
+
+def test_only_lease_holder_pushes(fake, monkeypatch):
+    monkeypatch.setattr(github_sync, "_lease_holder", lambda: "other:1")
+    assert asyncio.run(github_sync.acquire_lease())
+
+    # This process is not the holder: push-all is queued, nothing reaches GitHub
+    monkeypatch.setattr(github_sync, "_lease_holder", lambda: "api:2")
+    monkeypatch.setattr(github_sync, "_lease_until", 0.0)
+    result = asyncio.run(github_sync.push_all_tables())
+    assert result["queued"] and fake.commit_count() == 0
+    assert github_sync.FULL_SYNC_TARGET in _outbox()
+    assert asyncio.run(github_sync.flush_pending_pushes())["flushed"] is False
+
+    # The holder's lease expires; the next worker takes over and runs the queued push-all
+    con = sqlite3.connect(github_sync.DB_PATH)
+    con.execute("UPDATE sync_lease SET expires_at = 0")
+    con.commit()
+    con.close()
+    assert asyncio.run(github_sync.acquire_lease())
+    result = asyncio.run(github_sync.sync_now())
+    assert result["database"] and all(result["tables"][t] for t in TABLES)
+    assert "data/personeller.json" in fake.files() and _outbox() == {}
+
+
+def test_lease_takeover_reloads_sha_map(fake, monkeypatch):
+    assert asyncio.run(github_sync.acquire_lease())
+    asyncio.run(github_sync.push_all_tables())
+
+    # Our lease lapsed; meanwhile another holder pushed and rewrote the map
+    map_path = github_sync._sha_map_path()
+    stored = json.loads(map_path.read_text())
+    stored["shas"]["data/personeller.json"] = "baska"
+    map_path.write_text(json.dumps(stored))
+    con = sqlite3.connect(github_sync.DB_PATH)
+    con.execute("UPDATE sync_lease SET expires_at = 0")
+    con.commit()
+    con.close()
+    monkeypatch.setattr(github_sync, "_lease_until", time.time() - 1)
+
+    assert asyncio.run(github_sync.acquire_lease())
+    assert github_sync._known_shas()["data/personeller.json"] == "baska"
+    assert github_sync._head is None
+
+
+def test_scheduler_follows_rate_limit(fake, monkeypatch):
+    reset = time.time() + 1800
+
+    def limited(request):
+        response = fake.handler(request)
+        response.headers.update({"x-ratelimit-limit": "5000", "x-ratelimit-remaining": "1000",
+                                 "x-ratelimit-reset": str(int(reset))})
+        return response
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(limited),
+                               event_hooks={"response": [github_sync.note_rate_limit]})
+    monkeypatch.setattr(github_sync, "_client", client)
+    monkeypatch.setattr(github_sync, "_rate_limit", {"limit": None, "remaining": None, "reset_at": None, "paused_until": 0.0})
+    monkeypatch.setattr(github_sync, "_schedule", {})
+    monkeypatch.setattr(github_sync, "_last_cycle_at", 0.0)
+    asyncio.run(github_sync.push_all_tables())
+    _insert("personeller", "2")
+    delay = asyncio.run(github_sync._next_outbox_delay())
+    scheduler = github_sync.get_stats()["scheduler"]
+
+    # 800 usable requests (1000 - reserve) must last 30 minutes: cycles are spaced out
+    assert scheduler["rate_limit"]["remaining"] == 1000
+    assert scheduler["budget_gap_seconds"] > 5 and delay > 5
+    # Below a quarter of the quota the database backup waits for the reset
+    assert scheduler["db_deferred_for_quota"] and scheduler["db_backup_in"] > 1700
+
+
+def test_rate_limit_headers_are_parsed_defensively(monkeypatch):
+    monkeypatch.setattr(github_sync, "_rate_limit", {"limit": None, "remaining": None, "reset_at": None, "paused_until": 0.0})
+    until = time.time() + 120
+    date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(until))
+    response = httpx.Response(429, headers={"retry-after": date, "x-ratelimit-remaining": "yok"})
+    asyncio.run(github_sync.note_rate_limit(response))
+    assert abs(github_sync._rate_limit["paused_until"] - until) < 2
+
+    # Unreadable Retry-After and no reset: pause for a minute
+    github_sync._rate_limit["paused_until"] = 0.0
+    asyncio.run(github_sync.note_rate_limit(httpx.Response(403, headers={"retry-after": "sonra"})))
+    assert 55 < github_sync._rate_limit["paused_until"] - time.time() <= 60
+
+
+def test_restore_keeps_seq_above_compacted_snapshot(fake, monkeypatch):
+    monkeypatch.setattr(github_sync, "SNAPSHOT_EVERY_DELTAS", 1)
+    asyncio.run(github_sync.push_all_tables())
+    _insert("personeller", "2")
+    asyncio.run(github_sync.sync_now(force_db=True))  # delta + backup
+    con = sqlite3.connect(github_sync.DB_PATH)
+    # Writes to a changelog table that is not synced move the seq on
+    con.executemany("INSERT INTO degisiklik_gunlugu (tablo, kayit_id, islem) VALUES ('diger', ?, 'I')",
+                    [(str(i),) for i in range(30)])
+    con.commit()
+    con.close()
+    _insert("personeller", "3")
+    asyncio.run(github_sync.sync_now())  # compaction snapshot, its delta deleted
+    snapshot_seq = json.loads(fake.blobs[fake.files()["data/personeller.json"]])["seq"]
+    assert snapshot_seq > 30 and not [p for p in fake.files() if p.startswith("data/personeller/")]
+
+    github_sync.DB_PATH.unlink()
+    assert asyncio.run(github_sync.restore_database_from_github())["restored"]
+    _insert("personeller", "4")
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT MAX(seq) FROM degisiklik_gunlugu").fetchone()[0] > snapshot_seq
+    con.close()
+    asyncio.run(github_sync.sync_now())
+
+    # A second restore must not drop the row written after the first one
+    github_sync.DB_PATH.unlink()
+    assert asyncio.run(github_sync.restore_database_from_github())["restored"]
+    con = sqlite3.connect(github_sync.DB_PATH)
+    assert con.execute("SELECT COUNT(*) FROM personeller WHERE id IN ('2', '3', '4')").fetchone() == (3,)
+    con.close()
@@ -0,0 +1,84 @@
+"""
+Concurrency stress test for stock mutations.
+Covers:
+- POST /api/bims-stok-hareketler under 100 parallel writers (no lost updates)
+- DELETE /api/bims-stok-hareketler/{id} under 100 parallel writers
+- Running balance (bakiye) of the last ledger row matches mevcut_stok
+"""
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+BASE_URL = os.environ.get("REACT_APP_BACKEND_URL", "https://photo-backup-app.preview.emergentagent.com").rstrip("/")
+LOGIN = {"email": "alperenacer@acerler.com", "password": "1234"}
+WRITERS = 100
+
+
+@pytest.fixture(scope="module")
+def token():
+    r = requests.post(f"{BASE_URL}/api/auth/login", json=LOGIN, timeout=30)
+    assert r.status_code == 200, f"Login failed: {r.status_code} {r.text}"
+    return r.json()["access_token"]
+
+
+@pytest.fixture(scope="module")
+def headers(token):
+    return {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+
+
+@pytest.fixture(scope="module")
+def stok_urun(headers):
+    payload = {"urun_adi": f"TEST_CONCURRENCY_{uuid.uuid4().hex[:6]}", "acilis_miktari": 0}
+    r = requests.post(f"{BASE_URL}/api/bims-stok-urunler", json=payload, headers=headers, timeout=15)
+    assert r.status_code == 200, r.text
+    urun = r.json()
+    yield urun
+    requests.delete(f"{BASE_URL}/api/bims-stok-urunler/{urun['id']}", headers=headers, timeout=15)
+
+
+def _mevcut_stok(headers, urun_id):
+    r = requests.get(f"{BASE_URL}/api/bims-stok-urunler/{urun_id}", headers=headers, timeout=15)
+    assert r.status_code == 200, r.text
+    return r.json()["mevcut_stok"]
+
+
+def _hareketler(headers, urun_id):
+    r = requests.get(f"{BASE_URL}/api/bims-stok-hareketler", params={"urun_id": urun_id}, headers=headers, timeout=30)
+    assert r.status_code == 200, r.text
+    return r.json()
+
+
+def test_parallel_giris_no_lost_updates(headers, stok_urun):
+    def giris(i):
+        payload = {"urun_id": stok_urun["id"], "hareket_tipi": "giris", "miktar": 1, "tarih": "2026-01-15",
+                   "aciklama": f"TEST_PARALEL_{i}"}
+        return requests.post(f"{BASE_URL}/api/bims-stok-hareketler", json=payload, headers=headers, timeout=120)
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        responses = list(pool.map(giris, range(WRITERS)))
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200][:3]
+    assert _mevcut_stok(headers, stok_urun["id"]) == WRITERS
+
+    hareketler = _hareketler(headers, stok_urun["id"])
+    assert len(hareketler) == WRITERS
+    bakiyeler = sorted(h["bakiye"] for h in hareketler)
+    assert bakiyeler == list(range(1, WRITERS + 1))
+
+
+def test_parallel_delete_no_lost_updates(headers, stok_urun):
+    hareketler = _hareketler(headers, stok_urun["id"])
+    assert len(hareketler) == WRITERS
+
+    def sil(h):
+        return requests.delete(f"{BASE_URL}/api/bims-stok-hareketler/{h['id']}", headers=headers, timeout=120)
+
+    with ThreadPoolExecutor(max_workers=WRITERS) as pool:
+        responses = list(pool.map(sil, hareketler))
+
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200][:3]
+    assert _mevcut_stok(headers, stok_urun["id"]) == 0
+    assert _hareketler(headers, stok_urun["id"]) == []
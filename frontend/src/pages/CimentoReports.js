@@ -147,20 +147,28 @@ const CimentoReports = () => {
     setSummary(sum);
   };
 
-  const applyFilters = () => {
-    let filtered = [...records];
-    if (filters.baslangicTarihi) filtered = filtered.filter(r => r.bosaltim_tarihi >= filters.baslangicTarihi);
-    if (filters.bitisTarihi) filtered = filtered.filter(r => r.bosaltim_tarihi <= filters.bitisTarihi);
-    if (filters.isletme) filtered = filtered.filter(r => r.bosaltim_isletmesi === filters.isletme);
-    if (filters.firma) filtered = filtered.filter(r => r.cimento_alinan_firma === filters.firma);
-    if (filters.plaka) filtered = filtered.filter(r => r.plaka === filters.plaka);
-    setFilteredRecords(filtered);
-    calculateSummary(filtered);
+  const applyFilters = async () => {
+    // Filtreler sunucuda (indeksli) uygulanır; yalnızca eşleşen kayıtlar indirilir
+    const params = new URLSearchParams();
+    if (filters.baslangicTarihi) params.append('baslangic_tarihi', filters.baslangicTarihi);
+    if (filters.bitisTarihi) params.append('bitis_tarihi', filters.bitisTarihi);
+    if (filters.isletme) params.append('isletme', filters.isletme);
+    if (filters.firma) params.append('firma', filters.firma);
+    if (filters.plaka) params.append('plaka', filters.plaka);
+    try {
+      const response = await axios.get(`${API_URL}/cimento-giris?${params.toString()}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      setFilteredRecords(response.data);
+      calculateSummary(response.data);
+      toast.success(`${response.data.length} kayıt bulundu`);
+    } catch (e) {
+      console.error(e);
+      toast.error("Kayıtlar yüklenemedi");
+    }
     
     // Stok raporunu da yeniden çek
     fetchStokRaporu();
-    
-    toast.success(`${filtered.length} kayıt bulundu`);
   };
 
   const clearFilters = () => {
@@ -8,6 +8,7 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContaine
 import { Package, TrendingUp, Calendar, Clock, ArrowLeft } from 'lucide-react';
 import { format } from 'date-fns';
 import { tr } from 'date-fns/locale';
+import { subscribeLiveEvents } from '@/utils/liveEvents';
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
 
@@ -42,6 +43,16 @@ const Dashboard = () => {
     fetchData();
   }, [currentModule]);
 
+  // Yeni üretim / stok değişikliği geldiğinde istatistikleri yenile
+  useEffect(() => {
+    if (!currentModule || currentModule.id !== 'bims') return;
+    return subscribeLiveEvents(['bims'], (event) => {
+      if (event.table === 'production_records' || event.type === 'events_dropped') {
+        fetchData();
+      }
+    });
+  }, [currentModule]);
+
   const fetchData = async () => {
     try {
       const [statsRes, dailyRes] = await Promise.all([
@@ -75,7 +75,7 @@ const IzinYonetimi = () => {
 
   const fetchPersoneller = useCallback(async () => {
     try {
-      const response = await axios.get(`${API_URL}/personeller`, { headers });
+      const response = await axios.get(`${API_URL}/personeller`, { headers, params: { fields: 'liste' } });
       setPersoneller(response.data.filter(p => p.aktif));
     } catch (e) {
       console.error(e);
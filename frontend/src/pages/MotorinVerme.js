@@ -196,7 +196,7 @@ const MotorinVerme = () => {
 
   const fetchAraclar = async () => {
     try {
-      const res = await axios.get(`${API_URL}/araclar`, authHeaders);
+      const res = await axios.get(`${API_URL}/araclar`, { ...authHeaders, params: { fields: 'liste' } });
       setAraclar(res.data);
     } catch (error) {
       console.log('Araçlar yüklenemedi');
@@ -205,7 +205,7 @@ const MotorinVerme = () => {
 
   const fetchPersoneller = async () => {
     try {
-      const res = await axios.get(`${API_URL}/personeller`, authHeaders);
+      const res = await axios.get(`${API_URL}/personeller`, { ...authHeaders, params: { fields: 'liste' } });
       setPersoneller(res.data);
     } catch (error) {
       console.log('Personeller yüklenemedi');
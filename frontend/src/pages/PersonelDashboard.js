@@ -25,7 +25,7 @@ const PersonelDashboard = () => {
     try {
       const [ozetRes, personelRes, izinRes] = await Promise.all([
         axios.get(`${API_URL}/personel-ozet`, { headers }),
-        axios.get(`${API_URL}/personeller`, { headers }),
+        axios.get(`${API_URL}/personeller`, { headers, params: { fields: 'liste' } }),
         axios.get(`${API_URL}/izinler`, { headers }),
       ]);
       setOzet(ozetRes.data);
@@ -0,0 +1,32 @@
+/**
+ * Live Events (SSE)
+ * Backend'in /api/events kanalına bağlanır; üretim eklendi, stok değişti gibi
+ * kompakt olayları dinler. Dashboard'lar zamanlayıcıyla rapor çekmek yerine
+ * bu olaylar geldiğinde yenilenir.
+ */
+
+const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
+
+export const subscribeLiveEvents = (modules, callback) => {
+  const token = localStorage.getItem('token');
+  if (!token || typeof EventSource === 'undefined') return () => {};
+
+  const params = new URLSearchParams({ token });
+  if (modules && modules.length) params.set('modules', modules.join(','));
+
+  const source = new EventSource(`${API_URL}/events?${params.toString()}`);
+  // Olay tipi data içinde: uretim_eklendi, stok_degisti, <tablo>_<created|updated|deleted>
+  source.onmessage = (e) => {
+    try {
+      callback(JSON.parse(e.data));
+    } catch (err) {}
+  };
+  // Yavaş bağlantıda eski olaylar atıldıysa sayfa tam yenileme yapmalı
+  source.addEventListener('events_dropped', (e) => {
+    try {
+      callback({ type: 'events_dropped', ...JSON.parse(e.data) });
+    } catch (err) {}
+  });
+
+  return () => source.close();
+};